@@ -58,6 +58,63 @@ CREATE TABLE IF NOT EXISTS stock.minute_kline (
   SETTINGS index_granularity = 8192
 """
 
+# 日线预聚合表：AggregatingMergeTree 保存 argMin/argMax 中间状态，
+# 周/月/年K线可直接在日线状态上再次合并，无需回扫分钟数据
+CREATE_DAILY_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS stock.daily_kline (
+    code             LowCardinality(String),
+    trade_date       Date,
+    open             AggregateFunction(argMin, Float64, DateTime),
+    close            AggregateFunction(argMax, Float64, DateTime),
+    high             SimpleAggregateFunction(max, Float64),
+    low              SimpleAggregateFunction(min, Float64),
+    adj_open_after   AggregateFunction(argMin, Float64, DateTime),
+    adj_close_after  AggregateFunction(argMax, Float64, DateTime),
+    adj_high_after   SimpleAggregateFunction(max, Float64),
+    adj_low_after    SimpleAggregateFunction(min, Float64),
+    adj_open_before  AggregateFunction(argMin, Float64, DateTime),
+    adj_close_before AggregateFunction(argMax, Float64, DateTime),
+    adj_high_before  SimpleAggregateFunction(max, Float64),
+    adj_low_before   SimpleAggregateFunction(min, Float64),
+    volume           SimpleAggregateFunction(sum, UInt64),
+    amount           SimpleAggregateFunction(sum, Float64)
+) ENGINE = AggregatingMergeTree()
+  PARTITION BY toYear(trade_date)
+  ORDER BY (code, trade_date)
+"""
+
+# 分钟表 → 日线聚合状态（物化视图与历史回填共用）
+# 物化视图按列名写入目标表，别名必须与 daily_kline 列名一致；ClickHouse 先解析别名再解析列，
+# 因此每个聚合只引用与自身别名相同的列，复权价格直接使用分钟表的 MATERIALIZED 列，
+# 不能写成 open * after_factor（open 会被解析为上面的聚合，形成嵌套聚合）
+DAILY_ROLLUP_SELECT = """
+SELECT
+    code,
+    toDate(dt) AS trade_date,
+    argMinState(open, dt) AS open,
+    argMaxState(close, dt) AS close,
+    max(high) AS high,
+    min(low) AS low,
+    argMinState(adj_open_after, dt) AS adj_open_after,
+    argMaxState(adj_close_after, dt) AS adj_close_after,
+    max(adj_high_after) AS adj_high_after,
+    min(adj_low_after) AS adj_low_after,
+    argMinState(adj_open_before, dt) AS adj_open_before,
+    argMaxState(adj_close_before, dt) AS adj_close_before,
+    max(adj_high_before) AS adj_high_before,
+    min(adj_low_before) AS adj_low_before,
+    sum(volume) AS volume,
+    sum(amount) AS amount
+FROM stock.minute_kline
+"""
+
+CREATE_DAILY_MV_SQL = f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS stock.daily_kline_mv
+TO stock.daily_kline AS
+{DAILY_ROLLUP_SELECT}
+GROUP BY code, trade_date
+"""
+
 COLUMN_NAMES = [
     "code", "dt", "name", "open", "close", "high", "low",
     "volume", "amount", "pct_change", "amplitude",
@@ -210,6 +267,8 @@ def get_client() -> clickhouse_connect.driver.Client:
 def init_database(client):
     client.command(CREATE_DB_SQL)
     client.command(CREATE_TABLE_SQL)
+    client.command(CREATE_DAILY_TABLE_SQL)
+    client.command(CREATE_DAILY_MV_SQL)
     print("数据库和表已就绪")
 
 
@@ -227,11 +286,38 @@ def insert_rows(client, rows: list[tuple]):
 
 
 def reset_table(client):
+    client.command("DROP VIEW IF EXISTS stock.daily_kline_mv")
+    client.command("DROP TABLE IF EXISTS stock.daily_kline")
     client.command("DROP TABLE IF EXISTS stock.minute_kline")
     client.command(CREATE_TABLE_SQL)
+    client.command(CREATE_DAILY_TABLE_SQL)
+    client.command(CREATE_DAILY_MV_SQL)
     print("表已重建")
 
 
+def rollup_daily(client, year: str | None = None):
+    """
+    从分钟表回填日线聚合表（物化视图只处理创建之后写入的数据）。
+    按年分区先删后插，重复执行不会重复累加成交量。
+    """
+    if year:
+        years = [int(year.split("_")[0])]
+    else:
+        result = client.query(
+            "SELECT DISTINCT toYear(dt) AS y FROM stock.minute_kline ORDER BY y"
+        )
+        years = [row[0] for row in result.result_rows]
+
+    for y in tqdm(years, desc="日线回填", unit="年"):
+        client.command(f"ALTER TABLE stock.daily_kline DROP PARTITION {y}")
+        client.command(
+            f"INSERT INTO stock.daily_kline {DAILY_ROLLUP_SELECT}"
+            f"WHERE toYear(dt) = {y}\n"
+            "GROUP BY code, trade_date"
+        )
+    print(f"日线回填完成: {len(years)} 个年份")
+
+
 # ── 文件收集 ──────────────────────────────────────────────────────────────────
 
 def collect_csv_files(year: str | None = None, stock: str | None = None) -> list[Path]:
@@ -313,6 +399,13 @@ def verify(client):
     for row in sample.result_rows:
         print(f"  {row}")
 
+    # 日线聚合表覆盖情况
+    daily_rows = client.command("SELECT count() FROM stock.daily_kline")
+    daily_range = client.query(
+        "SELECT min(trade_date), max(trade_date) FROM stock.daily_kline"
+    ).result_rows[0]
+    print(f"\n日线聚合行数: {daily_rows:,} ({daily_range[0]} ~ {daily_range[1]})")
+
     # 前复权因子负值统计
     neg_before = client.command(
         "SELECT count() FROM stock.minute_kline WHERE before_factor < 0"
@@ -332,6 +425,7 @@ def main():
     parser.add_argument("--stock", type=str, help="只导入指定股票 (如 sh600000)")
     parser.add_argument("--verify", action="store_true", help="验证已导入数据")
     parser.add_argument("--reset", action="store_true", help="清空表和进度，重新开始")
+    parser.add_argument("--rollup", action="store_true", help="从分钟表回填日线聚合表 (可配合 --year)")
     parser.add_argument("--host", type=str, default=CH_HOST, help="ClickHouse 主机")
     parser.add_argument("--port", type=int, default=CH_PORT, help="ClickHouse 端口")
     parser.add_argument("--data-root", type=str, default=str(DATA_ROOT), help="数据根目录")
@@ -360,6 +454,10 @@ def main():
         verify(client)
         return
 
+    if args.rollup:
+        rollup_daily(client, year=args.year)
+        return
+
     # ── 导入流程 ──
     factor_cache = FactorCache()
     tracker = ProgressTracker()
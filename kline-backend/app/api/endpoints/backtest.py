@@ -1,18 +1,46 @@
 """量化回测 API"""
-from fastapi import APIRouter, HTTPException
-import pandas as pd
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
 from app.db.clickhouse import db_client
 from app.services.kline_service import KLineService
-from app.services.backtest import BacktestEngine, StrategyFactory, BacktestMetrics
+from app.services.cache_service import CacheService
+from app.services.stock_service import StockService
+from app.core.config import settings
+from app.services.backtest import (
+    StrategyFactory,
+    backtest_pool,
+    expand_grid,
+    rank_results,
+    run_sweep,
+    ALLOCATIONS,
+    job_manager,
+    JobFailed,
+    execute_backtest,
+    execute_portfolio_backtest,
+    daily_positions,
+    expand_report,
+    backtest_result_store,
+    result_key
+)
+from app.services.backtest.jobs import SUCCEEDED, FAILED
 from app.schemas.backtest import (
     BacktestRequest,
-    BacktestResponse,
-    BacktestData,
+    BacktestCompactData,
     BacktestMetricsData,
-    TradeRecord,
-    PositionInfo,
-    DailyPosition,
+    DailyPositionPage,
+    DailyPositionPageResponse,
+    BacktestJobInfo,
+    BacktestJobResponse,
     StrategyListResponse,
+    BacktestSweepRequest,
+    BacktestSweepResponse,
+    BacktestSweepData,
+    SweepResult,
+    PortfolioBacktestRequest,
+    PortfolioBacktestResponse,
     StrategyDefinition,
     StrategyParam
 )
@@ -22,6 +50,9 @@ logger = get_logger(__name__)
 
 router = APIRouter()
 
+# 每日持仓明细每页最多天数
+POSITIONS_PAGE_MAX = 1000
+
 
 @router.get("/strategies", response_model=StrategyListResponse)
 async def get_strategies():
@@ -47,221 +78,363 @@ async def get_strategies():
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
-@router.post("/run", response_model=BacktestResponse)
+@router.post("/run", response_model=BacktestJobResponse)
 async def run_backtest(request: BacktestRequest):
     """
-    执行回测
+    提交回测任务
+
+    请求立即返回任务ID；回测在后台执行，进度通过 /jobs/{job_id}/events（SSE）推送，
+    完成后通过 /jobs/{job_id}/result 获取结果。
 
     Args:
         request: 回测请求参数
 
+    Returns:
+        任务状态
+    """
+    logger.info(f"提交回测: {request.code}, 策略={request.strategy_id}, 日期={request.start_date}~{request.end_date}")
+
+    async def execute(report):
+        # 获取K线数据（列式，直接传入回测进程）
+        await report(0.05, '加载K线数据')
+        kline_service = KLineService(db_client, CacheService())
+        try:
+            data = await kline_service.get_kline_columns(
+                code=request.code,
+                start_date=request.start_date,
+                end_date=request.end_date,
+                adj_type='after',  # 使用后复权
+                period='day'
+            )
+        except ValueError as e:
+            raise JobFailed(str(e), 404)
+        if data['count'] == 0:
+            raise JobFailed("没有找到K线数据", 404)
+
+        # 相同请求且K线数据未变化时直接返回已保存的结果
+        stock_name = data['stock_info']['name']
+        key = result_key(request, data['columns'], stock_name)
+        stored = await backtest_result_store.get(key)
+        if stored is not None:
+            logger.info(f"回测结果命中: {key}")
+            await report(0.9, '读取已保存结果')
+            # 返回本次请求的参数原样（键按补全默认值后的参数计算）
+            return BacktestCompactData.model_validate({**stored, 'strategy_params': request.strategy_params})
+
+        # 信号生成与逐日模拟在回测进程池中执行
+        await report(0.3, '执行回测')
+        try:
+            result = await backtest_pool.run(execute_backtest, request, data['columns'], stock_name)
+        except ValueError as e:
+            raise JobFailed(str(e), 400)
+
+        result.result_id = key
+        await report(0.95, '保存结果')
+        await backtest_result_store.put(key, result)
+        return result
+
+    job = job_manager.submit('run', execute, to_cache=lambda result: result.model_dump())
+    return BacktestJobResponse(data=BacktestJobInfo(**job.to_dict()))
+
+
+@router.get("/jobs/{job_id}", response_model=BacktestJobResponse)
+async def get_backtest_job(job_id: str):
+    """
+    查询回测任务状态
+
+    Args:
+        job_id: 任务ID
+
+    Returns:
+        任务状态
+    """
+    status = await job_manager.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return BacktestJobResponse(data=BacktestJobInfo(**status))
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_backtest_job(job_id: str):
+    """
+    回测任务进度推送（Server-Sent Events）
+
+    每次状态变化推送一条 progress 事件，data 为任务状态 JSON；任务结束后关闭连接。
+
+    Args:
+        job_id: 任务ID
+    """
+    if await job_manager.get_status(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+
+    async def event_stream():
+        async for status in job_manager.events(job_id):
+            yield b"event: progress\ndata: " + orjson.dumps(status) + b"\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _as_report(value) -> BacktestCompactData:
+    """任务结果或已保存结果（本进程内为模型，缓存或文件中为 dict）"""
+    if isinstance(value, BacktestCompactData):
+        return value
+    return BacktestCompactData.model_validate(value)
+
+
+async def _job_report(job_id: str) -> BacktestCompactData:
+    """获取已完成任务的结果；任务不存在、失败或未完成时抛出对应的 HTTPException"""
+    status = await job_manager.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    if status['status'] == FAILED:
+        raise HTTPException(status_code=status['error_code'] or 500, detail=status['error'])
+    if status['status'] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail="任务尚未完成")
+
+    result = await job_manager.get_result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="任务结果已过期")
+    return _as_report(result)
+
+
+async def _stored_report(result_id: str) -> BacktestCompactData:
+    """获取已保存的结果；不存在时抛出 404"""
+    stored = await backtest_result_store.get(result_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="回测结果不存在")
+    return _as_report(stored)
+
+
+async def _report_response(report: BacktestCompactData, layout: str) -> ORJSONResponse:
+    """
+    构建回测结果响应
+
+    Args:
+        report: 紧凑格式的回测结果
+        layout: compact=列式序列 + 持仓变化日快照，full=逐日持仓明细（旧格式）
+    """
+    if layout == 'full':
+        # 逐日还原持仓明细为CPU密集操作，放入线程池
+        data = (await run_in_threadpool(expand_report, report)).model_dump()
+    else:
+        data = report.model_dump()
+    # 直接返回响应对象，跳过FastAPI逐字段编码
+    return ORJSONResponse({"code": 0, "message": "success", "data": data})
+
+
+def _positions_page(report: BacktestCompactData, offset: int, limit: int) -> DailyPositionPageResponse:
+    """每日持仓明细分页"""
+    return DailyPositionPageResponse(data=DailyPositionPage(
+        total=len(report.series.dates),
+        offset=offset,
+        limit=limit,
+        items=daily_positions(report, offset, limit)
+    ))
+
+
+@router.get("/jobs/{job_id}/result", response_model=dict)
+async def get_backtest_result(
+    job_id: str,
+    layout: Literal["compact", "full"] = Query("compact", description="返回格式: compact=列式序列+持仓变化日快照, full=逐日持仓明细")
+):
+    """
+    获取回测结果
+
+    Args:
+        job_id: 任务ID
+        layout: 返回格式
+
+    Returns:
+        回测结果；任务未完成返回 409，任务失败返回对应的错误
+    """
+    return await _report_response(await _job_report(job_id), layout)
+
+
+@router.get("/jobs/{job_id}/positions", response_model=DailyPositionPageResponse)
+async def get_backtest_positions(
+    job_id: str,
+    offset: int = Query(0, ge=0, description="起始天序号"),
+    limit: int = Query(250, ge=1, le=POSITIONS_PAGE_MAX, description="每页天数")
+):
+    """
+    分页获取回测的每日持仓明细
+
+    Args:
+        job_id: 任务ID
+        offset: 起始天序号
+        limit: 每页天数
+
+    Returns:
+        每日持仓明细
+    """
+    return _positions_page(await _job_report(job_id), offset, limit)
+
+
+@router.get("/results/{result_id}", response_model=dict)
+async def get_stored_result(
+    result_id: str,
+    layout: Literal["compact", "full"] = Query("compact", description="返回格式: compact=列式序列+持仓变化日快照, full=逐日持仓明细")
+):
+    """
+    按结果ID打开已保存的回测结果（用于分享报告链接，不重新计算）
+
+    Args:
+        result_id: 回测结果中的 result_id
+        layout: 返回格式
+
     Returns:
         回测结果
     """
-    logger.info(f"开始回测: {request.code}, 策略={request.strategy_id}, 日期={request.start_date}~{request.end_date}")
+    return await _report_response(await _stored_report(result_id), layout)
+
+
+@router.get("/results/{result_id}/positions", response_model=DailyPositionPageResponse)
+async def get_stored_positions(
+    result_id: str,
+    offset: int = Query(0, ge=0, description="起始天序号"),
+    limit: int = Query(250, ge=1, le=POSITIONS_PAGE_MAX, description="每页天数")
+):
+    """
+    分页获取已保存结果的每日持仓明细
+
+    Args:
+        result_id: 回测结果中的 result_id
+        offset: 起始天序号
+        limit: 每页天数
+
+    Returns:
+        每日持仓明细
+    """
+    return _positions_page(await _stored_report(result_id), offset, limit)
+
+
+@router.post("/sweep", response_model=BacktestSweepResponse)
+async def run_backtest_sweep(request: BacktestSweepRequest):
+    """
+    参数寻优：K线只加载一次，全部参数组合在进程池中并行回测，按指标排序返回
+
+    Args:
+        request: 参数寻优请求
 
+    Returns:
+        各参数组合的绩效指标排名
+    """
     try:
-        # 获取K线数据
-        kline_service = KLineService(db_client)
+        combinations = expand_grid(request.strategy_id, request.strategy_params, request.param_grid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.sort_by not in BacktestMetricsData.model_fields:
+        raise HTTPException(status_code=400, detail=f"不支持的排序指标: {request.sort_by}")
 
-        kline_response = kline_service.get_kline(
-            code=request.code,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            adj_type='after',  # 使用后复权
-            period='day'
-        )
+    logger.info(
+        f"开始参数寻优: {request.code}, 策略={request.strategy_id}, 组合数={len(combinations)}, "
+        f"日期={request.start_date}~{request.end_date}"
+    )
 
-        if len(kline_response.klines) == 0:
+    try:
+        # 获取K线数据（列式，所有参数组合共用）
+        kline_service = KLineService(db_client, CacheService())
+        try:
+            data = await kline_service.get_kline_columns(
+                code=request.code,
+                start_date=request.start_date,
+                end_date=request.end_date,
+                adj_type='after',  # 使用后复权
+                period='day'
+            )
+        except ValueError as e:
+            # 股票不存在或区间内无数据
+            raise HTTPException(status_code=404, detail=str(e))
+        if data['count'] == 0:
             raise HTTPException(status_code=404, detail="没有找到K线数据")
 
-        # 转换为 DataFrame
-        kline_data = []
-        for k in kline_response.klines:
-            kline_data.append({
-                'date': k.date,
-                'open': k.open,
-                'close': k.close,
-                'high': k.high,
-                'low': k.low,
-                'volume': k.volume
-            })
-        df = pd.DataFrame(kline_data)
-
-        # 创建策略
-        strategy = StrategyFactory.create_strategy(
-            request.strategy_id,
-            request.strategy_params
-        )
+        columns = data['columns']
+        bars = {'date': columns['dates']}
+        for field in ('open', 'close', 'high', 'low', 'volume'):
+            bars[field] = columns[field]
 
-        # 生成交易信号
-        logger.info(f"生成交易信号: 策略={strategy.name}")
-        signals = strategy.generate_signals(df)
-        logger.info(f"生成了 {len(signals)} 个交易信号")
-
-        # 调试：打印前几个信号和日期
-        if signals:
-            logger.info(f"首个信号: date={signals[0].date} (type={type(signals[0].date)}), action={signals[0].action}")
-            logger.info(f"首个K线: date={df.iloc[0]['date']} (type={type(df.iloc[0]['date'])})")
-
-        # 创建回测引擎
-        engine = BacktestEngine(initial_capital=request.initial_capital)
-
-        # 计算买入持有基准
-        initial_price = df.iloc[0]['close']
-        buy_hold_shares = int((request.initial_capital * 0.999) / initial_price / 100) * 100  # 扣除手续费后能买的股数
-        buy_hold_curve = []  # 买入持有资金曲线
-
-        # 执行回测
-        signal_idx = 0
-        for i, row in df.iterrows():
-            date = row['date']
-            close_price = row['close']
-
-            # 更新持仓价格
-            engine.update_prices(date, {request.code: close_price})
-
-            # 检查是否有交易信号
-            if signal_idx < len(signals) and signals[signal_idx].date == date:
-                signal = signals[signal_idx]
-                signal_idx += 1
-
-                if signal.action == 'buy':
-                    # 买入
-                    if not engine.has_position(request.code):
-                        # 计算买入数量
-                        buy_amount = engine.cash * request.position_ratio
-                        shares = int(buy_amount / close_price / 100) * 100  # 整百股
-
-                        success = engine.buy(
-                            date=date,
-                            code=request.code,
-                            name=kline_response.stock_info.name,
-                            price=close_price,
-                            shares=shares,
-                            reason=signal.reason
-                        )
-
-                        if success:
-                            logger.info(f"{date} 买入 {shares}股 @ {close_price:.2f} - {signal.reason}")
-
-                elif signal.action == 'sell':
-                    # 卖出
-                    if engine.has_position(request.code):
-                        pos = engine.get_current_position(request.code)
-                        success = engine.sell(
-                            date=date,
-                            code=request.code,
-                            name=kline_response.stock_info.name,
-                            price=close_price,
-                            shares=pos.shares,
-                            reason=signal.reason
-                        )
-
-                        if success:
-                            logger.info(f"{date} 卖出 {pos.shares}股 @ {close_price:.2f} - {signal.reason}")
-
-            # 记录每日状态
-            engine.record_daily(date)
-
-            # 记录买入持有基准
-            buy_hold_value = buy_hold_shares * close_price
-            buy_hold_curve.append({
-                "date": date,
-                "value": buy_hold_value
-            })
-
-        # 计算买入持有基准收益率
-        buy_hold_final_value = buy_hold_curve[-1]["value"] if buy_hold_curve else request.initial_capital
-        buy_hold_return = (buy_hold_final_value - request.initial_capital) / request.initial_capital * 100
-
-        # 计算绩效指标
-        metrics = BacktestMetrics(
-            daily_records=engine.daily_records,
-            trades=engine.trades,
-            initial_capital=request.initial_capital
+        results = await run_sweep(
+            request.strategy_id, combinations, bars, request.code,
+            request.initial_capital, request.position_ratio
         )
+        ranked = rank_results(results, request.sort_by, request.top)
 
-        # 构建响应
-        final_value = engine.get_total_value()
-
-        # 计算超额收益
-        excess_return = metrics.total_return - buy_hold_return
-
-        # 转换交易记录
-        trade_records = [
-            TradeRecord(
-                date=t.date,
-                code=t.code,
-                name=t.name,
-                action=t.action,
-                price=t.price,
-                shares=t.shares,
-                amount=t.amount,
-                commission=t.commission,
-                reason=t.reason
-            )
-            for t in engine.trades
-        ]
-
-        # 转换每日持仓
-        daily_positions = []
-        for dr in engine.daily_records:
-            positions = [
-                PositionInfo(
-                    code=p.code,
-                    name=p.name,
-                    shares=p.shares,
-                    avg_price=p.avg_price,
-                    current_price=p.current_price,
-                    market_value=p.market_value,
-                    cost=p.cost,
-                    profit=p.profit,
-                    profit_pct=p.profit_pct
+        best = ranked[0]['metrics'][request.sort_by] if ranked else None
+        logger.info(f"参数寻优完成: 组合数={len(results)}, 最优{request.sort_by}={best}")
+
+        return BacktestSweepResponse(data=BacktestSweepData(
+            stock_code=request.code,
+            stock_name=data['stock_info']['name'],
+            start_date=request.start_date,
+            end_date=request.end_date,
+            strategy_id=request.strategy_id,
+            strategy_name=StrategyFactory.create_strategy(request.strategy_id, request.strategy_params).name,
+            sort_by=request.sort_by,
+            total_combinations=len(results),
+            results=[
+                SweepResult(
+                    rank=i + 1,
+                    params=r['params'],
+                    final_capital=r['final_capital'],
+                    metrics=BacktestMetricsData(**r['metrics'])
                 )
-                for p in dr.positions
+                for i, r in enumerate(ranked)
             ]
-            daily_positions.append(DailyPosition(
-                date=dr.date,
-                cash=dr.cash,
-                market_value=dr.market_value,
-                total_value=dr.total_value,
-                positions=positions
-            ))
+        ))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"参数寻优失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
-        # 构建资金曲线
-        equity_curve = [
-            {"date": dr.date, "value": dr.total_value}
-            for dr in engine.daily_records
-        ]
 
-        # 构建绩效指标（包含基准对比）
-        metrics_dict = metrics.to_dict()
-        metrics_dict['buy_hold_return'] = round(buy_hold_return, 2)
-        metrics_dict['excess_return'] = round(excess_return, 2)
+@router.post("/portfolio", response_model=PortfolioBacktestResponse)
+async def run_portfolio_backtest(request: PortfolioBacktestRequest):
+    """
+    组合回测：股票池共用一个账户，K线面板一次查询，逐日对全部股票统一处理
 
-        result = BacktestData(
-            stock_code=request.code,
-            stock_name=kline_response.stock_info.name,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            strategy_name=strategy.name,
-            strategy_params=request.strategy_params,
-            initial_capital=request.initial_capital,
-            final_capital=final_value,
-            metrics=BacktestMetricsData(**metrics_dict),
-            daily_records=daily_positions,
-            trades=trade_records,
-            equity_curve=equity_curve,
-            buy_hold_curve=buy_hold_curve
+    Args:
+        request: 组合回测请求参数
+
+    Returns:
+        组合回测结果
+    """
+    codes = list(dict.fromkeys(request.codes))
+    if not codes:
+        raise HTTPException(status_code=400, detail="股票池不能为空")
+    if len(codes) > settings.BACKTEST_PORTFOLIO_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"股票池最多 {settings.BACKTEST_PORTFOLIO_MAX_CODES} 只股票")
+    if request.allocation not in ALLOCATIONS:
+        raise HTTPException(status_code=400, detail=f"不支持的资金分配方式: {request.allocation}")
+
+    logger.info(
+        f"开始组合回测: {len(codes)} 只股票, 策略={request.strategy_id}, "
+        f"日期={request.start_date}~{request.end_date}"
+    )
+
+    try:
+        # 股票池K线面板（单次查询，对齐到统一日期轴）
+        kline_service = KLineService(db_client, CacheService())
+        panel = await kline_service.get_kline_panel(
+            codes, request.start_date, request.end_date, adj_type='after', period='day'
         )
+        if not panel['codes'] or not panel['dates']:
+            raise HTTPException(status_code=404, detail="没有找到K线数据")
 
-        logger.info(f"回测完成: 总收益率={metrics.total_return:.2f}%, 交易次数={len(trade_records)}")
+        names = await StockService(db_client).get_stock_names(panel['codes'])
 
-        return BacktestResponse(data=result)
+        result = await run_in_threadpool(execute_portfolio_backtest, request, panel, names)
+        return PortfolioBacktestResponse(data=result)
 
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"回测失败: {str(e)}", exc_info=True)
+        logger.error(f"组合回测失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
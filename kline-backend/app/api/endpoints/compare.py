@@ -1,8 +1,12 @@
 """股票对比 API"""
 from fastapi import APIRouter, Query, HTTPException
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse
+import numpy as np
+import pandas as pd
+from app.core.config import settings
 from app.db.clickhouse import db_client
 from app.services.kline_service import KLineService
+from app.services.cache_service import CacheService
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -10,9 +14,19 @@ logger = get_logger(__name__)
 router = APIRouter()
 
 
+@router.get("/config")
+async def get_compare_config():
+    """获取股票对比配置（前端据此限制可选择的股票数量）"""
+    return {
+        "code": 0,
+        "message": "success",
+        "data": {"max_codes": settings.COMPARE_MAX_CODES}
+    }
+
+
 @router.get("/data")
 async def get_compare_data(
-    codes: str = Query(..., description="股票代码列表，逗号分隔，最多5只"),
+    codes: str = Query(..., description=f"股票代码列表，逗号分隔，最多{settings.COMPARE_MAX_CODES}只"),
     start_date: str = Query(..., description="开始日期 YYYY-MM-DD"),
     end_date: str = Query(..., description="结束日期 YYYY-MM-DD"),
     period: str = Query("day", description="K线周期"),
@@ -21,6 +35,9 @@ async def get_compare_data(
     """
     获取多股票对比数据
 
+    所有股票通过一次批量查询获取，并对齐到各股票交易日期的并集上，
+    某只股票在某日无数据（未上市、停牌）时对应值为 null。
+
     Args:
         codes: 股票代码列表，逗号分隔（如：000001.SZ,600000.SH）
         start_date: 开始日期
@@ -33,16 +50,16 @@ async def get_compare_data(
     """
     logger.info(f"股票对比请求: codes={codes}, start={start_date}, end={end_date}, period={period}, mode={mode}")
 
-    # 解析股票代码列表
-    code_list = [c.strip() for c in codes.split(',') if c.strip()]
+    # 解析股票代码列表（去重并保持顺序）
+    code_list = list(dict.fromkeys(c.strip() for c in codes.split(',') if c.strip()))
 
     # 验证股票数量
     if len(code_list) == 0:
         raise HTTPException(status_code=400, detail="至少需要选择1只股票")
-    if len(code_list) > 5:
-        raise HTTPException(status_code=400, detail="最多支持5只股票对比")
+    if len(code_list) > settings.COMPARE_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"最多支持{settings.COMPARE_MAX_CODES}只股票对比")
 
-    kline_service = KLineService(db_client)
+    kline_service = KLineService(db_client, CacheService())
 
     result = {
         "stocks": [],
@@ -51,63 +68,59 @@ async def get_compare_data(
     }
 
     try:
-        # 获取每只股票的K线数据
+        # 单次查询获取所有股票的K线数据
+        batch = await kline_service.get_kline_batch(
+            codes=code_list,
+            start_date=start_date,
+            end_date=end_date,
+            adj_type='after',  # 使用后复权进行对比
+            period=period
+        )
+
         for code in code_list:
-            try:
-                kline_response = kline_service.get_kline(
-                    code=code,
-                    start_date=start_date,
-                    end_date=end_date,
-                    adj_type='after',  # 使用后复权进行对比
-                    period=period
-                )
-
-                if len(kline_response.klines) == 0:
-                    logger.warning(f"股票 {code} 没有数据")
+            if code not in batch:
+                logger.warning(f"股票 {code} 没有数据")
+
+        if batch:
+            # 对齐到所有股票交易日期的并集
+            closes = pd.DataFrame({
+                code: pd.Series(data['columns']['close'], index=data['columns']['dates'])
+                for code, data in batch.items()
+            }).sort_index()
+            result["dates"] = closes.index.tolist()
+
+            # 计算涨跌幅（归一化，基准为各股票首个有效收盘价）
+            if mode == 'change_pct':
+                base_prices = closes.bfill().iloc[0]
+                values = (closes - base_prices) / base_prices * 100
+            else:
+                values = closes
+
+            for code in code_list:
+                if code not in batch:
                     continue
-
-                # 提取日期和价格
-                dates = [k.date for k in kline_response.klines]
-                prices = [k.close for k in kline_response.klines]
-
-                # 计算涨跌幅（归一化）
-                if mode == 'change_pct' and len(prices) > 0:
-                    base_price = prices[0]
-                    values = [((p - base_price) / base_price * 100) for p in prices]
-                else:
-                    values = prices
-
-                # 添加到结果
-                stock_data = {
+                # 添加到结果（NaN 由 orjson 序列化为 null）
+                stock_values = values[code].to_numpy(dtype=np.float64)
+                name = batch[code]["stock_info"]["name"]
+                result["stocks"].append({
                     "code": code,
-                    "name": kline_response.stock_info.name,
-                    "dates": dates,
-                    "values": values
-                }
-                result["stocks"].append(stock_data)
-
-                # 更新统一的日期列表（使用第一只股票的日期）
-                if len(result["dates"]) == 0:
-                    result["dates"] = dates
-
-            except Exception as e:
-                logger.error(f"获取股票 {code} 数据失败: {str(e)}")
-                continue
-
-        # 构建 series 格式（便于前端图表使用）
-        for stock in result["stocks"]:
-            result["series"].append({
-                "name": f"{stock['name']} ({stock['code']})",
-                "data": stock["values"]
-            })
-
-        logger.info(f"对比数据准备完成: {len(result['stocks'])} 只股票")
-
-        return {
+                    "name": name,
+                    "dates": result["dates"],
+                    "values": stock_values
+                })
+                # 构建 series 格式（便于前端图表使用）
+                result["series"].append({
+                    "name": f"{name} ({code})",
+                    "data": stock_values
+                })
+
+        logger.info(f"对比数据准备完成: {len(result['stocks'])} 只股票, {len(result['dates'])} 个交易日")
+
+        return ORJSONResponse({
             "code": 0,
             "message": "success",
             "data": result
-        }
+        })
 
     except Exception as e:
         logger.error(f"股票对比失败: {str(e)}")
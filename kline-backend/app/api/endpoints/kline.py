@@ -1,12 +1,22 @@
 """K线API端点"""
+import asyncio
+import bisect
+from datetime import datetime
+from typing import Awaitable, Callable, Literal, Optional
 from fastapi import APIRouter, Query, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from app.api.deps import get_db, get_cache
 from app.db.clickhouse import ClickHouseClient
-from app.services.kline_service import KLineService
+from app.services.kline_service import KLineService, KLINE_FIELDS
 from app.services.cache_service import CacheService
 from app.services.indicator_service import IndicatorService
+from app.services.indicator_engine import IncrementalIndicatorService
+from app.core.config import settings
+from app.core.logging_config import get_logger
+import numpy as np
 import pandas as pd
 
+logger = get_logger(__name__)
 
 router = APIRouter()
 
@@ -18,7 +28,8 @@ async def get_kline_data(
     end_date: str = Query(..., description="结束日期 YYYY-MM-DD"),
     adj_type: str = Query("none", description="复权类型: after=后复权, before=前复权, none=不复权"),
     period: str = Query("day", description="K线周期: day=日K, week=周K, month=月K, year=年K"),
-    indicators: str = Query("", description="技术指标，逗号分隔: ma,macd,kdj,rsi,boll"),
+    indicators: str = Query("", description="技术指标: ma,macd,kdj,rsi,boll；带参数时用分号分隔，如 ma:5,30,120;boll:26,2.5"),
+    layout: Literal["columns", "rows"] = Query("columns", description="返回格式: columns=列式数组, rows=逐行对象"),
     db: ClickHouseClient = Depends(get_db),
     cache: CacheService = Depends(get_cache)
 ):
@@ -32,50 +43,109 @@ async def get_kline_data(
         adj_type: 复权类型
         period: K线周期
         indicators: 技术指标
+        layout: 返回格式
 
     Returns:
         K线数据
     """
-    # 解析指标列表
-    ind_list = [i.strip() for i in indicators.split(',') if i.strip()] if indicators else []
-    ind_key = ','.join(sorted(ind_list)) if ind_list else 'none'
+    # 解析指标及参数
+    try:
+        ind_specs = IndicatorService.parse_spec(indicators)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # 1. 检查缓存
-    cache_key = f"kline:{code}:{period}:{start_date}:{end_date}:{adj_type}:ind_{ind_key}"
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
+    # K线与各指标分别缓存：切换指标时复用已缓存的K线和其他指标
+    range_key = f"{code}:{period}:{start_date}:{end_date}:{adj_type}"
+    # 根据数据日期动态设置TTL
+    ttl = cache.calculate_ttl(end_date)
 
-    try:
-        # 2. 查询数据库
+    # 数据库端指标模式：MA/BOLL 由 ClickHouse 窗口函数与K线在同一条查询中计算
+    server_specs = {}
+    if settings.INDICATOR_SERVER_SIDE:
+        server_specs = {
+            name: params for name, params in ind_specs.items()
+            if name in IndicatorService.SERVER_SIDE_INDICATORS
+        }
+
+    async def server_compute(specs: dict) -> dict:
         service = KLineService(db)
-        data = service.get_kline(code, start_date, end_date, adj_type, period)
+        return await service.get_kline_with_indicators(code, start_date, end_date, adj_type, period, specs)
+
+    async def build_bars():
+        if server_specs:
+            # 同时得到的指标直接写入指标缓存
+            data = await server_compute(server_specs)
+            for name, result in data.pop('indicators').items():
+                await cache.set(_indicator_key(range_key, name, server_specs[name], True), result, ttl)
+            return data
+        service = KLineService(db, cache)
+        return await service.get_kline_columns(code, start_date, end_date, adj_type, period)
+
+    try:
+        # 1. K线数据（两级缓存，同一键的并发请求只查询一次数据库）
+        bars = await cache.get_or_compute(f"kline:{range_key}", build_bars, ttl)
+        data = dict(bars)
+
+        # 2. 技术指标（每个指标独立缓存）
+        if ind_specs:
+            indicators = {}
+            if server_specs:
+                # 数据库端指标自带预热，与可见K线对齐
+                indicators.update(await _get_indicators(
+                    cache, range_key, bars['columns'], server_specs, period, ttl, None, server_compute
+                ))
 
-        # 3. 计算技术指标
-        if ind_list:
-            # 将K线数据转换为DataFrame
-            kline_dicts = [k.dict() for k in data.klines]
-            df = pd.DataFrame(kline_dicts)
+            # 其余指标按预热起始日期分组，在向前扩展的K线上计算后截取到可见范围
+            groups = {}
+            for name, params in ind_specs.items():
+                if name in server_specs:
+                    continue
+                warmup = IndicatorService.warmup_bars(name, params) if settings.INDICATOR_WARMUP else 0
+                calc_start = KLineService.warmup_start(start_date, period, warmup) if warmup else start_date
+                groups.setdefault(calc_start, {})[name] = params
 
-            # 计算指标
-            indicator_service = IndicatorService()
-            indicators_data = indicator_service.calculate(df, ind_list)
+            async def compute_group(calc_start: str, specs: dict) -> dict:
+                calc_key = f"{code}:{period}:{calc_start}:{end_date}:{adj_type}"
+                if calc_start == start_date:
+                    calc_bars = bars
+                else:
+                    calc_bars = await cache.get_or_compute(
+                        f"kline:{calc_key}",
+                        lambda: KLineService(db, cache).get_kline_columns(code, calc_start, end_date, adj_type, period),
+                        ttl
+                    )
+                # 增量状态与结束日期无关；前复权的历史价格会随除权变化，不做增量
+                state_prefix = None
+                if settings.INDICATOR_INCREMENTAL and adj_type != 'before':
+                    state_prefix = f"{code}:{period}:{adj_type}:{calc_start}"
+                results = await _get_indicators(
+                    cache, calc_key, calc_bars['columns'], specs, period, ttl, state_prefix
+                )
+                if calc_bars is bars:
+                    return results
+                return _trim_indicators(results, calc_bars['columns']['dates'], bars['columns']['dates'])
 
-            # 将指标数据附加到响应中
-            data.indicators = indicators_data
+            for results in await asyncio.gather(*(
+                compute_group(calc_start, specs) for calc_start, specs in groups.items()
+            )):
+                indicators.update(results)
+
+            data['indicators'] = {name: indicators[name] for name in ind_specs if name in indicators}
+        else:
+            data['indicators'] = None
+
+        # 3. 构建响应
+        if layout == 'rows':
+            data['klines'] = KLineService.to_rows(data.pop('columns'))
 
-        # 4. 构建响应
         response = {
             "code": 0,
             "message": "success",
-            "data": data.dict()
+            "data": data
         }
 
-        # 5. 写入缓存（根据数据日期动态设置TTL）
-        ttl = cache.calculate_ttl(end_date)
-        cache.set(cache_key, response, ttl)
-
-        return response
+        # 直接返回响应对象，跳过FastAPI逐字段编码，NumPy列由orjson批量序列化
+        return ORJSONResponse(response)
 
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -83,12 +153,123 @@ async def get_kline_data(
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
+def _trim_indicators(indicators: dict, calc_dates: list, dates: list) -> dict:
+    """
+    将预热K线上计算的指标截取到可见K线范围
+
+    按可见范围首根K线的日期对齐；扩展K线比可见K线少（缓存刷新时间不同）时末尾补 NaN。
+
+    Args:
+        indicators: {指标名称: {输出名称: 数组}}
+        calc_dates: 计算所用K线的日期
+        dates: 可见K线的日期
+
+    Returns:
+        dict: 与可见K线等长的指标结果
+    """
+    lo = bisect.bisect_left(calc_dates, dates[0]) if dates else 0
+    n = len(dates)
+    trimmed = {}
+    for name, result in indicators.items():
+        outputs = {}
+        for key, values in result.items():
+            values = np.asarray(values, dtype=np.float64)[lo:lo + n]
+            if len(values) < n:
+                values = np.concatenate([values, np.full(n - len(values), np.nan)])
+            outputs[key] = values
+        trimmed[name] = outputs
+    return trimmed
+
+
+def _indicator_key(range_key: str, name: str, params: dict, server: bool = False) -> str:
+    """
+    指标缓存键
+
+    数据库端计算的指标包含预热K线（首个值不为空），与 Python 端结果分开缓存。
+    """
+    key = f"ind:{range_key}:{name}:{IndicatorService.params_key(name, params)}"
+    return f"{key}:sql" if server else key
+
+
+async def _get_indicators(
+    cache: CacheService,
+    range_key: str,
+    columns: dict,
+    ind_specs: dict,
+    period: str,
+    ttl: int,
+    state_prefix: Optional[str] = None,
+    server_compute: Optional[Callable[[dict], Awaitable[dict]]] = None
+) -> dict:
+    """
+    获取一组技术指标，每个指标按 (K线范围, 指标, 参数) 独立缓存
+
+    Args:
+        cache: 缓存服务
+        range_key: K线范围键 code:period:start:end:adj
+        columns: K线列式数据
+        ind_specs: {指标名称: 参数}（IndicatorService.parse_spec 的结果）
+        period: K线周期
+        ttl: 过期时间（秒）
+        state_prefix: 增量状态键前缀 code:period:adj:start，None 表示整段计算
+        server_compute: 数据库端指标查询函数，提供时 SERVER_SIDE_INDICATORS 中的指标由 ClickHouse 计算
+
+    Returns:
+        dict: {指标名称: 指标结果}，计算失败的指标不包含在内
+    """
+    indicator_service = IndicatorService()
+    names = list(ind_specs)
+    df = None
+
+    def is_server(name: str) -> bool:
+        return server_compute is not None and name in IndicatorService.SERVER_SIDE_INDICATORS
+
+    async def compute(name: str):
+        nonlocal df
+        params = ind_specs[name]
+        if is_server(name):
+            data = await server_compute({name: params})
+            return data['indicators'][name]
+        if state_prefix is not None:
+            # 从缓存的指标状态继续计算新增K线
+            return await IncrementalIndicatorService(cache).calculate(
+                f"ind_state:{state_prefix}:{name}:{IndicatorService.params_key(name, params)}",
+                name,
+                columns,
+                period,
+                params
+            )
+        if df is None:
+            # 直接由列式数据构建DataFrame（多个指标共用）
+            df = pd.DataFrame({field: columns[field] for field in KLINE_FIELDS})
+        logger.info(f"计算{name.upper()}指标: {range_key}")
+        return indicator_service.calculate_one(df, name, params)
+
+    results = await asyncio.gather(*(
+        cache.get_or_compute(
+            _indicator_key(range_key, name, ind_specs[name], is_server(name)),
+            lambda name=name: compute(name),
+            ttl
+        )
+        for name in names
+    ), return_exceptions=True)
+
+    indicators = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"计算指标 {name} 失败: {result}")
+        else:
+            indicators[name] = result
+    return indicators
+
+
 @router.get("/minute", response_model=dict)
 async def get_minute_kline(
     code: str = Query(..., description="股票代码，如 600000.SH"),
     trade_date: str = Query(..., description="交易日期 YYYY-MM-DD"),
     interval: int = Query(1, description="分钟间隔: 1/5/15/30/60"),
     adj_type: str = Query("none", description="复权类型: after=后复权, before=前复权, none=不复权"),
+    layout: Literal["columns", "rows"] = Query("columns", description="返回格式: columns=列式数组, rows=逐行对象"),
     db: ClickHouseClient = Depends(get_db),
     cache: CacheService = Depends(get_cache)
 ):
@@ -100,41 +281,40 @@ async def get_minute_kline(
         trade_date: 交易日期
         interval: 分钟间隔
         adj_type: 复权类型
+        layout: 返回格式
 
     Returns:
         分钟K线数据
     """
-    # 1. 检查缓存
-    cache_key = f"kline:{code}:min{interval}:{trade_date}:{adj_type}"
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
+    cache_key = f"kline:{code}:min{interval}:{trade_date}:{adj_type}:{layout}"
 
+    # 分钟K线缓存策略：当天数据60秒，历史数据24小时
     try:
-        # 2. 查询数据库
+        trade_dt = datetime.strptime(trade_date, '%Y-%m-%d')
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if (datetime.now() - trade_dt).days == 0:
+        ttl = 60  # 当天数据1分钟
+    else:
+        ttl = 24 * 3600  # 历史数据24小时
+
+    async def build():
+        # 1. 查询数据库
         service = KLineService(db)
-        data = service.get_minute_kline(code, trade_date, interval, adj_type)
+        data = await service.get_minute_kline_columns(code, trade_date, interval, adj_type)
+        if layout == 'rows':
+            data['klines'] = KLineService.to_rows(data.pop('columns'))
 
-        # 3. 构建响应
-        response = {
+        # 2. 构建响应
+        return {
             "code": 0,
             "message": "success",
-            "data": data.dict()
+            "data": data
         }
 
-        # 4. 写入缓存
-        # 分钟K线缓存策略：当天数据60秒，历史数据24小时
-        from datetime import datetime
-        trade_dt = datetime.strptime(trade_date, '%Y-%m-%d')
-        today = datetime.now()
-        if (today - trade_dt).days == 0:
-            ttl = 60  # 当天数据1分钟
-        else:
-            ttl = 24 * 3600  # 历史数据24小时
-
-        cache.set(cache_key, response, ttl)
-
-        return response
+    try:
+        response = await cache.get_or_compute(cache_key, build, ttl)
+        return ORJSONResponse(response)
 
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -26,7 +26,7 @@ async def list_stocks(
         股票列表
     """
     service = StockService(db)
-    stocks = service.search_stocks(keyword, limit)
+    stocks = await service.search_stocks(keyword, limit)
 
     return {
         "code": 0,
@@ -50,7 +50,7 @@ async def get_stock_date_range(
         日期范围 {'start_date': '2020-01-01', 'end_date': '2024-12-31'}
     """
     service = StockService(db)
-    date_range = service.get_stock_date_range(code)
+    date_range = await service.get_stock_date_range(code)
 
     return {
         "code": 0,
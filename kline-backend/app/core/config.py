@@ -14,6 +14,11 @@ class Settings(BaseSettings):
     CH_DATABASE: str = "stock"
     CH_USER: str = "default"
     CH_PASSWORD: str = ""
+    CH_POOL_SIZE: int = 8  # 连接池最大连接数（同时也是查询工作线程数）
+    CH_POOL_TIMEOUT: float = 30.0  # 等待空闲连接的超时时间（秒）
+    CH_POOL_HEALTH_CHECK_INTERVAL: int = 60  # 连接空闲超过该秒数后检出前先ping
+    # 是否优先读取日线预聚合表 daily_kline（由物化视图维护）
+    CH_USE_DAILY_TABLE: bool = True
 
     # Redis配置
     REDIS_HOST: str = "localhost"
@@ -21,9 +26,43 @@ class Settings(BaseSettings):
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
 
+    # 进程内缓存配置（Redis 之前的一级缓存）
+    CACHE_LOCAL_MAX_ENTRIES: int = 512  # 最多缓存的响应条数（LRU淘汰）
+    CACHE_LOCAL_MAX_BYTES: int = 256 * 1024 * 1024  # 进程内缓存估算内存上限（字节，LRU淘汰）
+    CACHE_LOCAL_TTL: int = 60  # 进程内条目最长有效期（秒）
+
+    # Redis缓存编码配置（变更后使用新的键前缀，旧条目按TTL过期）
+    CACHE_SERIALIZER: str = "msgpack"  # msgpack / json
+    CACHE_COMPRESSION: str = "zstd"  # zstd / lz4 / zlib / none
+    CACHE_COMPRESSION_LEVEL: int = 3
+
+    # K线分段缓存（日K线按年分段，任意日期范围由分段拼接）
+    KLINE_SEGMENT_CACHE: bool = True
+    KLINE_SEGMENT_TTL_CURRENT: int = 300  # 当年分段：5分钟
+    KLINE_SEGMENT_TTL_HISTORY: int = 30 * 24 * 3600  # 往年分段：30天
+
+    # 增量指标计算（缓存已完成K线的指标状态，只计算新增K线）
+    INDICATOR_INCREMENTAL: bool = True
+    INDICATOR_STATE_TTL: int = 7 * 24 * 3600  # 指标状态：7天
+    # MA/BOLL 在 ClickHouse 中用窗口函数计算（与K线同一条查询，含预热K线）
+    INDICATOR_SERVER_SIDE: bool = False
+    # 指标自动向前预热（按指标所需K线根数扩展查询范围，返回时截取到请求范围）
+    INDICATOR_WARMUP: bool = True
+
     # 服务配置
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
+    COMPARE_MAX_CODES: int = 50  # 股票对比最多支持的股票数量
+    STOCK_DIRECTORY_REFRESH_SECONDS: int = 3600  # 内存股票目录刷新间隔（秒）
+
+    # 回测配置
+    BACKTEST_WORKERS: int = 0  # 回测进程池大小，0 表示CPU核数
+    BACKTEST_SWEEP_MAX_COMBINATIONS: int = 1000  # 参数寻优最多的参数组合数
+    BACKTEST_PORTFOLIO_MAX_CODES: int = 500  # 组合回测股票池最多的股票数量
+    BACKTEST_MAX_JOBS: int = 2  # 同时执行的回测任务数，其余排队
+    BACKTEST_JOB_TTL: int = 3600  # 回测任务状态与结果保留时间（秒）
+    BACKTEST_RESULT_STORE: bool = True  # 保存回测结果，相同请求且数据未变化时直接返回
+    BACKTEST_RESULT_DIR: str = "data/backtest_results"  # 回测结果文件目录
 
     class Config:
         env_file = ".env"
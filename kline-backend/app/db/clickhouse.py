@@ -1,5 +1,12 @@
 """ClickHouse数据库客户端"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import clickhouse_connect
+from clickhouse_connect.driver import httputil
 from app.core.config import settings
 from app.core.logging_config import get_logger
 
@@ -7,51 +14,164 @@ logger = get_logger(__name__)
 
 
 class ClickHouseClient:
-    """ClickHouse客户端（单例）"""
+    """
+    ClickHouse客户端（单例）
+
+    内部维护一个有界连接池：每次查询独占检出一个 clickhouse_connect 客户端，
+    用完归还，避免多个请求共用同一个HTTP会话串行排队。
+    """
 
     _instance = None
-    _client = None
+    _pool = None
+    _pool_mgr = None
+    _executor = None
+    _created = 0
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
+    def _create_client(self):
+        """新建一个池内客户端"""
+        return clickhouse_connect.get_client(
+            host=settings.CH_HOST,
+            port=settings.CH_PORT,
+            database=settings.CH_DATABASE,
+            username=settings.CH_USER,
+            password=settings.CH_PASSWORD,
+            pool_mgr=self._pool_mgr,
+            # 不使用服务端会话，否则同一会话上的并发查询会被ClickHouse拒绝
+            autogenerate_session_id=False
+        )
+
     def connect(self):
-        """建立数据库连接"""
-        if self._client is None:
-            logger.info(f"正在连接ClickHouse数据库: {settings.CH_HOST}:{settings.CH_PORT}/{settings.CH_DATABASE}")
-            self._client = clickhouse_connect.get_client(
-                host=settings.CH_HOST,
-                port=settings.CH_PORT,
-                database=settings.CH_DATABASE,
-                username=settings.CH_USER,
-                password=settings.CH_PASSWORD
-            )
-            logger.info("ClickHouse数据库连接成功")
-        return self._client
-
-    def get_client(self):
-        """获取客户端实例"""
-        if self._client is None:
-            return self.connect()
-        return self._client
+        """初始化连接池并建立首个连接"""
+        with self._lock:
+            if self._pool is None:
+                logger.info(
+                    f"正在连接ClickHouse数据库: {settings.CH_HOST}:{settings.CH_PORT}/{settings.CH_DATABASE} "
+                    f"(连接池大小={settings.CH_POOL_SIZE})"
+                )
+                self._pool_mgr = httputil.get_pool_manager(maxsize=settings.CH_POOL_SIZE)
+                self._pool = queue.LifoQueue(maxsize=settings.CH_POOL_SIZE)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.CH_POOL_SIZE,
+                    thread_name_prefix="clickhouse"
+                )
+                self._pool.put((self._create_client(), time.monotonic()))
+                self._created = 1
+                logger.info("ClickHouse数据库连接成功")
+        return self
+
+    def _acquire(self):
+        """从池中检出一个客户端，必要时新建或等待"""
+        if self._pool is None:
+            self.connect()
+
+        try:
+            client, last_used = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < settings.CH_POOL_SIZE
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return self._create_client()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            try:
+                client, last_used = self._pool.get(timeout=settings.CH_POOL_TIMEOUT)
+            except queue.Empty:
+                raise TimeoutError(f"等待ClickHouse连接超时（{settings.CH_POOL_TIMEOUT}秒）")
+
+        # 空闲过久的连接先做健康检查，失效则重建
+        if last_used is None or time.monotonic() - last_used > settings.CH_POOL_HEALTH_CHECK_INTERVAL:
+            if not client.ping():
+                logger.warning("ClickHouse连接健康检查失败，重建连接")
+                client.close()
+                try:
+                    client = self._create_client()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+        return client
+
+    def _release(self, client, healthy: bool = True):
+        """归还客户端；出错的连接标记为待检查，下次检出时先ping"""
+        if self._pool is None:
+            # 连接池已关闭
+            client.close()
+            return
+        self._pool.put_nowait((client, time.monotonic() if healthy else None))
+
+    @contextmanager
+    def checkout(self):
+        """检出一个连接（上下文管理器）"""
+        client = self._acquire()
+        healthy = True
+        try:
+            yield client
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self._release(client, healthy)
 
     def query_df(self, query: str):
         """执行查询并返回DataFrame"""
-        client = self.get_client()
-        return client.query_df(query)
+        with self.checkout() as client:
+            return client.query_df(query)
 
     def query(self, query: str):
         """执行查询并返回原始结果"""
-        client = self.get_client()
-        return client.query(query)
+        with self.checkout() as client:
+            return client.query(query)
+
+    async def query_df_async(self, query: str):
+        """在工作线程池中执行查询并返回DataFrame，不阻塞事件循环"""
+        if self._pool is None:
+            self.connect()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.query_df, query)
+
+    async def query_async(self, query: str):
+        """在工作线程池中执行查询并返回原始结果，不阻塞事件循环"""
+        if self._pool is None:
+            self.connect()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.query, query)
+
+    def pool_status(self) -> dict:
+        """连接池状态"""
+        if self._pool is None:
+            return {"size": settings.CH_POOL_SIZE, "created": 0, "idle": 0}
+        return {
+            "size": settings.CH_POOL_SIZE,
+            "created": self._created,
+            "idle": self._pool.qsize()
+        }
 
     def close(self):
-        """关闭连接"""
-        if self._client:
-            self._client.close()
-            self._client = None
+        """关闭连接池"""
+        with self._lock:
+            if self._pool is None:
+                return
+            while True:
+                try:
+                    client, _ = self._pool.get_nowait()
+                except queue.Empty:
+                    break
+                client.close()
+            self._executor.shutdown(wait=False)
+            self._pool = None
+            self._executor = None
+            self._created = 0
             logger.info("ClickHouse连接已关闭")
 
 
@@ -1,10 +1,10 @@
 """Redis客户端"""
-import redis
+import redis.asyncio as redis
 from app.core.config import settings
 
 
 class RedisClient:
-    """Redis客户端（单例）"""
+    """Redis客户端（单例，基于 redis.asyncio，不阻塞事件循环）"""
 
     _instance = None
     _client = None
@@ -21,7 +21,8 @@ class RedisClient:
                 host=settings.REDIS_HOST,
                 port=settings.REDIS_PORT,
                 db=settings.REDIS_DB,
-                decode_responses=True
+                # 缓存值为压缩后的二进制数据，不做字符串解码
+                decode_responses=False
             )
             print(f"已连接到Redis: {settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}")
         return self._client
@@ -32,10 +33,10 @@ class RedisClient:
             return self.connect()
         return self._client
 
-    def close(self):
+    async def close(self):
         """关闭连接"""
         if self._client:
-            self._client.close()
+            await self._client.aclose()
             self._client = None
             print("Redis连接已关闭")
 
@@ -6,6 +6,10 @@ from app.api.endpoints import stock, kline, compare, backtest
 from app.core.ssh_tunnel import tunnel_manager
 from app.db.clickhouse import db_client
 from app.db.redis import redis_client
+from app.services.stock_directory import stock_directory
+from app.services.cache_service import CacheService
+from app.services.backtest.sweep import backtest_pool
+from app.services.backtest.jobs import job_manager
 from app.core.logging_config import setup_logging, get_logger
 from app.core.middleware import ErrorHandlerMiddleware, LoggingMiddleware
 
@@ -34,6 +38,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"ClickHouse连接失败: {e}", exc_info=True)
 
+    # 加载股票目录（失败不阻塞，后台任务会定期重试）
+    try:
+        await stock_directory.start(db_client)
+        logger.info("股票目录加载成功")
+    except Exception as e:
+        logger.error(f"股票目录加载失败: {e}", exc_info=True)
+
     # 连接Redis（失败不阻塞）
     try:
         redis_client.connect()
@@ -47,6 +58,9 @@ async def lifespan(app: FastAPI):
 
     # 关闭时
     logger.info("正在关闭服务...")
+    await stock_directory.stop()
+    await job_manager.shutdown()
+    backtest_pool.shutdown()
     try:
         tunnel_manager.stop()
         logger.info("SSH隧道已关闭")
@@ -58,7 +72,7 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"ClickHouse关闭失败: {e}")
     try:
-        redis_client.close()
+        await redis_client.close()
         logger.info("Redis已关闭")
     except Exception as e:
         logger.error(f"Redis关闭失败: {e}")
@@ -119,5 +133,8 @@ async def health():
     """健康检查"""
     return {
         "status": "ok",
-        "ssh_tunnel": tunnel_manager.is_alive()
+        "ssh_tunnel": tunnel_manager.is_alive(),
+        "clickhouse_pool": db_client.pool_status(),
+        "stock_directory": stock_directory.status(),
+        "cache": CacheService.stats()
     }
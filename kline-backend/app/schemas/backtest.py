@@ -79,6 +79,7 @@ class BacktestData(BaseModel):
     trades: List[TradeRecord]
     equity_curve: List[Dict[str, Any]]  # 资金曲线 [{date, value}, ...]
     buy_hold_curve: Optional[List[Dict[str, Any]]] = None  # 买入持有基准曲线
+    result_id: Optional[str] = Field(None, description="结果ID，可通过 /results/{result_id} 重新打开")
 
 
 class BacktestResponse(BaseModel):
@@ -88,6 +89,149 @@ class BacktestResponse(BaseModel):
     data: Optional[BacktestData] = None
 
 
+class BacktestSeries(BaseModel):
+    """回测每日序列（列式，各数组与 dates 一一对应）"""
+    dates: List[str]
+    equity: List[float] = Field(..., description="总资产（资金曲线）")
+    cash: List[float] = Field(..., description="现金")
+    market_value: List[float] = Field(..., description="持仓市值")
+    benchmark: List[float] = Field(..., description="买入持有基准")
+    price: List[float] = Field(..., description="收盘价（持仓估值价格）")
+
+
+class BacktestCompactData(BaseModel):
+    """回测结果数据（紧凑格式：每日数据为列式数组，持仓只在变化日给出）"""
+    stock_code: str
+    stock_name: str
+    start_date: str
+    end_date: str
+    strategy_name: str
+    strategy_params: Dict[str, Any]
+    initial_capital: float
+    final_capital: float
+    metrics: BacktestMetricsData
+    trades: List[TradeRecord]
+    series: BacktestSeries
+    position_changes: List[DailyPosition] = Field(
+        ..., description="持仓变化日的账户快照，其余日期持股与前一快照相同、按当日价格估值"
+    )
+    result_id: Optional[str] = Field(None, description="结果ID，可通过 /results/{result_id} 重新打开")
+
+
+class DailyPositionPage(BaseModel):
+    """每日持仓明细（分页）"""
+    total: int = Field(..., description="总天数")
+    offset: int
+    limit: int
+    items: List[DailyPosition]
+
+
+class DailyPositionPageResponse(BaseModel):
+    """每日持仓明细响应"""
+    code: int = 0
+    message: str = "success"
+    data: Optional[DailyPositionPage] = None
+
+
+class BacktestJobInfo(BaseModel):
+    """回测任务状态"""
+    job_id: str
+    kind: str
+    status: str = Field(..., description="queued/running/succeeded/failed")
+    progress: float = Field(..., description="进度（0-1）")
+    stage: str = Field(..., description="当前阶段")
+    error: Optional[str] = None
+    error_code: Optional[int] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class BacktestJobResponse(BaseModel):
+    """回测任务响应"""
+    code: int = 0
+    message: str = "success"
+    data: Optional[BacktestJobInfo] = None
+
+
+class BacktestSweepRequest(BaseModel):
+    """参数寻优请求"""
+    code: str = Field(..., description="股票代码")
+    start_date: str = Field(..., description="回测开始日期 YYYY-MM-DD")
+    end_date: str = Field(..., description="回测结束日期 YYYY-MM-DD")
+    strategy_id: str = Field(..., description="策略ID")
+    strategy_params: Dict[str, Any] = Field(default_factory=dict, description="固定的策略参数")
+    param_grid: Dict[str, List[Any]] = Field(..., description="参数网格 {参数名: 候选值列表}")
+    initial_capital: float = Field(100000.0, description="初始资金")
+    position_ratio: float = Field(0.8, description="单次买入仓位比例（0-1）")
+    sort_by: str = Field("sharpe_ratio", description="排序指标（max_drawdown 升序，其余降序）")
+    top: Optional[int] = Field(None, description="只返回排名前 N 的组合")
+
+
+class SweepResult(BaseModel):
+    """单个参数组合的回测结果"""
+    rank: int
+    params: Dict[str, Any]
+    final_capital: float
+    metrics: BacktestMetricsData
+
+
+class BacktestSweepData(BaseModel):
+    """参数寻优结果"""
+    stock_code: str
+    stock_name: str
+    start_date: str
+    end_date: str
+    strategy_id: str
+    strategy_name: str
+    sort_by: str
+    total_combinations: int
+    results: List[SweepResult]
+
+
+class BacktestSweepResponse(BaseModel):
+    """参数寻优响应"""
+    code: int = 0
+    message: str = "success"
+    data: Optional[BacktestSweepData] = None
+
+
+class PortfolioBacktestRequest(BaseModel):
+    """组合回测请求"""
+    codes: List[str] = Field(..., description="股票池")
+    start_date: str = Field(..., description="回测开始日期 YYYY-MM-DD")
+    end_date: str = Field(..., description="回测结束日期 YYYY-MM-DD")
+    strategy_id: str = Field(..., description="策略ID")
+    strategy_params: Dict[str, Any] = Field(default_factory=dict, description="策略参数")
+    initial_capital: float = Field(1000000.0, description="初始资金")
+    max_positions: int = Field(10, ge=1, description="最大同时持仓数")
+    allocation: str = Field("equal", description="资金分配: equal=总资产/最大持仓数, cash=可用现金按比例均分")
+    position_ratio: float = Field(0.8, description="cash 分配方式下每日买入使用的现金比例（0-1）")
+
+
+class PortfolioBacktestData(BaseModel):
+    """组合回测结果"""
+    codes: List[str]
+    start_date: str
+    end_date: str
+    strategy_name: str
+    strategy_params: Dict[str, Any]
+    initial_capital: float
+    final_capital: float
+    metrics: BacktestMetricsData
+    holdings: List[PositionInfo]  # 期末持仓
+    trades: List[TradeRecord]
+    equity_curve: List[Dict[str, Any]]  # 资金曲线 [{date, value}, ...]
+    buy_hold_curve: Optional[List[Dict[str, Any]]] = None  # 等权买入持有基准曲线
+
+
+class PortfolioBacktestResponse(BaseModel):
+    """组合回测响应"""
+    code: int = 0
+    message: str = "success"
+    data: Optional[PortfolioBacktestData] = None
+
+
 class StrategyParam(BaseModel):
     """策略参数定义"""
     name: str
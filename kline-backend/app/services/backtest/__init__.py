@@ -1,14 +1,40 @@
 """回测模块"""
-from .engine import BacktestEngine, Position, Trade, DailyRecord
-from .strategies import Strategy, StrategyFactory
+from .engine import BacktestEngine, ArrayBacktestEngine, Position, Trade, DailyRecord
+from .strategies import Strategy, StrategyFactory, SignalArrays
 from .metrics import BacktestMetrics
+from .runner import run_strategy, buy_hold_values, summarize
+from .sweep import backtest_pool, expand_grid, rank_results, run_sweep
+from .portfolio import run_portfolio, equal_weight_values, ALLOCATIONS
+from .reports import execute_backtest, execute_portfolio_backtest, daily_positions, expand_report
+from .jobs import job_manager, JobFailed
+from .store import backtest_result_store, result_key
 
 __all__ = [
     'BacktestEngine',
+    'ArrayBacktestEngine',
     'Position',
     'Trade',
     'DailyRecord',
     'Strategy',
     'StrategyFactory',
-    'BacktestMetrics'
+    'SignalArrays',
+    'BacktestMetrics',
+    'run_strategy',
+    'buy_hold_values',
+    'summarize',
+    'backtest_pool',
+    'expand_grid',
+    'rank_results',
+    'run_sweep',
+    'run_portfolio',
+    'equal_weight_values',
+    'ALLOCATIONS',
+    'execute_backtest',
+    'execute_portfolio_backtest',
+    'daily_positions',
+    'expand_report',
+    'job_manager',
+    'JobFailed',
+    'backtest_result_store',
+    'result_key'
 ]
@@ -2,24 +2,37 @@
 from typing import List, Dict, Optional
 from datetime import datetime
 from decimal import Decimal
+import numpy as np
 
 
 class Position:
     """持仓信息"""
-    def __init__(self, code: str, name: str, shares: int, avg_price: float, current_price: float):
+    __slots__ = ('code', 'name', 'shares', 'avg_price', 'current_price', 'market_value', 'cost', 'profit', 'profit_pct')
+
+    def __init__(
+        self,
+        code: str,
+        name: str,
+        shares: int,
+        avg_price: float,
+        current_price: float,
+        cost: Optional[float] = None
+    ):
         self.code = code
         self.name = name
         self.shares = shares
         self.avg_price = avg_price
         self.current_price = current_price
         self.market_value = shares * current_price
-        self.cost = shares * avg_price
+        self.cost = shares * avg_price if cost is None else cost
         self.profit = self.market_value - self.cost
         self.profit_pct = (self.profit / self.cost * 100) if self.cost > 0 else 0
 
 
 class Trade:
     """交易记录"""
+    __slots__ = ('date', 'code', 'name', 'action', 'price', 'shares', 'amount', 'commission', 'reason')
+
     def __init__(
         self,
         date: str,
@@ -45,6 +58,8 @@ class Trade:
 
 class DailyRecord:
     """每日账户记录"""
+    __slots__ = ('date', 'cash', 'market_value', 'total_value', 'positions')
+
     def __init__(
         self,
         date: str,
@@ -244,3 +259,391 @@ class BacktestEngine:
         """获取总资产"""
         market_value = sum(pos.market_value for pos in self.positions.values())
         return self.cash + market_value
+
+
+class ArrayBacktestEngine(BacktestEngine):
+    """
+    数组账本回测引擎
+
+    与 BacktestEngine 接口相同，但账户状态保存在预分配的 NumPy 数组中：
+    - 当前状态：每只股票的持股数、持仓成本、最新价格
+    - 历史状态：每根K线的现金、持股数、持仓成本、价格（K线数 x 股票数）
+    record_daily 只写入一行数组，DailyRecord / Position 对象仅在访问 daily_records 时生成。
+    """
+
+    def __init__(
+        self,
+        codes: List[str],
+        n_bars: int,
+        initial_capital: float = 100000.0,
+        commission_rate: float = 0.0003,
+        tax_rate: float = 0.001,
+        min_commission: float = 5.0,
+        names: Optional[Dict[str, str]] = None
+    ):
+        # 不调用父类构造函数：positions / daily_records 由数组按需生成
+        self.initial_capital = initial_capital
+        self.commission_rate = commission_rate
+        self.tax_rate = tax_rate
+        self.min_commission = min_commission
+
+        self.codes = list(codes)
+        self.names = names or {}
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        n_codes = len(self.codes)
+
+        # 当前状态
+        self.cash = initial_capital
+        self.shares = np.zeros(n_codes, dtype=np.int64)
+        self.cost = np.zeros(n_codes, dtype=np.float64)
+        self.prices = np.zeros(n_codes, dtype=np.float64)
+
+        # 历史状态（按K线预分配，超出时扩容）
+        self.dates: List[str] = []
+        self.cash_history = np.zeros(n_bars, dtype=np.float64)
+        self.shares_history = np.zeros((n_bars, n_codes), dtype=np.int64)
+        self.cost_history = np.zeros((n_bars, n_codes), dtype=np.float64)
+        self.price_history = np.zeros((n_bars, n_codes), dtype=np.float64)
+
+        self.trades: List[Trade] = []
+
+    def buy(
+        self,
+        date: str,
+        code: str,
+        name: str,
+        price: float,
+        shares: int,
+        reason: str = ""
+    ) -> bool:
+        """买入股票"""
+        shares = (shares // 100) * 100
+        if shares == 0:
+            return False
+
+        amount = price * shares
+        commission = self.calculate_commission(amount, is_sell=False)
+        total_cost = amount + commission
+        if total_cost > self.cash:
+            return False
+
+        i = self._index[code]
+        self.cash -= total_cost
+        self.shares[i] += shares
+        self.cost[i] += amount
+        self.prices[i] = price
+        self.names.setdefault(code, name)
+
+        self.trades.append(Trade(
+            date=date,
+            code=code,
+            name=name,
+            action='buy',
+            price=price,
+            shares=shares,
+            amount=amount,
+            commission=commission,
+            reason=reason
+        ))
+        return True
+
+    def sell(
+        self,
+        date: str,
+        code: str,
+        name: str,
+        price: float,
+        shares: Optional[int] = None,
+        reason: str = ""
+    ) -> bool:
+        """卖出股票"""
+        i = self._index.get(code)
+        if i is None or self.shares[i] == 0:
+            return False
+
+        held = int(self.shares[i])
+        if shares is None:
+            shares = held
+        shares = (shares // 100) * 100
+        if shares == 0 or shares > held:
+            return False
+
+        amount = price * shares
+        commission = self.calculate_commission(amount, is_sell=True)
+        self.cash += (amount - commission)
+
+        if shares == held:
+            self.shares[i] = 0
+            self.cost[i] = 0.0
+        else:
+            # 部分卖出：按均价扣减成本
+            self.cost[i] = self.cost[i] / held * (held - shares)
+            self.shares[i] = held - shares
+
+        self.trades.append(Trade(
+            date=date,
+            code=code,
+            name=name,
+            action='sell',
+            price=price,
+            shares=shares,
+            amount=amount,
+            commission=commission,
+            reason=reason
+        ))
+        return True
+
+    def calculate_commissions(self, amounts: np.ndarray, is_sell: bool = False) -> np.ndarray:
+        """批量计算手续费（与 calculate_commission 口径一致）"""
+        commissions = np.maximum(amounts * self.commission_rate, self.min_commission)
+        if is_sell:
+            commissions = commissions + amounts * self.tax_rate
+        return commissions
+
+    def buy_many(
+        self,
+        date: str,
+        idx: np.ndarray,
+        shares: np.ndarray,
+        prices: np.ndarray,
+        reasons: List[str]
+    ) -> np.ndarray:
+        """
+        同一日批量买入（按 idx 顺序依次占用现金，现金不足的买单不成交）
+
+        Args:
+            date: 日期
+            idx: 股票序号数组（codes 中的位置）
+            shares: 买入股数（向下取整到整百股）
+            prices: 成交价格
+            reasons: 每笔买入的原因
+
+        Returns:
+            np.ndarray: 每笔买单是否成交
+        """
+        shares = (shares // 100) * 100
+        amounts = prices * shares
+        total_costs = amounts + self.calculate_commissions(amounts)
+        total_costs[shares == 0] = 0.0
+
+        # 按顺序占用现金（当日买单很少，逐笔判断）
+        filled = np.zeros(len(idx), dtype=bool)
+        cash = self.cash
+        for k in np.flatnonzero(shares > 0).tolist():
+            if total_costs[k] <= cash:
+                cash -= total_costs[k]
+                filled[k] = True
+        if not filled.any():
+            return filled
+
+        self.cash = cash
+        fill_idx = idx[filled]
+        np.add.at(self.shares, fill_idx, shares[filled])
+        np.add.at(self.cost, fill_idx, amounts[filled])
+        self.prices[fill_idx] = prices[filled]
+
+        for k in np.flatnonzero(filled).tolist():
+            code = self.codes[idx[k]]
+            self.trades.append(Trade(
+                date=date,
+                code=code,
+                name=self.names.get(code, code),
+                action='buy',
+                price=float(prices[k]),
+                shares=int(shares[k]),
+                amount=float(amounts[k]),
+                commission=float(total_costs[k] - amounts[k]),
+                reason=reasons[k]
+            ))
+        return filled
+
+    def sell_many(self, date: str, idx: np.ndarray, prices: np.ndarray, reasons: List[str]):
+        """
+        同一日批量清仓
+
+        Args:
+            date: 日期
+            idx: 股票序号数组（须为持仓股票）
+            prices: 成交价格
+            reasons: 每笔卖出的原因
+        """
+        if len(idx) == 0:
+            return
+        shares = self.shares[idx].copy()
+        amounts = prices * shares
+        commissions = self.calculate_commissions(amounts, is_sell=True)
+
+        self.cash += float((amounts - commissions).sum())
+        self.shares[idx] = 0
+        self.cost[idx] = 0.0
+        self.prices[idx] = prices
+
+        for k in range(len(idx)):
+            code = self.codes[idx[k]]
+            self.trades.append(Trade(
+                date=date,
+                code=code,
+                name=self.names.get(code, code),
+                action='sell',
+                price=float(prices[k]),
+                shares=int(shares[k]),
+                amount=float(amounts[k]),
+                commission=float(commissions[k]),
+                reason=reasons[k]
+            ))
+
+    def update_prices(self, date: str, prices: Dict[str, float]):
+        """更新持仓价格"""
+        for code, price in prices.items():
+            i = self._index.get(code)
+            if i is not None:
+                self.prices[i] = price
+
+    def update_price_array(self, prices: np.ndarray):
+        """
+        按 codes 顺序整体更新价格
+
+        Args:
+            prices: 与 codes 等长的价格数组，NaN（停牌）保留上一价格
+        """
+        np.copyto(self.prices, prices, where=~np.isnan(prices))
+
+    def record_daily(self, date: str):
+        """记录每日账户状态（写入一行历史数组）"""
+        bar = len(self.dates)
+        if bar >= len(self.cash_history):
+            self._grow(max(bar * 2, 16))
+
+        self.dates.append(date)
+        self.cash_history[bar] = self.cash
+        self.shares_history[bar] = self.shares
+        self.cost_history[bar] = self.cost
+        self.price_history[bar] = self.prices
+
+    def record_bars(self, dates: List[str], prices: np.ndarray):
+        """
+        批量记录无交易的连续K线（现金与持仓不变，只有价格变化）
+
+        Args:
+            dates: 连续K线的日期
+            prices: 价格数组，形状为 (len(dates), len(codes))
+        """
+        n = len(dates)
+        if n == 0:
+            return
+        start = len(self.dates)
+        end = start + n
+        if end > len(self.cash_history):
+            self._grow(max(end, start * 2))
+
+        self.dates.extend(dates)
+        self.cash_history[start:end] = self.cash
+        self.shares_history[start:end] = self.shares
+        self.cost_history[start:end] = self.cost
+        self.price_history[start:end] = prices
+        self.prices[:] = prices[-1]
+
+    def _grow(self, n_bars: int):
+        """历史数组扩容"""
+        def grow(arr: np.ndarray) -> np.ndarray:
+            out = np.zeros((n_bars,) + arr.shape[1:], dtype=arr.dtype)
+            out[:len(arr)] = arr
+            return out
+
+        self.cash_history = grow(self.cash_history)
+        self.shares_history = grow(self.shares_history)
+        self.cost_history = grow(self.cost_history)
+        self.price_history = grow(self.price_history)
+
+    @property
+    def market_value_history(self) -> np.ndarray:
+        """每日持仓市值"""
+        n = len(self.dates)
+        return (self.shares_history[:n] * self.price_history[:n]).sum(axis=1)
+
+    @property
+    def equity(self) -> np.ndarray:
+        """每日总资产（资金曲线）"""
+        return self.cash_history[:len(self.dates)] + self.market_value_history
+
+    def _position(self, i: int, shares: int, cost: float, price: float) -> Position:
+        """生成持仓对象"""
+        code = self.codes[i]
+        return Position(
+            code=code,
+            name=self.names.get(code, code),
+            shares=shares,
+            avg_price=cost / shares,
+            current_price=price,
+            cost=cost
+        )
+
+    def daily_record(self, bar: int) -> DailyRecord:
+        """
+        生成指定K线的账户记录
+
+        Args:
+            bar: K线序号
+
+        Returns:
+            DailyRecord: 该日账户状态（含持仓明细）
+        """
+        shares = self.shares_history[bar]
+        positions = [
+            self._position(i, int(shares[i]), float(self.cost_history[bar, i]), float(self.price_history[bar, i]))
+            for i in np.flatnonzero(shares).tolist()
+        ]
+        market_value = sum(p.market_value for p in positions)
+        cash = float(self.cash_history[bar])
+        return DailyRecord(
+            date=self.dates[bar],
+            cash=cash,
+            market_value=market_value,
+            total_value=cash + market_value,
+            positions=positions
+        )
+
+    @property
+    def daily_records(self) -> List[DailyRecord]:
+        """全部每日账户记录（按需生成）"""
+        return [self.daily_record(bar) for bar in range(len(self.dates))]
+
+    def change_bars(self) -> np.ndarray:
+        """
+        持仓（股数或成本）发生变化的K线序号
+
+        Returns:
+            np.ndarray: 升序的K线序号；首根K线与空仓比较
+        """
+        n = len(self.dates)
+        shares = self.shares_history[:n]
+        cost = self.cost_history[:n]
+        changed = np.empty(n, dtype=bool)
+        if n:
+            changed[0] = shares[0].any() or cost[0].any()
+            changed[1:] = (shares[1:] != shares[:-1]).any(axis=1) | (cost[1:] != cost[:-1]).any(axis=1)
+        return np.flatnonzero(changed)
+
+    @property
+    def positions(self) -> Dict[str, Position]:
+        """当前持仓"""
+        return {
+            self.codes[i]: self._position(i, int(self.shares[i]), float(self.cost[i]), float(self.prices[i]))
+            for i in np.flatnonzero(self.shares).tolist()
+        }
+
+    def get_current_position(self, code: str) -> Optional[Position]:
+        """获取当前持仓"""
+        i = self._index.get(code)
+        if i is None or self.shares[i] == 0:
+            return None
+        return self._position(i, int(self.shares[i]), float(self.cost[i]), float(self.prices[i]))
+
+    def has_position(self, code: str) -> bool:
+        """是否持有某股票"""
+        i = self._index.get(code)
+        return i is not None and self.shares[i] > 0
+
+    def get_total_value(self) -> float:
+        """获取总资产"""
+        return self.cash + float(self.shares @ self.prices)
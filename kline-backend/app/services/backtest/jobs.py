@@ -0,0 +1,241 @@
+"""回测任务队列"""
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.services.cache_service import CacheService
+
+logger = get_logger(__name__)
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class JobFailed(Exception):
+    """任务执行失败（错误信息可直接返回给客户端）"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BacktestJob:
+    """回测任务"""
+    __slots__ = (
+        'id', 'kind', 'status', 'progress', 'stage', 'error', 'error_code', 'result',
+        'created_at', 'started_at', 'finished_at', '_changed'
+    )
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = 0.0
+        self.stage = '排队中'
+        self.error: Optional[str] = None
+        self.error_code: Optional[int] = None
+        self.result: Any = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        """任务状态（不含结果）"""
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'stage': self.stage,
+            'error': self.error,
+            'error_code': self.error_code,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    """
+    回测任务管理（单例）
+
+    任务在事件循环中调度，计算部分由任务函数提交到回测进程池，请求处理协程只负责提交和查询。
+    同时运行的任务数受 BACKTEST_MAX_JOBS 限制，其余任务排队。
+    任务状态与结果同时写入缓存（Redis），多进程部署时其他进程也能查询；
+    进度推送（SSE）在本进程内实时通知，非本进程的任务按间隔轮询缓存。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._jobs = {}  # job_id -> BacktestJob
+            cls._instance._tasks = {}  # job_id -> asyncio.Task
+            cls._instance._semaphore = None
+        return cls._instance
+
+    @staticmethod
+    def _status_key(job_id: str) -> str:
+        return f"backtest_job:{job_id}"
+
+    @staticmethod
+    def _result_key(job_id: str) -> str:
+        return f"backtest_job_result:{job_id}"
+
+    def _prune(self):
+        """移除已过期的已完成任务"""
+        expire_before = time.time() - settings.BACKTEST_JOB_TTL
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < expire_before
+        ]:
+            del self._jobs[job_id]
+
+    async def _publish(self, job: BacktestJob):
+        """通知进度订阅者并写入缓存"""
+        job._changed.set()
+        job._changed = asyncio.Event()
+        await CacheService().set(self._status_key(job.id), job.to_dict(), settings.BACKTEST_JOB_TTL, local=False)
+
+    def submit(
+        self,
+        kind: str,
+        func: Callable[[Callable[[float, str], Awaitable[None]]], Awaitable[Any]],
+        to_cache: Callable[[Any], Any] = None
+    ) -> BacktestJob:
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型（如 'run'）
+            func: 任务函数，参数为进度回调 report(progress, stage)，返回任务结果
+            to_cache: 结果写入缓存前的转换（如 Pydantic 模型转 dict），None 表示原样写入
+
+        Returns:
+            BacktestJob: 新任务（状态为 queued）
+        """
+        self._prune()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.BACKTEST_MAX_JOBS)
+
+        job = BacktestJob(kind)
+        self._jobs[job.id] = job
+        task = asyncio.create_task(self._run(job, func, to_cache))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda t: self._tasks.pop(job.id, None))
+        logger.info(f"回测任务已提交: {job.id} ({kind})")
+        return job
+
+    async def _run(self, job: BacktestJob, func, to_cache):
+        """执行任务并记录状态"""
+        await self._publish(job)
+
+        async def report(progress: float, stage: str):
+            job.progress = progress
+            job.stage = stage
+            await self._publish(job)
+
+        # 等待执行名额也在 try 内：排队中被取消（如服务关闭）的任务同样发布为失败
+        try:
+            async with self._semaphore:
+                job.status = RUNNING
+                job.started_at = time.time()
+                await report(0.0, '开始执行')
+                result = await func(report)
+                job.result = result
+                await CacheService().set(
+                    self._result_key(job.id),
+                    to_cache(result) if to_cache else result,
+                    settings.BACKTEST_JOB_TTL
+                )
+                job.status = SUCCEEDED
+                job.progress = 1.0
+                job.stage = '已完成'
+        except asyncio.CancelledError:
+            job.status = FAILED
+            job.error = '任务已取消'
+            job.error_code = 503
+            raise
+        except JobFailed as e:
+            job.status = FAILED
+            job.error = str(e)
+            job.error_code = e.status_code
+        except Exception as e:
+            logger.error(f"回测任务失败: {job.id}: {e}", exc_info=True)
+            job.status = FAILED
+            job.error = f"服务器错误: {str(e)}"
+            job.error_code = 500
+        finally:
+            job.finished_at = time.time()
+            await self._publish(job)
+            elapsed = f"{job.finished_at - job.started_at:.2f}s" if job.started_at is not None else '未开始执行'
+            logger.info(f"回测任务结束: {job.id}, 状态={job.status}, 耗时={elapsed}")
+
+    async def get_status(self, job_id: str) -> Optional[dict]:
+        """任务状态，本进程没有时查询缓存"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return await CacheService().get(self._status_key(job_id), local=False)
+
+    async def get_result(self, job_id: str) -> Any:
+        """任务结果（本进程为原始对象，其他进程为缓存中的数据），未完成返回 None"""
+        job = self._jobs.get(job_id)
+        if job is not None and job.status == SUCCEEDED:
+            return job.result
+        return await CacheService().get(self._result_key(job_id))
+
+    async def events(self, job_id: str) -> AsyncIterator[dict]:
+        """
+        任务状态变化流（首条为当前状态，任务结束后停止）
+
+        本进程的任务在状态变化时立即推送；其他进程的任务每秒轮询缓存。
+        超过 15 秒无变化时重复推送当前状态，用作心跳。
+        """
+        last = None
+        while True:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                changed = job._changed
+                status = job.to_dict()
+            else:
+                changed = None
+                status = await CacheService().get(self._status_key(job_id), local=False)
+                if status is None:
+                    return
+
+            if status != last:
+                yield status
+                last = status
+            if status['status'] in FINISHED:
+                return
+
+            if changed is not None:
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    last = None
+            else:
+                await asyncio.sleep(1)
+
+    async def shutdown(self):
+        """取消未完成的任务"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        for task in list(self._tasks.values()):
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+# 全局单例
+job_manager = JobManager()
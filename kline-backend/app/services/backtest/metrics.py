@@ -1,6 +1,7 @@
 """回测绩效指标计算"""
 import math
-from typing import List
+from typing import List, Optional
+import numpy as np
 from .engine import DailyRecord, Trade
 
 
@@ -9,11 +10,21 @@ class BacktestMetrics:
 
     def __init__(
         self,
-        daily_records: List[DailyRecord],
+        daily_records: Optional[List[DailyRecord]],
         trades: List[Trade],
-        initial_capital: float
+        initial_capital: float,
+        equity: Optional[np.ndarray] = None
     ):
-        self.daily_records = daily_records
+        """
+        Args:
+            daily_records: 每日账户记录（提供 equity 时可为 None）
+            trades: 交易记录
+            initial_capital: 初始资金
+            equity: 每日总资产数组（如 ArrayBacktestEngine.equity），避免生成每日记录
+        """
+        if equity is None:
+            equity = np.array([r.total_value for r in daily_records or []], dtype=np.float64)
+        self.equity = np.asarray(equity, dtype=np.float64)
         self.trades = trades
         self.initial_capital = initial_capital
 
@@ -31,67 +42,48 @@ class BacktestMetrics:
 
     def _calculate_total_return(self) -> float:
         """计算总收益率"""
-        if not self.daily_records:
+        if len(self.equity) == 0:
             return 0.0
 
-        final_value = self.daily_records[-1].total_value
+        final_value = float(self.equity[-1])
         return (final_value - self.initial_capital) / self.initial_capital * 100
 
     def _calculate_annual_return(self) -> float:
         """计算年化收益率"""
-        if not self.daily_records or len(self.daily_records) < 2:
+        if len(self.equity) < 2:
             return 0.0
 
-        days = len(self.daily_records)
+        days = len(self.equity)
         years = days / 252  # 一年约252个交易日
 
         if years <= 0:
             return 0.0
 
-        final_value = self.daily_records[-1].total_value
+        final_value = float(self.equity[-1])
         return (pow(final_value / self.initial_capital, 1 / years) - 1) * 100
 
     def _calculate_max_drawdown(self) -> float:
         """计算最大回撤"""
-        if not self.daily_records:
+        if len(self.equity) == 0:
             return 0.0
 
-        peak = self.daily_records[0].total_value
-        max_dd = 0.0
-
-        for record in self.daily_records:
-            if record.total_value > peak:
-                peak = record.total_value
-
-            dd = (peak - record.total_value) / peak * 100
-            if dd > max_dd:
-                max_dd = dd
-
-        return max_dd
+        peak = np.maximum.accumulate(self.equity)
+        return max(float(((peak - self.equity) / peak * 100).max()), 0.0)
 
     def _calculate_sharpe_ratio(self, risk_free_rate: float = 0.03) -> float:
         """
         计算夏普比率
         risk_free_rate: 无风险利率（年化），默认3%
         """
-        if not self.daily_records or len(self.daily_records) < 2:
+        if len(self.equity) < 2:
             return 0.0
 
-        # 计算每日收益率
-        daily_returns = []
-        for i in range(1, len(self.daily_records)):
-            prev_value = self.daily_records[i-1].total_value
-            curr_value = self.daily_records[i].total_value
-            daily_return = (curr_value - prev_value) / prev_value
-            daily_returns.append(daily_return)
-
-        if not daily_returns:
-            return 0.0
+        # 每日收益率
+        daily_returns = np.diff(self.equity) / self.equity[:-1]
 
-        # 计算平均收益率和标准差
-        avg_return = sum(daily_returns) / len(daily_returns)
-        variance = sum((r - avg_return) ** 2 for r in daily_returns) / len(daily_returns)
-        std_dev = math.sqrt(variance)
+        # 平均收益率和标准差（总体标准差）
+        avg_return = float(daily_returns.mean())
+        std_dev = float(daily_returns.std())
 
         if std_dev == 0:
             return 0.0
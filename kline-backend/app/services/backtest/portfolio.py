@@ -0,0 +1,174 @@
+"""多股票组合回测"""
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from app.core.logging_config import get_logger
+from .engine import ArrayBacktestEngine
+from .strategies import Strategy
+
+logger = get_logger(__name__)
+
+# 资金分配方式
+ALLOCATIONS = ('equal', 'cash')
+
+
+def panel_signals(strategy: Strategy, panel: dict) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    逐只股票生成信号并对齐到面板
+
+    每只股票只用自身有数据的交易日计算指标（停牌日不参与），信号写回面板对应位置。
+
+    Args:
+        strategy: 策略实例
+        panel: KLineService.get_kline_panel 返回的面板
+
+    Returns:
+        tuple: (动作面板 int8 (日期数, 股票数)，信号原因所需的指标值面板或 None)
+    """
+    dates = np.array(panel['dates'], dtype=object)
+    close = panel['close']
+    actions = np.zeros(close.shape, dtype=np.int8)
+    values = None
+
+    for j in range(close.shape[1]):
+        rows = np.flatnonzero(~np.isnan(close[:, j]))
+        if len(rows) == 0:
+            continue
+        df = pd.DataFrame({
+            'date': dates[rows].tolist(),
+            **{field: panel[field][rows, j] for field in ('open', 'close', 'high', 'low', 'volume')}
+        })
+
+        signals = strategy.compute_signals(df)
+        actions[rows, j] = signals.actions
+        if signals.values is not None:
+            if values is None:
+                values = np.full(close.shape, np.nan)
+            values[rows, j] = signals.values
+
+    return actions, values
+
+
+def equal_weight_values(close: np.ndarray, initial_capital: float) -> np.ndarray:
+    """
+    等权买入持有基准的每日市值
+
+    资金平均分给每只股票，在其首个交易日按收盘价买入整百股，未买入部分保留为现金。
+
+    Args:
+        close: 收盘价面板 (日期数, 股票数)，停牌为 NaN
+        initial_capital: 初始资金
+
+    Returns:
+        np.ndarray: 每日市值
+    """
+    n_dates, n_codes = close.shape
+    if n_dates == 0 or n_codes == 0:
+        return np.full(n_dates, initial_capital, dtype=np.float64)
+
+    budget = initial_capital / n_codes
+    valid = ~np.isnan(close)
+    first = valid.argmax(axis=0)
+    has_data = valid.any(axis=0)
+    first_price = np.where(has_data, close[first, np.arange(n_codes)], np.nan)
+    shares = np.where(has_data, np.floor(budget * 0.999 / first_price / 100) * 100, 0.0)
+
+    prices = pd.DataFrame(close).ffill().to_numpy()
+    bought = np.arange(n_dates)[:, None] >= first[None, :]
+    bought &= has_data[None, :]
+    held_value = np.where(bought, shares * np.nan_to_num(prices), 0.0)
+    cash = np.where(bought, budget - shares * np.nan_to_num(first_price), budget)
+    return (held_value + cash).sum(axis=1)
+
+
+def run_portfolio(
+    strategy: Strategy,
+    panel: dict,
+    initial_capital: float,
+    max_positions: int,
+    allocation: str = 'equal',
+    position_ratio: float = 0.8,
+    names: Optional[Dict[str, str]] = None
+) -> ArrayBacktestEngine:
+    """
+    多股票组合回测（所有股票共用一个账户，逐日对全部股票向量化处理）
+
+    每个交易日：
+    1. 持仓股票出现卖出信号 → 清仓
+    2. 未持仓股票出现买入信号 → 在剩余仓位数内按股票顺序买入
+       - equal: 每只目标市值为 总资产 / max_positions（不超过可用现金的均分额）
+       - cash: 可用现金 × position_ratio 在当日买入的股票间均分
+    停牌股票不交易，市值按最近收盘价计算。
+
+    Args:
+        strategy: 策略实例
+        panel: KLineService.get_kline_panel 返回的面板
+        initial_capital: 初始资金
+        max_positions: 最大同时持仓数
+        allocation: 资金分配方式 'equal'/'cash'
+        position_ratio: cash 方式下每日买入使用的现金比例
+        names: {code: 股票名称}
+
+    Returns:
+        ArrayBacktestEngine: 模拟结束后的回测引擎
+
+    Raises:
+        ValueError: 未知的资金分配方式
+    """
+    if allocation not in ALLOCATIONS:
+        raise ValueError(f"不支持的资金分配方式: {allocation}")
+
+    dates = panel['dates']
+    codes = panel['codes']
+    close = panel['close']
+    tradable = ~np.isnan(close)
+    # 估值价格：停牌日沿用最近收盘价，上市前为 0（不可能持仓）
+    prices = np.nan_to_num(pd.DataFrame(close).ffill().to_numpy())
+
+    actions, values = panel_signals(strategy, panel)
+    actions[~tradable] = 0
+    logger.info(f"组合信号: {len(codes)} 只股票, {len(dates)} 个交易日, {int(np.count_nonzero(actions))} 个信号")
+
+    engine = ArrayBacktestEngine(
+        codes=codes,
+        n_bars=len(dates),
+        initial_capital=initial_capital,
+        names=names
+    )
+
+    def reasons(action: str, t: int, idx: np.ndarray) -> List[str]:
+        row = values[t, idx] if values is not None else [None] * len(idx)
+        return [strategy.signal_reason(action, None if v is None else float(v)) for v in row]
+
+    # 只在有信号的交易日逐日处理，其间的交易日整段记录
+    prev = 0
+    for t in np.flatnonzero(actions.any(axis=1)).tolist():
+        engine.record_bars(dates[prev:t], prices[prev:t])
+        prev = t + 1
+
+        engine.update_price_array(prices[t])
+        date = dates[t]
+        held = engine.shares > 0
+
+        # 1. 卖出
+        sell_idx = np.flatnonzero((actions[t] < 0) & held)
+        engine.sell_many(date, sell_idx, prices[t, sell_idx], reasons('sell', t, sell_idx))
+
+        # 2. 买入（不超过剩余仓位数）
+        slots = max_positions - int(np.count_nonzero(engine.shares))
+        buy_idx = np.flatnonzero((actions[t] > 0) & (engine.shares == 0))[:max(slots, 0)]
+        if len(buy_idx):
+            buy_prices = prices[t, buy_idx]
+            if allocation == 'equal':
+                budget = min(engine.get_total_value() / max_positions, engine.cash / len(buy_idx))
+            else:
+                budget = engine.cash * position_ratio / len(buy_idx)
+            # 预留手续费
+            budget = budget / (1 + engine.commission_rate) - engine.min_commission
+            shares = (np.floor(budget / buy_prices / 100) * 100).astype(np.int64)
+            engine.buy_many(date, buy_idx, shares, buy_prices, reasons('buy', t, buy_idx))
+
+        engine.record_daily(date)
+
+    engine.record_bars(dates[prev:], prices[prev:])
+    return engine
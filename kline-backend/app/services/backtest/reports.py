@@ -0,0 +1,258 @@
+"""回测执行与结果构建"""
+import bisect
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from app.core.logging_config import get_logger
+from app.schemas.backtest import (
+    BacktestRequest,
+    BacktestData,
+    BacktestCompactData,
+    BacktestSeries,
+    BacktestMetricsData,
+    TradeRecord,
+    PositionInfo,
+    DailyPosition,
+    PortfolioBacktestRequest,
+    PortfolioBacktestData
+)
+from .engine import Position, Trade
+from .portfolio import run_portfolio, equal_weight_values
+from .runner import run_strategy, buy_hold_values, summarize
+from .strategies import StrategyFactory
+
+logger = get_logger(__name__)
+
+
+def _position_info(p: Position) -> PositionInfo:
+    """持仓对象转换为响应模型"""
+    return PositionInfo(
+        code=p.code,
+        name=p.name,
+        shares=p.shares,
+        avg_price=p.avg_price,
+        current_price=p.current_price,
+        market_value=p.market_value,
+        cost=p.cost,
+        profit=p.profit,
+        profit_pct=p.profit_pct
+    )
+
+
+def _trade_record(t: Trade) -> TradeRecord:
+    """交易对象转换为响应模型"""
+    return TradeRecord(
+        date=t.date,
+        code=t.code,
+        name=t.name,
+        action=t.action,
+        price=t.price,
+        shares=t.shares,
+        amount=t.amount,
+        commission=t.commission,
+        reason=t.reason
+    )
+
+
+def execute_backtest(request: BacktestRequest, columns: dict, stock_name: str) -> BacktestCompactData:
+    """
+    执行单只股票回测并构建结果（CPU密集，在回测进程池或线程池中运行）
+
+    Args:
+        request: 回测请求参数
+        columns: 回测区间的日K线列式数据 {dates, open, close, high, low, volume, ...}
+        stock_name: 股票名称
+
+    Returns:
+        BacktestCompactData: 回测结果（紧凑格式，完整格式由 expand_report 生成）
+    """
+    df = pd.DataFrame({
+        'date': columns['dates'],
+        **{field: columns[field] for field in ('open', 'close', 'high', 'low', 'volume')}
+    })
+
+    # 创建策略
+    strategy = StrategyFactory.create_strategy(
+        request.strategy_id,
+        request.strategy_params
+    )
+
+    # 逐日模拟交易（账户状态保存在数组中）
+    logger.info(f"执行回测: 策略={strategy.name}")
+    engine = run_strategy(
+        strategy, df, request.code, stock_name, request.initial_capital, request.position_ratio
+    )
+
+    # 买入持有基准
+    n = len(engine.dates)
+    benchmark = buy_hold_values(df['close'].to_numpy(dtype=np.float64), request.initial_capital)
+
+    # 计算绩效指标（直接使用资金曲线数组）
+    metrics_dict = summarize(engine, benchmark, request.initial_capital)
+
+    # 每日数据直接取账本数组；持仓只在变化日生成快照
+    series = BacktestSeries(
+        dates=engine.dates,
+        equity=engine.equity.tolist(),
+        cash=engine.cash_history[:n].tolist(),
+        market_value=engine.market_value_history.tolist(),
+        benchmark=benchmark.tolist(),
+        price=engine.price_history[:n, 0].tolist()
+    )
+    position_changes = []
+    for bar in engine.change_bars().tolist():
+        dr = engine.daily_record(bar)
+        position_changes.append(DailyPosition(
+            date=dr.date,
+            cash=dr.cash,
+            market_value=dr.market_value,
+            total_value=dr.total_value,
+            positions=[_position_info(p) for p in dr.positions]
+        ))
+
+    result = BacktestCompactData(
+        stock_code=request.code,
+        stock_name=stock_name,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        strategy_name=strategy.name,
+        strategy_params=request.strategy_params,
+        initial_capital=request.initial_capital,
+        final_capital=engine.get_total_value(),
+        metrics=BacktestMetricsData(**metrics_dict),
+        trades=[_trade_record(t) for t in engine.trades],
+        series=series,
+        position_changes=position_changes
+    )
+
+    logger.info(f"回测完成: 总收益率={metrics_dict['total_return']:.2f}%, 交易次数={len(result.trades)}")
+
+    return result
+
+
+def daily_positions(report: BacktestCompactData, offset: int = 0, limit: Optional[int] = None) -> List[DailyPosition]:
+    """
+    由紧凑结果还原每日持仓明细
+
+    每一天的持股与成本取该日及之前最近的持仓快照，现价取当日价格，计算方式与回测引擎相同。
+
+    Args:
+        report: 紧凑格式的回测结果
+        offset: 起始天序号
+        limit: 天数，None 表示到最后一天
+
+    Returns:
+        list: [DailyPosition, ...]
+    """
+    series = report.series
+    dates = series.dates
+    change_bars = [bisect.bisect_left(dates, c.date) for c in report.position_changes]
+    stop = len(dates) if limit is None else min(offset + limit, len(dates))
+
+    records = []
+    for bar in range(offset, stop):
+        k = bisect.bisect_right(change_bars, bar) - 1
+        price = series.price[bar]
+        positions = [
+            Position(
+                code=p.code,
+                name=p.name,
+                shares=p.shares,
+                avg_price=p.cost / p.shares,
+                current_price=price,
+                cost=p.cost
+            )
+            for p in (report.position_changes[k].positions if k >= 0 else [])
+        ]
+        market_value = sum(p.market_value for p in positions)
+        cash = series.cash[bar]
+        records.append(DailyPosition(
+            date=dates[bar],
+            cash=cash,
+            market_value=market_value,
+            total_value=cash + market_value,
+            positions=[_position_info(p) for p in positions]
+        ))
+    return records
+
+
+def expand_report(report: BacktestCompactData) -> BacktestData:
+    """
+    紧凑结果转换为完整格式（逐日持仓明细 + [{date, value}] 曲线）
+
+    Args:
+        report: 紧凑格式的回测结果
+
+    Returns:
+        BacktestData: 完整格式的回测结果
+    """
+    series = report.series
+    return BacktestData(
+        stock_code=report.stock_code,
+        stock_name=report.stock_name,
+        start_date=report.start_date,
+        end_date=report.end_date,
+        strategy_name=report.strategy_name,
+        strategy_params=report.strategy_params,
+        initial_capital=report.initial_capital,
+        final_capital=report.final_capital,
+        metrics=report.metrics,
+        daily_records=daily_positions(report),
+        trades=report.trades,
+        equity_curve=[{"date": d, "value": v} for d, v in zip(series.dates, series.equity)],
+        buy_hold_curve=[{"date": d, "value": v} for d, v in zip(series.dates, series.benchmark)],
+        result_id=report.result_id
+    )
+
+
+def execute_portfolio_backtest(request: PortfolioBacktestRequest, panel: dict, names: dict) -> PortfolioBacktestData:
+    """
+    执行组合回测计算（CPU密集，在线程池中运行）
+
+    Args:
+        request: 组合回测请求参数
+        panel: 股票池的日K线面板
+        names: {code: 股票名称}
+
+    Returns:
+        PortfolioBacktestData: 回测结果
+    """
+    strategy = StrategyFactory.create_strategy(request.strategy_id, request.strategy_params)
+
+    engine = run_portfolio(
+        strategy,
+        panel,
+        request.initial_capital,
+        request.max_positions,
+        request.allocation,
+        request.position_ratio,
+        names
+    )
+
+    # 等权买入持有基准
+    dates = engine.dates
+    benchmark = equal_weight_values(panel['close'], request.initial_capital)
+    metrics_dict = summarize(engine, benchmark, request.initial_capital)
+
+    holdings = [_position_info(p) for p in engine.positions.values()]
+    trade_records = [_trade_record(t) for t in engine.trades]
+
+    logger.info(
+        f"组合回测完成: {len(panel['codes'])} 只股票, 总收益率={metrics_dict['total_return']:.2f}%, "
+        f"交易次数={len(trade_records)}"
+    )
+
+    return PortfolioBacktestData(
+        codes=panel['codes'],
+        start_date=request.start_date,
+        end_date=request.end_date,
+        strategy_name=strategy.name,
+        strategy_params=request.strategy_params,
+        initial_capital=request.initial_capital,
+        final_capital=engine.get_total_value(),
+        metrics=BacktestMetricsData(**metrics_dict),
+        holdings=holdings,
+        trades=trade_records,
+        equity_curve=[{"date": d, "value": v} for d, v in zip(dates, engine.equity.tolist())],
+        buy_hold_curve=[{"date": d, "value": v} for d, v in zip(dates, benchmark.tolist())]
+    )
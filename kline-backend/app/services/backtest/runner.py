@@ -0,0 +1,135 @@
+"""单只股票回测执行"""
+import numpy as np
+import pandas as pd
+from app.core.logging_config import get_logger
+from .engine import ArrayBacktestEngine
+from .metrics import BacktestMetrics
+from .strategies import Strategy
+
+logger = get_logger(__name__)
+
+
+def run_strategy(
+    strategy: Strategy,
+    df: pd.DataFrame,
+    code: str,
+    name: str,
+    initial_capital: float,
+    position_ratio: float
+) -> ArrayBacktestEngine:
+    """
+    按策略信号逐日模拟交易（空仓时买入信号按仓位比例买入，持仓时卖出信号全部卖出）
+
+    Args:
+        strategy: 策略实例
+        df: 日K线DataFrame（含 date/close/high/low 列，按日期升序）
+        code: 股票代码
+        name: 股票名称
+        initial_capital: 初始资金
+        position_ratio: 单次买入仓位比例（0-1）
+
+    Returns:
+        ArrayBacktestEngine: 模拟结束后的回测引擎（含交易记录和每日账户数组）
+    """
+    signals = strategy.compute_signals(df)
+    actions = signals.actions
+    logger.debug(f"生成了 {int(np.count_nonzero(actions))} 个交易信号: 策略={strategy.name}")
+
+    dates = df['date'].tolist()
+    closes = df['close'].to_numpy(dtype=np.float64)
+
+    # 账户状态保存在数组中
+    engine = ArrayBacktestEngine(
+        codes=[code],
+        n_bars=len(dates),
+        initial_capital=initial_capital,
+        names={code: name}
+    )
+
+    # 只在有信号的K线上逐根处理，其间的K线整段记录（持仓不变）
+    prices = closes.reshape(-1, 1)
+    prev = 0
+    for i in np.flatnonzero(actions).tolist():
+        engine.record_bars(dates[prev:i], prices[prev:i])
+        prev = i + 1
+
+        date = dates[i]
+        close_price = float(closes[i])
+        action = actions[i]
+
+        # 更新持仓价格
+        engine.update_prices(date, {code: close_price})
+
+        reason = strategy.signal_reason(
+            'buy' if action > 0 else 'sell',
+            float(signals.values[i]) if signals.values is not None else None
+        )
+
+        if action > 0:
+            # 买入
+            if not engine.has_position(code):
+                # 计算买入数量
+                buy_amount = engine.cash * position_ratio
+                shares = int(buy_amount / close_price / 100) * 100  # 整百股
+
+                if engine.buy(date=date, code=code, name=name, price=close_price, shares=shares, reason=reason):
+                    logger.debug(f"{date} 买入 {shares}股 @ {close_price:.2f} - {reason}")
+
+        else:
+            # 卖出
+            if engine.has_position(code):
+                shares = engine.get_current_position(code).shares
+                if engine.sell(date=date, code=code, name=name, price=close_price, shares=shares, reason=reason):
+                    logger.debug(f"{date} 卖出 {shares}股 @ {close_price:.2f} - {reason}")
+
+        # 记录当日状态
+        engine.record_daily(date)
+
+    engine.record_bars(dates[prev:], prices[prev:])
+
+    return engine
+
+
+def buy_hold_values(closes: np.ndarray, initial_capital: float) -> np.ndarray:
+    """
+    买入持有基准的每日市值（首日收盘价买入整百股）
+
+    Args:
+        closes: 每日收盘价
+        initial_capital: 初始资金
+
+    Returns:
+        np.ndarray: 每日市值
+    """
+    if len(closes) == 0:
+        return np.zeros(0, dtype=np.float64)
+    buy_hold_shares = int((initial_capital * 0.999) / closes[0] / 100) * 100  # 扣除手续费后能买的股数
+    return buy_hold_shares * closes
+
+
+def summarize(engine: ArrayBacktestEngine, benchmark: np.ndarray, initial_capital: float) -> dict:
+    """
+    计算绩效指标（包含基准对比）
+
+    Args:
+        engine: 模拟结束后的回测引擎
+        benchmark: 买入持有基准的每日市值
+        initial_capital: 初始资金
+
+    Returns:
+        dict: BacktestMetrics.to_dict() 加 buy_hold_return / excess_return
+    """
+    metrics = BacktestMetrics(
+        daily_records=None,
+        trades=engine.trades,
+        initial_capital=initial_capital,
+        equity=engine.equity
+    )
+
+    buy_hold_final_value = float(benchmark[-1]) if len(benchmark) else initial_capital
+    buy_hold_return = (buy_hold_final_value - initial_capital) / initial_capital * 100
+
+    metrics_dict = metrics.to_dict()
+    metrics_dict['buy_hold_return'] = round(buy_hold_return, 2)
+    metrics_dict['excess_return'] = round(metrics.total_return - buy_hold_return, 2)
+    return metrics_dict
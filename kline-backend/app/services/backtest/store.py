@@ -0,0 +1,186 @@
+"""回测结果存储（按请求与数据内容寻址）"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from typing import Any, Optional
+import numpy as np
+import orjson
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.services.cache_codec import CacheCodec
+from .strategies import StrategyFactory
+
+logger = get_logger(__name__)
+
+# 结果格式版本：回测引擎、策略或绩效指标的计算逻辑变更时递增，旧结果自然失效
+RESULT_FORMAT_VERSION = 2
+
+# 参与数据指纹的K线字段（回测只使用这些字段）
+FINGERPRINT_FIELDS = ('open', 'close', 'high', 'low', 'volume')
+
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def normalize_params(strategy_id: str, params: dict) -> dict:
+    """
+    规范化策略参数：补全默认值并按参数名排序（省略默认参数与显式传入默认值视为相同）
+
+    Args:
+        strategy_id: 策略ID
+        params: 请求中的策略参数
+
+    Returns:
+        dict: 规范化后的参数
+    """
+    defaults = {}
+    for definition in StrategyFactory.get_strategy_definitions():
+        if definition['id'] == strategy_id:
+            defaults = {p['name']: p['default'] for p in definition['params']}
+            break
+    merged = {**defaults, **params}
+    return {name: merged[name] for name in sorted(merged)}
+
+
+def data_fingerprint(columns: dict, stock_name: str) -> str:
+    """
+    K线数据指纹（数据版本戳）：日期与价格/成交量逐字节参与哈希，复权价格或数据修正后指纹随之变化
+
+    Args:
+        columns: 回测区间的日K线列式数据
+        stock_name: 股票名称（出现在结果中）
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    digest.update(stock_name.encode())
+    digest.update('\n'.join(columns['dates']).encode())
+    for field in FINGERPRINT_FIELDS:
+        digest.update(np.ascontiguousarray(columns[field], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def result_key(request, columns: dict, stock_name: str) -> str:
+    """
+    回测结果键：规范化的请求参数 + 数据指纹 + 结果格式版本
+
+    Args:
+        request: BacktestRequest
+        columns: 回测区间的日K线列式数据
+        stock_name: 股票名称
+
+    Returns:
+        str: 64位十六进制键
+    """
+    normalized = {
+        'version': RESULT_FORMAT_VERSION,
+        'code': request.code.strip(),
+        'start_date': request.start_date,
+        'end_date': request.end_date,
+        'strategy_id': request.strategy_id,
+        'strategy_params': normalize_params(request.strategy_id, request.strategy_params),
+        'initial_capital': float(request.initial_capital),
+        'position_ratio': float(request.position_ratio),
+        'data': data_fingerprint(columns, stock_name)
+    }
+    return hashlib.sha256(orjson.dumps(normalized, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class BacktestResultStore:
+    """
+    回测结果存储（单例）
+
+    结果按键压缩保存为文件（编码方式与Redis缓存相同），目录按编码前缀区分，切换编码配置后旧文件不会被误读。
+    相同输入的结果不会变化，文件不设有效期；数据变化后键随之改变，旧文件可按修改时间清理。
+    读写在线程池中执行，失败时只记录日志（视为未命中）。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    @property
+    def enabled(self) -> bool:
+        return settings.BACKTEST_RESULT_STORE
+
+    @staticmethod
+    def is_valid_key(key: str) -> bool:
+        """键格式校验（键会拼入文件路径）"""
+        return bool(_KEY_PATTERN.match(key))
+
+    @staticmethod
+    def _codec() -> CacheCodec:
+        # 每次调用新建编码器：压缩上下文非线程安全，这里在线程池中使用
+        return CacheCodec(settings.CACHE_SERIALIZER, settings.CACHE_COMPRESSION, settings.CACHE_COMPRESSION_LEVEL)
+
+    @staticmethod
+    def _path(codec: CacheCodec, key: str) -> str:
+        return os.path.join(settings.BACKTEST_RESULT_DIR, codec.prefix.rstrip(':'), key[:2], key)
+
+    def _read(self, key: str) -> Optional[Any]:
+        codec = self._codec()
+        path = self._path(codec, key)
+        try:
+            with open(path, 'rb') as f:
+                return codec.decode(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, value) -> None:
+        codec = self._codec()
+        path = self._path(codec, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hasattr(value, 'model_dump'):
+            value = value.model_dump()
+        # 先写临时文件再替换，读取方不会看到写了一半的文件；
+        # 临时文件名唯一，同一键被并发写入时各自写完再替换
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{key}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(codec.encode(value))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        读取结果
+
+        Args:
+            key: result_key 生成的键
+
+        Returns:
+            保存的结果（dict），不存在或读取失败返回 None
+        """
+        if not self.enabled or not self.is_valid_key(key):
+            return None
+        try:
+            return await asyncio.to_thread(self._read, key)
+        except Exception as e:
+            logger.warning(f"回测结果读取失败: {key}: {e}")
+            return None
+
+    async def put(self, key: str, value) -> None:
+        """
+        保存结果
+
+        Args:
+            key: result_key 生成的键
+            value: 结果（dict 或 Pydantic 模型，在线程池中转换）
+        """
+        if not self.enabled or not self.is_valid_key(key):
+            return
+        try:
+            await asyncio.to_thread(self._write, key, value)
+        except Exception as e:
+            logger.warning(f"回测结果保存失败: {key}: {e}")
+
+
+# 全局单例
+backtest_result_store = BacktestResultStore()
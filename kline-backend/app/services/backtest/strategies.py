@@ -1,17 +1,54 @@
 """回测策略"""
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.services.indicator_service import IndicatorService
 
 
 class Signal:
     """交易信号"""
+    __slots__ = ('date', 'action', 'reason')
+
     def __init__(self, date: str, action: str, reason: str = ""):
         self.date = date
         self.action = action  # 'buy', 'sell', 'hold'
         self.reason = reason
 
 
+class SignalArrays:
+    """
+    向量化交易信号（与K线逐根对应）
+
+    buy/sell 为布尔数组，同一根K线不会同时为真；
+    values 为生成信号原因所需的指标值（如KDJ的J值），可为空。
+    """
+    def __init__(self, buy: np.ndarray, sell: np.ndarray, values: Optional[np.ndarray] = None):
+        self.buy = buy
+        self.sell = sell & ~buy
+        self.values = values
+
+    @property
+    def actions(self) -> np.ndarray:
+        """动作数组：1=买入, -1=卖出, 0=无信号"""
+        return self.buy.astype(np.int8) - self.sell.astype(np.int8)
+
+
+def _prev(values: np.ndarray) -> np.ndarray:
+    """前一根K线的值（首根为 NaN）"""
+    prev = np.empty(len(values), dtype=np.float64)
+    prev[:1] = np.nan
+    prev[1:] = values[:-1]
+    return prev
+
+
+def _valid(*arrays: np.ndarray) -> np.ndarray:
+    """所有数组均非空的位置"""
+    mask = np.ones(len(arrays[0]), dtype=bool)
+    for arr in arrays:
+        mask &= ~np.isnan(arr)
+    return mask
+
+
 class Strategy:
     """策略基类"""
 
@@ -19,10 +56,38 @@ class Strategy:
         self.name = name
         self.params = params
 
-    def generate_signals(self, df: pd.DataFrame) -> List[Signal]:
-        """生成交易信号（子类实现）"""
+    def compute_signals(self, df: pd.DataFrame) -> SignalArrays:
+        """生成向量化交易信号（子类实现）"""
         raise NotImplementedError
 
+    def signal_reason(self, action: str, value: Optional[float]) -> str:
+        """信号原因（子类实现）"""
+        return ""
+
+    def generate_signals(self, df: pd.DataFrame) -> List[Signal]:
+        """
+        生成交易信号列表（由 compute_signals 的结果转换）
+
+        Args:
+            df: K线数据DataFrame（含 date/close/high/low 列）
+
+        Returns:
+            List[Signal]: 按日期排列的交易信号
+        """
+        arrays = self.compute_signals(df)
+        dates = df['date'].tolist()
+        signals = []
+        for i in np.flatnonzero(arrays.buy | arrays.sell).tolist():
+            action = 'buy' if arrays.buy[i] else 'sell'
+            value = float(arrays.values[i]) if arrays.values is not None else None
+            signals.append(Signal(date=dates[i], action=action, reason=self.signal_reason(action, value)))
+        return signals
+
+    @staticmethod
+    def _indicator(df: pd.DataFrame, name: str, params: dict) -> dict:
+        """计算单个指标（融合内核），结果为 float64 数组"""
+        return IndicatorService().calculate_one(df, name, params)
+
 
 class MAStrategy(Strategy):
     """均线交叉策略"""
@@ -32,48 +97,27 @@ class MAStrategy(Strategy):
         self.fast_period = params.get('fast_period', 5)
         self.slow_period = params.get('slow_period', 20)
 
-    def generate_signals(self, df: pd.DataFrame) -> List[Signal]:
+    def compute_signals(self, df: pd.DataFrame) -> SignalArrays:
         """
         均线交叉策略：
         - 快线上穿慢线 → 买入信号
         - 快线下穿慢线 → 卖出信号
         """
-        signals = []
-
-        # 计算均线
-        indicators = IndicatorService.calculate_ma(
-            df, periods=[self.fast_period, self.slow_period]
+        indicators = self._indicator(df, 'ma', {'periods': [self.fast_period, self.slow_period]})
+        fast = indicators[f'ma{self.fast_period}']
+        slow = indicators[f'ma{self.slow_period}']
+        prev_fast, prev_slow = _prev(fast), _prev(slow)
+        valid = _valid(prev_fast, prev_slow, fast, slow)
+
+        return SignalArrays(
+            buy=valid & (prev_fast <= prev_slow) & (fast > slow),
+            sell=valid & (prev_fast >= prev_slow) & (fast < slow)
         )
-        df[f'ma{self.fast_period}'] = indicators[f'ma{self.fast_period}']
-        df[f'ma{self.slow_period}'] = indicators[f'ma{self.slow_period}']
-
-        # 生成信号
-        for i in range(1, len(df)):
-            prev_fast = df.iloc[i-1][f'ma{self.fast_period}']
-            prev_slow = df.iloc[i-1][f'ma{self.slow_period}']
-            curr_fast = df.iloc[i][f'ma{self.fast_period}']
-            curr_slow = df.iloc[i][f'ma{self.slow_period}']
-
-            # 跳过空值
-            if pd.isna(prev_fast) or pd.isna(prev_slow) or pd.isna(curr_fast) or pd.isna(curr_slow):
-                continue
-
-            # 金叉：快线上穿慢线
-            if prev_fast <= prev_slow and curr_fast > curr_slow:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='buy',
-                    reason=f'MA{self.fast_period}上穿MA{self.slow_period}'
-                ))
-            # 死叉：快线下穿慢线
-            elif prev_fast >= prev_slow and curr_fast < curr_slow:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='sell',
-                    reason=f'MA{self.fast_period}下穿MA{self.slow_period}'
-                ))
 
-        return signals
+    def signal_reason(self, action: str, value: Optional[float]) -> str:
+        if action == 'buy':
+            return f'MA{self.fast_period}上穿MA{self.slow_period}'
+        return f'MA{self.fast_period}下穿MA{self.slow_period}'
 
 
 class MACDStrategy(Strategy):
@@ -85,46 +129,24 @@ class MACDStrategy(Strategy):
         self.slow = params.get('slow', 26)
         self.signal = params.get('signal', 9)
 
-    def generate_signals(self, df: pd.DataFrame) -> List[Signal]:
+    def compute_signals(self, df: pd.DataFrame) -> SignalArrays:
         """
         MACD策略：
         - DIF上穿DEA（MACD柱由负转正）→ 买入
         - DIF下穿DEA（MACD柱由正转负）→ 卖出
         """
-        signals = []
-
-        # 计算MACD
-        indicators = IndicatorService.calculate_macd(
-            df, fast=self.fast, slow=self.slow, signal=self.signal
+        indicators = self._indicator(df, 'macd', {'fast': self.fast, 'slow': self.slow, 'signal': self.signal})
+        hist = indicators['macd']
+        prev_hist = _prev(hist)
+        valid = _valid(prev_hist, hist)
+
+        return SignalArrays(
+            buy=valid & (prev_hist <= 0) & (hist > 0),
+            sell=valid & (prev_hist >= 0) & (hist < 0)
         )
-        df['macd_dif'] = indicators['dif']
-        df['macd_dea'] = indicators['dea']
-        df['macd_hist'] = indicators['hist']
-
-        # 生成信号
-        for i in range(1, len(df)):
-            prev_hist = df.iloc[i-1]['macd_hist']
-            curr_hist = df.iloc[i]['macd_hist']
-
-            if pd.isna(prev_hist) or pd.isna(curr_hist):
-                continue
-
-            # MACD柱由负转正（金叉）
-            if prev_hist <= 0 and curr_hist > 0:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='buy',
-                    reason='MACD金叉'
-                ))
-            # MACD柱由正转负（死叉）
-            elif prev_hist >= 0 and curr_hist < 0:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='sell',
-                    reason='MACD死叉'
-                ))
 
-        return signals
+    def signal_reason(self, action: str, value: Optional[float]) -> str:
+        return 'MACD金叉' if action == 'buy' else 'MACD死叉'
 
 
 class KDJStrategy(Strategy):
@@ -138,48 +160,27 @@ class KDJStrategy(Strategy):
         self.oversold = params.get('oversold', 20)
         self.overbought = params.get('overbought', 80)
 
-    def generate_signals(self, df: pd.DataFrame) -> List[Signal]:
+    def compute_signals(self, df: pd.DataFrame) -> SignalArrays:
         """
         KDJ策略：
         - J值从超卖区上穿K值 → 买入
         - J值从超买区下穿K值 → 卖出
         """
-        signals = []
-
-        # 计算KDJ
-        indicators = IndicatorService.calculate_kdj(
-            df, n=self.n, m1=self.m1, m2=self.m2
+        indicators = self._indicator(df, 'kdj', {'n': self.n, 'm1': self.m1, 'm2': self.m2})
+        k, j = indicators['k'], indicators['j']
+        prev_k, prev_j = _prev(k), _prev(j)
+        valid = _valid(prev_k, prev_j, k, j)
+
+        return SignalArrays(
+            buy=valid & (prev_j < self.oversold) & (prev_j <= prev_k) & (j > k),
+            sell=valid & (prev_j > self.overbought) & (prev_j >= prev_k) & (j < k),
+            values=j
         )
-        df['kdj_k'] = indicators['k']
-        df['kdj_d'] = indicators['d']
-        df['kdj_j'] = indicators['j']
-
-        # 生成信号
-        for i in range(1, len(df)):
-            prev_k = df.iloc[i-1]['kdj_k']
-            prev_j = df.iloc[i-1]['kdj_j']
-            curr_k = df.iloc[i]['kdj_k']
-            curr_j = df.iloc[i]['kdj_j']
-
-            if pd.isna(prev_k) or pd.isna(prev_j) or pd.isna(curr_k) or pd.isna(curr_j):
-                continue
-
-            # J值从超卖区上穿K值
-            if prev_j < self.oversold and prev_j <= prev_k and curr_j > curr_k:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='buy',
-                    reason=f'KDJ超卖反弹(J={curr_j:.1f})'
-                ))
-            # J值从超买区下穿K值
-            elif prev_j > self.overbought and prev_j >= prev_k and curr_j < curr_k:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='sell',
-                    reason=f'KDJ超买回落(J={curr_j:.1f})'
-                ))
 
-        return signals
+    def signal_reason(self, action: str, value: Optional[float]) -> str:
+        if action == 'buy':
+            return f'KDJ超卖反弹(J={value:.1f})'
+        return f'KDJ超买回落(J={value:.1f})'
 
 
 class RSIStrategy(Strategy):
@@ -191,42 +192,26 @@ class RSIStrategy(Strategy):
         self.oversold = params.get('oversold', 30)
         self.overbought = params.get('overbought', 70)
 
-    def generate_signals(self, df: pd.DataFrame) -> List[Signal]:
+    def compute_signals(self, df: pd.DataFrame) -> SignalArrays:
         """
         RSI策略：
         - RSI从超卖区向上突破 → 买入
         - RSI从超买区向下突破 → 卖出
         """
-        signals = []
-
-        # 计算RSI
-        indicators = IndicatorService.calculate_rsi(df, periods=[self.period])
-        df[f'rsi{self.period}'] = indicators[f'rsi{self.period}']
-
-        # 生成信号
-        for i in range(1, len(df)):
-            prev_rsi = df.iloc[i-1][f'rsi{self.period}']
-            curr_rsi = df.iloc[i][f'rsi{self.period}']
-
-            if pd.isna(prev_rsi) or pd.isna(curr_rsi):
-                continue
-
-            # 从超卖区向上突破
-            if prev_rsi < self.oversold and curr_rsi >= self.oversold:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='buy',
-                    reason=f'RSI超卖反弹(RSI={curr_rsi:.1f})'
-                ))
-            # 从超买区向下突破
-            elif prev_rsi > self.overbought and curr_rsi <= self.overbought:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='sell',
-                    reason=f'RSI超买回落(RSI={curr_rsi:.1f})'
-                ))
+        rsi = self._indicator(df, 'rsi', {'periods': [self.period]})[f'rsi{self.period}']
+        prev_rsi = _prev(rsi)
+        valid = _valid(prev_rsi, rsi)
+
+        return SignalArrays(
+            buy=valid & (prev_rsi < self.oversold) & (rsi >= self.oversold),
+            sell=valid & (prev_rsi > self.overbought) & (rsi <= self.overbought),
+            values=rsi
+        )
 
-        return signals
+    def signal_reason(self, action: str, value: Optional[float]) -> str:
+        if action == 'buy':
+            return f'RSI超卖反弹(RSI={value:.1f})'
+        return f'RSI超买回落(RSI={value:.1f})'
 
 
 class BOLLStrategy(Strategy):
@@ -237,48 +222,25 @@ class BOLLStrategy(Strategy):
         self.n = params.get('n', 20)
         self.k = params.get('k', 2)
 
-    def generate_signals(self, df: pd.DataFrame) -> List[Signal]:
+    def compute_signals(self, df: pd.DataFrame) -> SignalArrays:
         """
         布林带策略：
         - 价格从下轨反弹向上突破 → 买入
         - 价格从上轨回落向下突破 → 卖出
         """
-        signals = []
-
-        # 计算布林带
-        indicators = IndicatorService.calculate_boll(df, n=self.n, k=self.k)
-        df['boll_mid'] = indicators['mid']
-        df['boll_upper'] = indicators['upper']
-        df['boll_lower'] = indicators['lower']
-
-        # 生成信号
-        for i in range(1, len(df)):
-            prev_close = df.iloc[i-1]['close']
-            curr_close = df.iloc[i]['close']
-            prev_lower = df.iloc[i-1]['boll_lower']
-            curr_lower = df.iloc[i]['boll_lower']
-            prev_upper = df.iloc[i-1]['boll_upper']
-            curr_upper = df.iloc[i]['boll_upper']
-
-            if pd.isna(prev_lower) or pd.isna(curr_lower) or pd.isna(prev_upper) or pd.isna(curr_upper):
-                continue
-
-            # 价格从下轨反弹
-            if prev_close <= prev_lower and curr_close > curr_lower:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='buy',
-                    reason='触及布林下轨反弹'
-                ))
-            # 价格从上轨回落
-            elif prev_close >= prev_upper and curr_close < curr_upper:
-                signals.append(Signal(
-                    date=df.iloc[i]['date'],
-                    action='sell',
-                    reason='触及布林上轨回落'
-                ))
+        indicators = self._indicator(df, 'boll', {'n': self.n, 'k': self.k})
+        close = df['close'].to_numpy(dtype=np.float64)
+        lower, upper = indicators['lower'], indicators['upper']
+        prev_close, prev_lower, prev_upper = _prev(close), _prev(lower), _prev(upper)
+        valid = _valid(prev_lower, lower, prev_upper, upper)
+
+        return SignalArrays(
+            buy=valid & (prev_close <= prev_lower) & (close > lower),
+            sell=valid & (prev_close >= prev_upper) & (close < upper)
+        )
 
-        return signals
+    def signal_reason(self, action: str, value: Optional[float]) -> str:
+        return '触及布林下轨反弹' if action == 'buy' else '触及布林上轨回落'
 
 
 class StrategyFactory:
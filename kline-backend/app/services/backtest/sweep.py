@@ -0,0 +1,262 @@
+"""参数寻优（网格搜索）"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from .runner import run_strategy, buy_hold_values, summarize
+from .strategies import StrategyFactory
+
+logger = get_logger(__name__)
+
+# 排序时数值越小越好的指标
+ASCENDING_METRICS = ('max_drawdown',)
+
+
+class BacktestPool:
+    """
+    回测进程池（单例）
+
+    首次使用时创建，进程常驻复用（避免每次请求重新启动进程和编译指标内核）。
+    使用 spawn 方式启动，子进程不继承事件循环和数据库连接。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._executor = None
+        return cls._instance
+
+    @property
+    def workers(self) -> int:
+        """进程数"""
+        return settings.BACKTEST_WORKERS or os.cpu_count() or 1
+
+    def get(self) -> ProcessPoolExecutor:
+        """获取进程池（按需创建）"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            logger.info(f"回测进程池已启动: {self.workers} 个进程")
+        return self._executor
+
+    async def run(self, func, *args):
+        """
+        在进程池中执行函数（进程数为 1 时在线程池中执行，省去进程间传输）
+
+        Args:
+            func: 模块级函数（需可被子进程导入）
+            *args: 参数（需可序列化）
+
+        Returns:
+            函数返回值
+        """
+        if self.workers <= 1:
+            return await asyncio.to_thread(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.get(), func, *args)
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def coerce_param(param: dict, value: Any):
+    """
+    按策略参数定义校验并转换参数值
+
+    整数参数（默认值为整数且无小数步长）转换为 int，其余转换为 float；取值需在 [min, max] 内。
+
+    Args:
+        param: 策略参数定义（StrategyFactory.get_strategy_definitions 中的一项）
+        value: 参数值（数字或数字字符串）
+
+    Returns:
+        int | float: 转换后的值
+
+    Raises:
+        ValueError: 非数字、整数参数取值带小数或超出取值范围
+    """
+    name = param['name']
+    if isinstance(value, bool):
+        raise ValueError(f"参数 {name} 的取值无效: {value!r}")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"参数 {name} 的取值无效: {value!r}")
+    if number != number or number in (float('inf'), float('-inf')):
+        raise ValueError(f"参数 {name} 的取值无效: {value!r}")
+
+    is_int = isinstance(param['default'], int) and float(param.get('step', 1)).is_integer()
+    if is_int:
+        if not number.is_integer():
+            raise ValueError(f"参数 {name} 必须为整数: {value!r}")
+        number = int(number)
+
+    low, high = param.get('min'), param.get('max')
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ValueError(f"参数 {name} 的取值 {number} 超出范围 [{low}, {high}]")
+    return number
+
+
+def expand_grid(strategy_id: str, base_params: Dict[str, Any], param_grid: Dict[str, List[Any]]) -> List[dict]:
+    """
+    展开参数网格
+
+    Args:
+        strategy_id: 策略ID
+        base_params: 固定参数
+        param_grid: {参数名: 候选值列表}
+
+    Returns:
+        list: 参数组合列表（每个组合包含固定参数）
+
+    Raises:
+        ValueError: 未知策略、未知参数、参数值无效、候选值为空或组合数超出上限
+    """
+    definitions = {d['id']: d for d in StrategyFactory.get_strategy_definitions()}
+    if strategy_id not in definitions:
+        raise ValueError(f"未知策略: {strategy_id}")
+
+    known = {p['name']: p for p in definitions[strategy_id]['params']}
+    unknown = (set(param_grid) | set(base_params)) - set(known)
+    if unknown:
+        raise ValueError(f"策略 {strategy_id} 不支持参数: {', '.join(sorted(unknown))}")
+
+    base_params = {name: coerce_param(known[name], value) for name, value in base_params.items()}
+    names = list(param_grid)
+    values = []
+    for name in names:
+        # 转换类型后去重并保持顺序
+        candidates = list(dict.fromkeys(coerce_param(known[name], v) for v in param_grid[name]))
+        if not candidates:
+            raise ValueError(f"参数 {name} 的候选值为空")
+        values.append(candidates)
+
+    total = 1
+    for candidates in values:
+        total *= len(candidates)
+    if total > settings.BACKTEST_SWEEP_MAX_COMBINATIONS:
+        raise ValueError(f"参数组合数 {total} 超过上限 {settings.BACKTEST_SWEEP_MAX_COMBINATIONS}")
+
+    return [{**base_params, **dict(zip(names, combo))} for combo in itertools.product(*values)]
+
+
+def run_combinations(
+    strategy_id: str,
+    combinations: List[dict],
+    columns: Dict[str, Any],
+    code: str,
+    initial_capital: float,
+    position_ratio: float
+) -> List[dict]:
+    """
+    依次回测一组参数组合（在子进程中执行）
+
+    Args:
+        strategy_id: 策略ID
+        combinations: 参数组合列表
+        columns: 日K线列式数据 {date, open, close, high, low, volume}
+        code: 股票代码
+        initial_capital: 初始资金
+        position_ratio: 单次买入仓位比例
+
+    Returns:
+        list: [{params, final_capital, metrics}, ...]
+    """
+    df = pd.DataFrame(columns)
+    benchmark = buy_hold_values(df['close'].to_numpy(dtype=np.float64), initial_capital)
+
+    results = []
+    for params in combinations:
+        strategy = StrategyFactory.create_strategy(strategy_id, params)
+        engine = run_strategy(strategy, df, code, code, initial_capital, position_ratio)
+        results.append({
+            'params': params,
+            'final_capital': engine.get_total_value(),
+            'metrics': summarize(engine, benchmark, initial_capital)
+        })
+    return results
+
+
+def rank_results(results: List[dict], sort_by: str, top: Optional[int] = None) -> List[dict]:
+    """
+    按指标排序（回撤升序，其余降序）
+
+    Args:
+        results: run_combinations 的结果
+        sort_by: 排序指标
+        top: 只返回前 N 个，None 表示全部
+
+    Returns:
+        list: 排序后的结果
+    """
+    reverse = sort_by not in ASCENDING_METRICS
+    ranked = sorted(results, key=lambda r: r['metrics'][sort_by], reverse=reverse)
+    return ranked[:top] if top else ranked
+
+
+async def run_sweep(
+    strategy_id: str,
+    combinations: List[dict],
+    columns: Dict[str, Any],
+    code: str,
+    initial_capital: float,
+    position_ratio: float
+) -> List[dict]:
+    """
+    并行回测全部参数组合
+
+    组合按进程数分块提交到进程池（每块只传一次K线数据）；
+    进程数为 1 或组合很少时直接在线程池中执行，省去进程间传输。
+
+    Args:
+        strategy_id: 策略ID
+        combinations: 参数组合列表
+        columns: 日K线列式数据
+        code: 股票代码
+        initial_capital: 初始资金
+        position_ratio: 单次买入仓位比例
+
+    Returns:
+        list: 与 combinations 顺序一致的结果
+    """
+    pool = BacktestPool()
+    workers = pool.workers
+    if workers <= 1 or len(combinations) < 2 * workers:
+        return await asyncio.to_thread(
+            run_combinations, strategy_id, combinations, columns, code, initial_capital, position_ratio
+        )
+
+    # 每个进程约 4 块，兼顾负载均衡与传输开销
+    n_chunks = min(len(combinations), workers * 4)
+    chunks = [combinations[i::n_chunks] for i in range(n_chunks)]
+
+    loop = asyncio.get_running_loop()
+    executor = pool.get()
+    chunk_results = await asyncio.gather(*(
+        loop.run_in_executor(
+            executor, run_combinations, strategy_id, chunk, columns, code, initial_capital, position_ratio
+        )
+        for chunk in chunks
+    ))
+
+    # 按原顺序合并（第 i 块包含组合 i, i+n, i+2n, ...）
+    results = [None] * len(combinations)
+    for i, chunk_result in enumerate(chunk_results):
+        results[i::n_chunks] = chunk_result
+    return results
+
+
+# 全局单例
+backtest_pool = BacktestPool()
@@ -0,0 +1,133 @@
+"""缓存编码器（序列化 + 压缩）"""
+import zlib
+from typing import Any
+import numpy as np
+import orjson
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # 未安装 msgpack 时回退到 JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时回退到 zlib
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # 未安装 lz4 时回退到 zlib
+    lz4_frame = None
+
+# 缓存格式版本：编码方式不兼容地变更时递增，旧键自然失效（按TTL过期）
+CACHE_FORMAT_VERSION = 2
+
+# msgpack 扩展类型：NumPy数组（dtype + shape + 原始字节）
+EXT_NDARRAY = 1
+
+
+def _msgpack_default(obj):
+    """msgpack 无法直接编码的对象"""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == 'O':
+            return obj.tolist()
+        arr = np.ascontiguousarray(obj)
+        payload = msgpack.packb([arr.dtype.str, list(arr.shape), arr.tobytes()])
+        return msgpack.ExtType(EXT_NDARRAY, payload)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"无法序列化的类型: {type(obj)}")
+
+
+def _msgpack_ext_hook(code: int, data: bytes):
+    """还原 NumPy 数组（只读视图，避免复制）"""
+    if code == EXT_NDARRAY:
+        dtype, shape, buf = msgpack.unpackb(data)
+        return np.frombuffer(buf, dtype=np.dtype(dtype)).reshape(shape)
+    return msgpack.ExtType(code, data)
+
+
+class CacheCodec:
+    """
+    缓存编码器
+
+    序列化：msgpack（NumPy列以原始字节存储，无逐元素编码）或 json（orjson）
+    压缩：zstd / lz4 / zlib / none
+    缓存键带编码前缀（版本 + 序列化 + 压缩），切换配置后旧条目不会被误读。
+    """
+
+    def __init__(self, serializer: str = "msgpack", compression: str = "zstd", level: int = 3):
+        if serializer == "msgpack" and msgpack is None:
+            logger.warning("未安装 msgpack，缓存序列化回退为 json")
+            serializer = "json"
+        if serializer not in ("msgpack", "json"):
+            raise ValueError(f"不支持的缓存序列化方式: {serializer}")
+
+        if (compression == "zstd" and zstandard is None) or (compression == "lz4" and lz4_frame is None):
+            logger.warning(f"未安装 {compression} 压缩库，缓存压缩回退为 zlib")
+            compression = "zlib"
+        if compression not in ("zstd", "lz4", "zlib", "none"):
+            raise ValueError(f"不支持的缓存压缩方式: {compression}")
+
+        self.serializer = serializer
+        self.compression = compression
+        self.level = level
+        self.prefix = f"c{CACHE_FORMAT_VERSION}.{serializer}.{compression}:"
+
+        if compression == "zstd":
+            # 压缩/解压上下文非线程安全，但仅在事件循环线程中使用
+            self._zstd_c = zstandard.ZstdCompressor(level=level)
+            self._zstd_d = zstandard.ZstdDecompressor()
+
+    def key(self, key: str) -> str:
+        """带编码前缀的Redis键"""
+        return self.prefix + key
+
+    def encode(self, value: Any) -> bytes:
+        """序列化并压缩"""
+        if self.serializer == "msgpack":
+            data = msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+        else:
+            # 列式数据为NumPy数组，NaN 序列化为 null
+            data = orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+
+        if self.compression == "zstd":
+            return self._zstd_c.compress(data)
+        if self.compression == "lz4":
+            return lz4_frame.compress(data, compression_level=self.level)
+        if self.compression == "zlib":
+            return zlib.compress(data, self.level)
+        return data
+
+    def decode(self, data: bytes) -> Any:
+        """解压并反序列化"""
+        if self.compression == "zstd":
+            data = self._zstd_d.decompress(data)
+        elif self.compression == "lz4":
+            data = lz4_frame.decompress(data)
+        elif self.compression == "zlib":
+            data = zlib.decompress(data)
+
+        if self.serializer == "msgpack":
+            return msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False)
+        return orjson.loads(data)
+
+    def describe(self) -> dict:
+        """编码配置"""
+        return {
+            "serializer": self.serializer,
+            "compression": self.compression,
+            "version": CACHE_FORMAT_VERSION
+        }
+
+
+# 全局编码器（按配置创建）
+cache_codec = CacheCodec(
+    settings.CACHE_SERIALIZER,
+    settings.CACHE_COMPRESSION,
+    settings.CACHE_COMPRESSION_LEVEL
+)
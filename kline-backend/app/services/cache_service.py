@@ -1,39 +1,215 @@
 """缓存服务"""
-import json
+import asyncio
+import sys
+import time
+from collections import OrderedDict
 from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+import numpy as np
+from app.core.config import settings
 from app.db.redis import redis_client
+from app.services.cache_codec import cache_codec
+
+
+def approx_size(value: Any) -> int:
+    """
+    估算已解码对象占用的内存字节数（NumPy数组按数据大小，容器递归累加）
+
+    只用于进程内缓存的容量控制，不追求精确。
+    """
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return sys.getsizeof(value) + sum(approx_size(v) for v in value.flat)
+        # 拥有数据的数组 getsizeof 已包含数据缓冲区，视图只包含对象头
+        return sys.getsizeof(value) + (0 if value.base is None else value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    if hasattr(value, 'model_dump'):
+        return approx_size(value.model_dump())
+    return sys.getsizeof(value)
+
+
+class LocalCache:
+    """
+    进程内LRU缓存（按条目数和估算的内存字节数限制大小）
+
+    保存已解码的Python对象，命中时无需访问Redis和反序列化。
+    每个条目的有效期不超过 CACHE_LOCAL_TTL，以限制多进程部署下的数据不一致时间。
+    单个条目超过字节上限时不写入（避免淘汰全部条目）。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str):
+        """获取条目，过期或不存在返回 None"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value, _ = item
+        if expires_at < time.monotonic():
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: int) -> int:
+        """
+        写入条目
+
+        Returns:
+            int: 因超出容量被淘汰的条目数
+        """
+        self.delete(key)
+        size = approx_size(value)
+        if size > self.max_bytes:
+            return 0
+        self._data[key] = (time.monotonic() + ttl, value, size)
+        self.total_bytes += size
+        evicted = 0
+        while len(self._data) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self.total_bytes -= evicted_size
+            evicted += 1
+        return evicted
+
+    def delete(self, key: str):
+        """删除条目"""
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.total_bytes -= item[2]
+
+    def __len__(self):
+        return len(self._data)
 
 
 class CacheService:
-    """缓存服务"""
+    """
+    缓存服务（两级缓存：进程内LRU + Redis）
+
+    get_or_compute 对同一缓存键做请求合并（single-flight）：
+    未命中时只有一个请求执行计算，其余并发请求等待其结果。
+    """
+
+    # 进程级共享状态（CacheService 按请求创建）
+    _local = LocalCache(settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_MAX_BYTES)
+    _inflight: Dict[str, asyncio.Future] = {}
+    _stats = {
+        "local_hits": 0,
+        "redis_hits": 0,
+        "misses": 0,
+        "coalesced": 0,
+        "evictions": 0
+    }
 
     def __init__(self):
         self.redis = redis_client.get_client()
 
-    def get(self, key: str):
-        """获取缓存"""
+    async def get(self, key: str, local: bool = True):
+        """
+        获取缓存
+
+        Args:
+            key: 缓存键
+            local: 是否使用进程内缓存；会被其他进程更新的值（如任务状态）应传 False
+        """
+        if local:
+            value = self._local.get(key)
+            if value is not None:
+                self._stats["local_hits"] += 1
+                return value
+
         try:
-            value = self.redis.get(key)
-            if value:
-                return json.loads(value)
+            data = await self.redis.get(cache_codec.key(key))
+            if data:
+                value = cache_codec.decode(data)
+                self._stats["redis_hits"] += 1
+                if local:
+                    self._stats["evictions"] += self._local.set(key, value, settings.CACHE_LOCAL_TTL)
+                return value
         except Exception as e:
             print(f"缓存读取失败: {e}")
+        self._stats["misses"] += 1
         return None
 
-    def set(self, key: str, value: dict, ttl: int = 3600):
-        """设置缓存"""
+    async def set(self, key: str, value: dict, ttl: int = 3600, local: bool = True):
+        """设置缓存（local=False 时只写入Redis）"""
+        if local:
+            self._stats["evictions"] += self._local.set(key, value, min(ttl, settings.CACHE_LOCAL_TTL))
         try:
-            self.redis.setex(key, ttl, json.dumps(value))
+            await self.redis.setex(cache_codec.key(key), ttl, cache_codec.encode(value))
         except Exception as e:
             print(f"缓存写入失败: {e}")
 
-    def delete(self, key: str):
+    async def delete(self, key: str):
         """删除缓存"""
+        self._local.delete(key)
         try:
-            self.redis.delete(key)
+            await self.redis.delete(cache_codec.key(key))
         except Exception as e:
             print(f"缓存删除失败: {e}")
 
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int = 3600
+    ):
+        """
+        获取缓存，未命中时计算并写入（同一键的并发请求只计算一次）
+
+        Args:
+            key: 缓存键
+            compute: 无参异步函数，返回待缓存的值
+            ttl: 过期时间（秒）
+
+        Returns:
+            缓存值或计算结果；计算抛出的异常会传递给所有等待者
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            # 计算放在独立任务中，发起请求被取消（客户端断开）不影响其他等待者
+            task = asyncio.ensure_future(self._compute_and_set(key, compute, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish_inflight(key, t))
+        else:
+            self._stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _compute_and_set(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: int):
+        """执行计算并写入缓存"""
+        value = await compute()
+        await self.set(key, value, ttl)
+        return value
+
+    @classmethod
+    def _finish_inflight(cls, key: str, task: asyncio.Future):
+        """计算完成后移除合并记录"""
+        if cls._inflight.get(key) is task:
+            del cls._inflight[key]
+        if not task.cancelled():
+            task.exception()  # 标记异常已读取，避免所有等待者都已取消时告警
+
+    @classmethod
+    def stats(cls) -> dict:
+        """缓存命中统计"""
+        return {
+            **cls._stats,
+            "codec": cache_codec.describe(),
+            "local_entries": len(cls._local),
+            "local_bytes": cls._local.total_bytes,
+            "inflight": len(cls._inflight)
+        }
+
     def calculate_ttl(self, end_date: str) -> int:
         """
         根据数据日期计算TTL
@@ -0,0 +1,296 @@
+"""增量技术指标计算引擎"""
+import asyncio
+import bisect
+import uuid
+from datetime import date, timedelta
+from typing import Optional
+import numpy as np
+import pandas as pd
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.services.cache_service import CacheService
+from app.services.indicator_service import IndicatorService
+
+logger = get_logger(__name__)
+
+
+class IndicatorEngine:
+    """
+    增量指标计算
+
+    - 窗口类指标（MA、RSI、BOLL）：状态保留最近 N 根K线，新K线与尾部拼接后复用 IndicatorService 计算
+    - 递推类指标（MACD、KDJ）：状态保留 EMA 的最新值，新K线逐根递推
+    状态为普通字典（NumPy数组 + 标量），可直接写入缓存。
+    计算结果与 IndicatorService 对整段序列的计算一致。
+    """
+
+    @staticmethod
+    def _ewm(values: np.ndarray, com: float, prev: Optional[float]) -> np.ndarray:
+        """
+        EMA（adjust=False）：无初始状态时用 pandas 计算，否则从 prev 逐根递推
+
+        平滑系数与递推公式均与 pandas 的实现保持一致，保证增量结果与整段计算逐位相同。
+        """
+        if prev is None:
+            return pd.Series(values).ewm(com=com, adjust=False).mean().to_numpy(dtype=np.float64)
+
+        alpha = 1.0 / (1.0 + com)
+        out = np.empty(len(values), dtype=np.float64)
+        weighted = prev
+        old_wt = 1.0 - alpha
+        for i, cur in enumerate(values.tolist()):
+            if weighted != weighted:  # 之前均为 NaN
+                weighted = cur
+            elif cur == cur and weighted != cur:
+                weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+            out[i] = weighted
+        return out
+
+    def extend(self, name: str, params: dict, state: Optional[dict], df: pd.DataFrame) -> tuple:
+        """
+        用新K线推进指标状态
+
+        Args:
+            name: 指标名称
+            params: 指标参数
+            state: 上次的状态，None 表示从头计算
+            df: 新K线（按时间升序，含 close/high/low 列）
+
+        Returns:
+            tuple: (新K线对应的指标值 dict, 新状态 dict)
+        """
+        window = IndicatorService.window_bars(name, params)
+        n_new = len(df)
+
+        if state is None:
+            tail = df[['close', 'high', 'low']].iloc[:0]
+            emas = {}
+        else:
+            tail = pd.DataFrame({c: state['tail'][c] for c in ('close', 'high', 'low')})
+            emas = dict(state['ema'])
+
+        frame = pd.concat([tail, df[['close', 'high', 'low']]], ignore_index=True)
+
+        if name in ('ma', 'rsi', 'boll'):
+            full = IndicatorService().calculate_one(frame, name, params)
+            values = {k: v[len(tail):] for k, v in full.items()}
+
+        elif name == 'macd':
+            close = df['close'].to_numpy(dtype=np.float64)
+            ema_fast = self._ewm(close, (params['fast'] - 1) / 2.0, emas.get('fast'))
+            ema_slow = self._ewm(close, (params['slow'] - 1) / 2.0, emas.get('slow'))
+            dif = ema_fast - ema_slow
+            dea = self._ewm(dif, (params['signal'] - 1) / 2.0, emas.get('dea'))
+            if n_new:
+                emas = {'fast': ema_fast[-1], 'slow': ema_slow[-1], 'dea': dea[-1]}
+            values = {
+                'dif': np.round(dif, 4),
+                'dea': np.round(dea, 4),
+                'macd': np.round((dif - dea) * 2, 4)
+            }
+
+        elif name == 'kdj':
+            n = params['n']
+            low_n = frame['low'].rolling(window=n).min()
+            high_n = frame['high'].rolling(window=n).max()
+            rsv = ((frame['close'] - low_n) / (high_n - low_n) * 100).fillna(50)
+            rsv = rsv.to_numpy(dtype=np.float64)[len(tail):]
+            k = self._ewm(rsv, params['m1'] - 1, emas.get('k'))
+            d = self._ewm(k, params['m2'] - 1, emas.get('d'))
+            if n_new:
+                emas = {'k': k[-1], 'd': d[-1]}
+            values = {
+                'k': np.round(k, 2),
+                'd': np.round(d, 2),
+                'j': np.round(3 * k - 2 * d, 2)
+            }
+
+        else:
+            raise ValueError(f"未知指标: {name}")
+
+        kept = frame.iloc[max(len(frame) - window, 0):] if window else frame.iloc[:0]
+        new_state = {
+            'tail': {c: np.ascontiguousarray(kept[c].to_numpy(dtype=np.float64)) for c in ('close', 'high', 'low')},
+            'ema': emas
+        }
+        return values, new_state
+
+
+class IncrementalIndicatorService:
+    """
+    带持久化状态的增量指标服务
+
+    状态按 (股票, 周期, 复权, 起始日期, 指标, 参数) 缓存，只保存已完成K线的根数和引擎状态（尾部K线 + EMA），
+    已完成K线的指标值分段写入独立的缓存键，段写入后不再改写。
+    请求的K线比状态更新时只计算并写入新增部分；相邻的段按二进制计数方式合并（新段不短于前一段时合并），
+    段数保持在 O(log n)。请求的K线比状态短时截取已保存的指标值，不改写状态。
+    未完成的K线（当日/本周/本月/本年）每次临时计算，不写入状态。
+    """
+
+    def __init__(self, cache: CacheService):
+        self.cache = cache
+        self.engine = IndicatorEngine()
+
+    @staticmethod
+    def period_cutoff(period: str, today: date = None) -> str:
+        """
+        已完成K线的日期上界：日期早于当前周期起点的K线不会再变化
+
+        Args:
+            period: K线周期
+            today: 当前日期，默认今天
+
+        Returns:
+            str: YYYY-MM-DD
+        """
+        today = today or date.today()
+        if period == 'week':
+            today = today - timedelta(days=today.weekday())
+        elif period == 'month':
+            today = today.replace(day=1)
+        elif period == 'year':
+            today = today.replace(month=1, day=1)
+        return today.isoformat()
+
+    @staticmethod
+    def _frame(columns: dict, lo: int, hi: int) -> pd.DataFrame:
+        """截取列式K线的 [lo, hi) 区间"""
+        return pd.DataFrame({c: columns[c][lo:hi] for c in ('close', 'high', 'low')})
+
+    @staticmethod
+    def _segment_key(state_key: str, epoch: str, lo: int, hi: int) -> str:
+        """指标值分段的缓存键（epoch 在状态重建时更换，旧段不会被误读）"""
+        return f"{state_key}:seg:{epoch}:{lo}:{hi}"
+
+    async def _load_values(self, state_key: str, entry: dict, dates: list, n_final: int) -> Optional[dict]:
+        """
+        读取已保存的前 min(状态根数, n_final) 根K线的指标值
+
+        Args:
+            state_key: 状态缓存键
+            entry: 状态
+            dates: 当前请求的K线日期
+            n_final: 当前请求中已完成的K线根数
+
+        Returns:
+            dict: {输出名: 数组}；状态与当前K线不一致或分段缺失时返回 None
+        """
+        if 'segments' not in entry:
+            return None
+        count = entry['count']
+        limit = min(count, n_final)
+        if limit <= 0 or (count <= n_final and dates[count - 1] != entry['last_date']):
+            return None
+
+        # 校验用到的各段首尾日期与当前K线对齐
+        needed = [seg for seg in entry['segments'] if seg[0] < limit]
+        for lo, hi, first_date, last_date in needed:
+            if dates[lo] != first_date or (hi <= limit and dates[hi - 1] != last_date):
+                return None
+
+        parts = await asyncio.gather(*(
+            self.cache.get(self._segment_key(state_key, entry['epoch'], lo, hi)) for lo, hi, _, _ in needed
+        ))
+        if any(part is None for part in parts):
+            return None
+        return {
+            k: np.concatenate([np.asarray(part[k], dtype=np.float64) for part in parts])[:limit]
+            for k in parts[0]
+        }
+
+    async def _append_segment(
+        self,
+        state_key: str,
+        epoch: str,
+        segments: list,
+        values: dict,
+        dates: list,
+        start: int,
+        end: int
+    ) -> list:
+        """
+        写入 [start, end) 的指标值分段，必要时与前面的段合并
+
+        Returns:
+            list: 新的分段列表 [[lo, hi, 首日期, 末日期], ...]
+        """
+        segments = list(segments)
+        merged = []
+        lo = start
+        while segments and segments[-1][1] - segments[-1][0] <= end - lo:
+            merged.append(segments.pop())
+            lo = merged[-1][0]
+
+        await self.cache.set(
+            self._segment_key(state_key, epoch, lo, end),
+            {k: np.ascontiguousarray(v[lo:end]) for k, v in values.items()},
+            settings.INDICATOR_STATE_TTL
+        )
+        await asyncio.gather(*(self.cache.delete(self._segment_key(state_key, epoch, seg[0], seg[1])) for seg in merged))
+        return segments + [[lo, end, dates[lo], dates[end - 1]]]
+
+    async def calculate(
+        self,
+        state_key: str,
+        name: str,
+        columns: dict,
+        period: str,
+        params: dict = None
+    ) -> dict:
+        """
+        增量计算指标
+
+        Args:
+            state_key: 状态缓存键
+            name: 指标名称
+            columns: K线列式数据（与状态同一起始日期）
+            period: K线周期（用于判断K线是否已完成）
+            params: 指标参数，None 表示默认参数
+
+        Returns:
+            dict: 与 IndicatorService.calculate_one 相同格式的指标结果
+        """
+        if params is None:
+            params = IndicatorService.DEFAULT_PARAMS[name]
+        dates = columns['dates']
+        n_final = bisect.bisect_left(dates, self.period_cutoff(period))
+
+        entry = await self.cache.get(state_key)
+        values = await self._load_values(state_key, entry, dates, n_final) if entry else None
+
+        if values is not None and entry['count'] > n_final:
+            # 请求比状态短：截取已保存的指标值，保留较长的状态
+            if n_final == len(dates):
+                return values
+            # 未完成K线需要第 n_final 根处的引擎状态，状态已推进到更后，整段临时计算
+            values, _ = self.engine.extend(name, params, None, self._frame(columns, 0, len(dates)))
+            return values
+
+        if values is not None:
+            start, state, segments, epoch = entry['count'], entry['state'], entry['segments'], entry['epoch']
+        else:
+            start, state, segments, epoch = 0, None, [], uuid.uuid4().hex
+
+        if values is None or start < n_final:
+            new_values, state = self.engine.extend(name, params, state, self._frame(columns, start, n_final))
+            values = new_values if values is None else {
+                k: np.concatenate([values[k], v]) for k, v in new_values.items()
+            }
+            if n_final > start:
+                logger.debug(f"指标状态推进: {state_key}, {start} -> {n_final}")
+                segments = await self._append_segment(state_key, epoch, segments, values, dates, start, n_final)
+                await self.cache.set(state_key, {
+                    'count': n_final,
+                    'last_date': dates[n_final - 1],
+                    'state': state,
+                    'segments': segments,
+                    'epoch': epoch
+                }, settings.INDICATOR_STATE_TTL)
+
+        if n_final < len(dates):
+            live_values, _ = self.engine.extend(name, params, state, self._frame(columns, n_final, len(dates)))
+            values = {
+                k: np.concatenate([np.asarray(values[k], dtype=np.float64), v]) for k, v in live_values.items()
+            }
+
+        return values
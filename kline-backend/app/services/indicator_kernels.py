@@ -0,0 +1,332 @@
+"""技术指标计算内核（融合多指标单次遍历）"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from numba import njit, prange
+except ImportError:  # 未安装 numba 时使用 NumPy 向量化实现
+    njit = None
+    logger.info("未安装 numba，技术指标使用 NumPy 实现")
+
+# 各指标输出的小数位数（与 IndicatorService 一致）
+DECIMALS = {'ma': 2, 'macd': 4, 'kdj': 2, 'rsi': 2, 'boll': 2}
+
+
+def _com_from_span(span: float) -> float:
+    """与 pandas ewm(span=...) 相同的质心换算"""
+    return (span - 1) / 2.0
+
+
+if njit is not None:
+
+    @njit(cache=True, error_model='numpy')
+    def _ewm_update(weighted, old_wt, nobs, cur, alpha):
+        """EMA（adjust=False）单步递推，逻辑与 pandas 的 ewm 实现一致"""
+        is_obs = cur == cur
+        if weighted == weighted:
+            old_wt *= 1.0 - alpha
+            if is_obs:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                old_wt = 1.0
+        elif is_obs:
+            weighted = cur
+        if is_obs:
+            nobs += 1
+        return weighted, old_wt, nobs
+
+    @njit(cache=True, error_model='numpy')
+    def _fused_kernel(close, high, low, ma_windows, boll_n, boll_k, rsi_windows,
+                      kdj_n, kdj_alpha1, kdj_alpha2, macd_alpha_fast, macd_alpha_slow, macd_alpha_signal):
+        """
+        单次遍历计算全部指标
+
+        窗口参数为 0 表示不计算对应指标。输出为 (指标列数, n) 的矩阵，行顺序：
+        ma(各周期) | boll mid/upper/lower | rsi(各周期) | kdj k/d/j | macd dif/dea/macd
+        """
+        n = close.shape[0]
+        n_ma = ma_windows.shape[0]
+        n_rsi = rsi_windows.shape[0]
+        row_boll = n_ma
+        row_rsi = row_boll + 3
+        row_kdj = row_rsi + n_rsi
+        row_macd = row_kdj + 3
+        out = np.full((row_macd + 3, n), np.nan)
+
+        # EMA 状态：(值, 权重, 观测数)
+        k_w, k_ow, k_n = np.nan, 1.0, 0
+        d_w, d_ow, d_n = np.nan, 1.0, 0
+        f_w, f_ow, f_n = np.nan, 1.0, 0
+        s_w, s_ow, s_n = np.nan, 1.0, 0
+        g_w, g_ow, g_n = np.nan, 1.0, 0
+
+        for i in range(n):
+            # MA：每个窗口直接求和（窗口较小，结果与位置无关，便于增量计算）
+            for j in range(n_ma):
+                w = ma_windows[j]
+                if i + 1 >= w:
+                    s = 0.0
+                    for t in range(i - w + 1, i + 1):
+                        s += close[t]
+                    out[j, i] = s / w
+
+            # BOLL：两遍法计算样本标准差
+            if boll_n > 0 and i + 1 >= boll_n:
+                s = 0.0
+                for t in range(i - boll_n + 1, i + 1):
+                    s += close[t]
+                mid = s / boll_n
+                ss = 0.0
+                for t in range(i - boll_n + 1, i + 1):
+                    ss += (close[t] - mid) * (close[t] - mid)
+                std = np.sqrt(ss / (boll_n - 1))
+                out[row_boll, i] = mid
+                out[row_boll + 1, i] = mid + boll_k * std
+                out[row_boll + 2, i] = mid - boll_k * std
+
+            # RSI：N 日平均涨幅 / 平均跌幅（首日无涨跌）
+            for j in range(n_rsi):
+                w = rsi_windows[j]
+                if i >= w:
+                    gain = 0.0
+                    loss = 0.0
+                    for t in range(i - w + 1, i + 1):
+                        delta = close[t] - close[t - 1]
+                        if delta > 0:
+                            gain += delta
+                        elif delta < 0:
+                            loss -= delta
+                        elif delta != delta:
+                            gain = np.nan
+                    rs = (gain / w) / (loss / w)
+                    out[row_rsi + j, i] = 100.0 - 100.0 / (1.0 + rs)
+
+            # KDJ：RSV 不足 N 日或无波动时取 50
+            if kdj_n > 0:
+                rsv = np.nan
+                if i + 1 >= kdj_n:
+                    lo = low[i]
+                    hi = high[i]
+                    for t in range(i - kdj_n + 1, i + 1):
+                        if low[t] < lo or low[t] != low[t]:
+                            lo = low[t]
+                        if high[t] > hi or high[t] != high[t]:
+                            hi = high[t]
+                    rsv = (close[i] - lo) / (hi - lo) * 100.0
+                if rsv != rsv:
+                    rsv = 50.0
+                k_w, k_ow, k_n = _ewm_update(k_w, k_ow, k_n, rsv, kdj_alpha1)
+                d_w, d_ow, d_n = _ewm_update(d_w, d_ow, d_n, k_w, kdj_alpha2)
+                out[row_kdj, i] = k_w
+                out[row_kdj + 1, i] = d_w
+                out[row_kdj + 2, i] = 3.0 * k_w - 2.0 * d_w
+
+            # MACD
+            if macd_alpha_fast > 0:
+                f_w, f_ow, f_n = _ewm_update(f_w, f_ow, f_n, close[i], macd_alpha_fast)
+                s_w, s_ow, s_n = _ewm_update(s_w, s_ow, s_n, close[i], macd_alpha_slow)
+                dif = f_w - s_w
+                g_w, g_ow, g_n = _ewm_update(g_w, g_ow, g_n, dif, macd_alpha_signal)
+                out[row_macd, i] = dif
+                out[row_macd + 1, i] = g_w
+                out[row_macd + 2, i] = (dif - g_w) * 2
+
+        return out
+
+    @njit(cache=True, parallel=True, error_model='numpy')
+    def _fused_panel_kernel(close, high, low, n_rows, ma_windows, boll_n, boll_k, rsi_windows,
+                            kdj_n, kdj_alpha1, kdj_alpha2, macd_alpha_fast, macd_alpha_slow, macd_alpha_signal):
+        """
+        面板版融合内核：输入为 (股票数, n) 的矩阵（每行一只股票），各股票并行计算
+
+        输出为 (股票数, 指标列数, n)。
+        """
+        n_codes = close.shape[0]
+        out = np.empty((n_codes, n_rows, close.shape[1]))
+        for c in prange(n_codes):
+            out[c] = _fused_kernel(
+                close[c], high[c], low[c], ma_windows, boll_n, boll_k, rsi_windows,
+                kdj_n, kdj_alpha1, kdj_alpha2, macd_alpha_fast, macd_alpha_slow, macd_alpha_signal
+            )
+        return out
+
+
+def _rolling(values: np.ndarray, window: int, func) -> np.ndarray:
+    """沿时间轴（第0维）滑动窗口聚合，前 window-1 个位置为 NaN（窗口内含 NaN 时结果为 NaN）"""
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        out[window - 1:] = func(sliding_window_view(values, window, axis=0), axis=-1)
+    return out
+
+
+def _ewm(values: np.ndarray, com: float) -> np.ndarray:
+    """沿时间轴的 EMA（adjust=False），使用 pandas 的 Cython 实现（二维时逐列计算）"""
+    frame = pd.DataFrame(values) if values.ndim == 2 else pd.Series(values)
+    return frame.ewm(com=com, adjust=False).mean().to_numpy(dtype=np.float64)
+
+
+def _compute_numpy(close: np.ndarray, high: np.ndarray, low: np.ndarray, specs: dict) -> dict:
+    """NumPy 向量化实现（numba 不可用时；输入为一维序列或 (n, 股票数) 面板）"""
+    result = {}
+
+    if 'ma' in specs:
+        result['ma'] = {f"ma{p}": _rolling(close, p, np.mean) for p in specs['ma']['periods']}
+
+    if 'boll' in specs:
+        n, k = specs['boll']['n'], specs['boll']['k']
+        mid = _rolling(close, n, np.mean)
+        std = _rolling(close, n, lambda a, axis: np.std(a, axis=axis, ddof=1))
+        result['boll'] = {'mid': mid, 'upper': mid + k * std, 'lower': mid - k * std}
+
+    if 'rsi' in specs:
+        delta = np.diff(close, axis=0, prepend=np.nan)
+        gain = np.clip(delta, 0, None)
+        loss = np.clip(-delta, 0, None)
+        rsi = {}
+        for p in specs['rsi']['periods']:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rs = _rolling(gain, p, np.mean) / _rolling(loss, p, np.mean)
+                rsi[f"rsi{p}"] = 100 - (100 / (1 + rs))
+        result['rsi'] = rsi
+
+    if 'kdj' in specs:
+        params = specs['kdj']
+        low_n = _rolling(low, params['n'], np.min)
+        high_n = _rolling(high, params['n'], np.max)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsv = (close - low_n) / (high_n - low_n) * 100
+        rsv = np.where(np.isnan(rsv), 50.0, rsv)
+        k = _ewm(rsv, params['m1'] - 1)
+        d = _ewm(k, params['m2'] - 1)
+        result['kdj'] = {'k': k, 'd': d, 'j': 3 * k - 2 * d}
+
+    if 'macd' in specs:
+        params = specs['macd']
+        dif = _ewm(close, _com_from_span(params['fast'])) - _ewm(close, _com_from_span(params['slow']))
+        dea = _ewm(dif, _com_from_span(params['signal']))
+        result['macd'] = {'dif': dif, 'dea': dea, 'macd': (dif - dea) * 2}
+
+    return result
+
+
+def _kernel_args(specs: dict) -> tuple:
+    """将指标参数转换为融合内核的参数（不计算的指标窗口为 0）"""
+    boll = specs.get('boll')
+    kdj = specs.get('kdj')
+    macd = specs.get('macd')
+    return (
+        np.asarray(specs['ma']['periods'] if 'ma' in specs else [], dtype=np.int64),
+        int(boll['n']) if boll else 0,
+        float(boll['k']) if boll else 0.0,
+        np.asarray(specs['rsi']['periods'] if 'rsi' in specs else [], dtype=np.int64),
+        int(kdj['n']) if kdj else 0,
+        1.0 / kdj['m1'] if kdj else 0.0,
+        1.0 / kdj['m2'] if kdj else 0.0,
+        1.0 / (1.0 + _com_from_span(macd['fast'])) if macd else 0.0,
+        1.0 / (1.0 + _com_from_span(macd['slow'])) if macd else 0.0,
+        1.0 / (1.0 + _com_from_span(macd['signal'])) if macd else 0.0
+    )
+
+
+def _unpack(out: np.ndarray, specs: dict) -> dict:
+    """按内核输出的行顺序拆分各指标（out 第0维为指标列）"""
+    ma_periods = list(specs['ma']['periods']) if 'ma' in specs else []
+    rsi_periods = list(specs['rsi']['periods']) if 'rsi' in specs else []
+
+    result = {}
+    row = 0
+    if ma_periods:
+        result['ma'] = {f"ma{p}": out[row + i] for i, p in enumerate(ma_periods)}
+    row += len(ma_periods)
+    if 'boll' in specs:
+        result['boll'] = {'mid': out[row], 'upper': out[row + 1], 'lower': out[row + 2]}
+    row += 3
+    if rsi_periods:
+        result['rsi'] = {f"rsi{p}": out[row + i] for i, p in enumerate(rsi_periods)}
+    row += len(rsi_periods)
+    if 'kdj' in specs:
+        result['kdj'] = {'k': out[row], 'd': out[row + 1], 'j': out[row + 2]}
+    row += 3
+    if 'macd' in specs:
+        result['macd'] = {'dif': out[row], 'dea': out[row + 1], 'macd': out[row + 2]}
+    return result
+
+
+def _compute_numba(close: np.ndarray, high: np.ndarray, low: np.ndarray, specs: dict) -> dict:
+    """numba 融合内核实现"""
+    return _unpack(_fused_kernel(close, high, low, *_kernel_args(specs)), specs)
+
+
+def _compute_numba_panel(close: np.ndarray, high: np.ndarray, low: np.ndarray, specs: dict) -> dict:
+    """numba 面板内核实现：转置为每只股票一行的连续内存后并行计算"""
+    args = _kernel_args(specs)
+    n_rows = len(args[0]) + 3 + len(args[3]) + 3 + 3
+    out = _fused_panel_kernel(
+        np.ascontiguousarray(close.T), np.ascontiguousarray(high.T), np.ascontiguousarray(low.T),
+        n_rows, *args
+    )
+    # (股票数, 指标列数, n) -> (指标列数, n, 股票数)
+    return _unpack(out.transpose(1, 2, 0), specs)
+
+
+def compute_indicators(close, high, low, specs: dict) -> dict:
+    """
+    一次计算多个指标（numba 可用时单次遍历，否则使用 NumPy 向量化实现）
+
+    Args:
+        close: 收盘价序列
+        high: 最高价序列
+        low: 最低价序列
+        specs: {指标名称: 参数}，如 {'ma': {'periods': [5, 10]}, 'macd': {'fast': 12, ...}}
+
+    Returns:
+        dict: {指标名称: {输出列: 四舍五入后的float64数组}}，格式与 IndicatorService 一致
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+
+    if njit is not None:
+        raw = _compute_numba(close, high, low, specs)
+    else:
+        raw = _compute_numpy(close, high, low, specs)
+
+    return {
+        name: {key: np.round(values, DECIMALS[name]) for key, values in outputs.items()}
+        for name, outputs in raw.items()
+    }
+
+
+def compute_panel(close, high, low, specs: dict) -> dict:
+    """
+    全市场面板批量计算指标（时间 × 股票的二维矩阵，各股票一次性向量化/并行计算）
+
+    停牌或未上市的位置为 NaN：窗口内含 NaN 的滚动指标为 NaN，EMA 从首个有效值开始，
+    与对单只股票含 NaN 的序列计算一致。
+
+    Args:
+        close: 收盘价矩阵 (n_dates, n_codes)
+        high: 最高价矩阵
+        low: 最低价矩阵
+        specs: {指标名称: 参数}
+
+    Returns:
+        dict: {指标名称: {输出列: (n_dates, n_codes) 的float64矩阵}}
+    """
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+
+    if njit is not None:
+        raw = _compute_numba_panel(close, high, low, specs)
+    else:
+        raw = _compute_numpy(close, high, low, specs)
+
+    return {
+        name: {key: np.ascontiguousarray(np.round(values, DECIMALS[name])) for key, values in outputs.items()}
+        for name, outputs in raw.items()
+    }
@@ -2,13 +2,32 @@
 import pandas as pd
 import numpy as np
 from app.core.logging_config import get_logger
+from app.services.indicator_kernels import compute_indicators, compute_panel
 
 logger = get_logger(__name__)
 
 
+def _rounded(series: pd.Series, decimals: int) -> np.ndarray:
+    """
+    将指标序列整体转换为float64数组并四舍五入
+
+    NaN 保留在数组中，由 orjson（OPT_SERIALIZE_NUMPY）序列化为 null，不再逐元素转换。
+    """
+    return np.round(series.to_numpy(dtype=np.float64), decimals)
+
+
 class IndicatorService:
     """技术指标计算服务"""
 
+    # 各指标的默认参数（参数同时是指标缓存键的一部分）
+    DEFAULT_PARAMS = {
+        'ma': {'periods': [5, 10, 20, 60]},
+        'macd': {'fast': 12, 'slow': 26, 'signal': 9},
+        'kdj': {'n': 9, 'm1': 3, 'm2': 3},
+        'rsi': {'periods': [6, 12, 24]},
+        'boll': {'n': 20, 'k': 2}
+    }
+
     @staticmethod
     def calculate_ma(df: pd.DataFrame, periods: list = None) -> dict:
         """
@@ -28,8 +47,7 @@ class IndicatorService:
         for p in periods:
             col_name = f"ma{p}"
             ma_values = df['close'].rolling(window=p).mean()
-            # 将 NaN 转换为 None (JSON中为null)
-            result[col_name] = [None if pd.isna(v) else round(float(v), 2) for v in ma_values]
+            result[col_name] = _rounded(ma_values, 2)
 
         return result
 
@@ -54,9 +72,9 @@ class IndicatorService:
         macd_hist = (dif - dea) * 2
 
         return {
-            'dif': [None if pd.isna(v) else round(float(v), 4) for v in dif],
-            'dea': [None if pd.isna(v) else round(float(v), 4) for v in dea],
-            'macd': [None if pd.isna(v) else round(float(v), 4) for v in macd_hist]
+            'dif': _rounded(dif, 4),
+            'dea': _rounded(dea, 4),
+            'macd': _rounded(macd_hist, 4)
         }
 
     @staticmethod
@@ -88,9 +106,9 @@ class IndicatorService:
         j = 3 * k - 2 * d
 
         return {
-            'k': [None if pd.isna(v) else round(float(v), 2) for v in k],
-            'd': [None if pd.isna(v) else round(float(v), 2) for v in d],
-            'j': [None if pd.isna(v) else round(float(v), 2) for v in j]
+            'k': _rounded(k, 2),
+            'd': _rounded(d, 2),
+            'j': _rounded(j, 2)
         }
 
     @staticmethod
@@ -119,7 +137,7 @@ class IndicatorService:
             rsi = 100 - (100 / (1 + rs))
 
             col_name = f'rsi{p}'
-            result[col_name] = [None if pd.isna(v) else round(float(v), 2) for v in rsi]
+            result[col_name] = _rounded(rsi, 2)
 
         return result
 
@@ -142,11 +160,257 @@ class IndicatorService:
         lower = mid - k * std
 
         return {
-            'mid': [None if pd.isna(v) else round(float(v), 2) for v in mid],
-            'upper': [None if pd.isna(v) else round(float(v), 2) for v in upper],
-            'lower': [None if pd.isna(v) else round(float(v), 2) for v in lower]
+            'mid': _rounded(mid, 2),
+            'upper': _rounded(upper, 2),
+            'lower': _rounded(lower, 2)
         }
 
+    # 各指标参数名（按位置对应 'name:参数1,参数2' 语法；ma/rsi 为任意个周期）
+    PARAM_NAMES = {
+        'ma': ('periods',),
+        'macd': ('fast', 'slow', 'signal'),
+        'kdj': ('n', 'm1', 'm2'),
+        'rsi': ('periods',),
+        'boll': ('n', 'k')
+    }
+
+    # 可在 ClickHouse 中用窗口函数计算的指标
+    SERVER_SIDE_INDICATORS = ('ma', 'boll')
+
+    # 参数取值范围
+    MAX_PERIOD = 500
+    MAX_PERIODS = 10
+
+    @classmethod
+    def parse_spec(cls, spec: str) -> dict:
+        """
+        解析指标参数字符串
+
+        支持两种写法：
+        - 旧写法，逗号分隔的指标名（使用默认参数）：'ma,macd,kdj'
+        - 分号分隔、冒号后带参数：'ma:5,30,120;boll:26,2.5;macd'
+
+        周期列表会去重排序，缺省的参数取默认值，保证同一组参数得到同一个缓存键。
+
+        Args:
+            spec: 指标参数字符串
+
+        Returns:
+            dict: {指标名称: 参数}，保持请求中的顺序
+
+        Raises:
+            ValueError: 未知指标、重复指标或参数不合法
+        """
+        if not spec or not spec.strip():
+            return {}
+
+        separators = ';' if ':' in spec else ';,'
+        entries = [spec]
+        for sep in separators:
+            entries = [part for entry in entries for part in entry.split(sep)]
+
+        specs = {}
+        for entry in entries:
+            entry = entry.strip()
+            if not entry:
+                continue
+            name, _, args = entry.partition(':')
+            name = name.strip().lower()
+            if name not in cls.DEFAULT_PARAMS:
+                raise ValueError(f"未知指标: {name}")
+            if name in specs:
+                raise ValueError(f"重复的指标: {name}")
+
+            values = [a.strip() for a in args.split(',') if a.strip()] if args else []
+            specs[name] = cls._parse_params(name, values)
+
+        return specs
+
+    @classmethod
+    def _parse_params(cls, name: str, values: list) -> dict:
+        """将位置参数转换为指标参数字典（校验范围）"""
+        params = dict(cls.DEFAULT_PARAMS[name])
+        if not values:
+            return params
+
+        def to_period(text: str) -> int:
+            try:
+                period = int(text)
+            except ValueError:
+                raise ValueError(f"指标 {name} 的周期必须为整数: {text}")
+            if not 1 <= period <= cls.MAX_PERIOD:
+                raise ValueError(f"指标 {name} 的周期超出范围 1~{cls.MAX_PERIOD}: {period}")
+            return period
+
+        if name in ('ma', 'rsi'):
+            periods = sorted({to_period(v) for v in values})
+            if len(periods) > cls.MAX_PERIODS:
+                raise ValueError(f"指标 {name} 最多 {cls.MAX_PERIODS} 个周期")
+            params['periods'] = periods
+            return params
+
+        names = cls.PARAM_NAMES[name]
+        if len(values) > len(names):
+            raise ValueError(f"指标 {name} 最多 {len(names)} 个参数: {','.join(names)}")
+        for key, text in zip(names, values):
+            if name == 'boll' and key == 'k':
+                try:
+                    k = float(text)
+                except ValueError:
+                    raise ValueError(f"指标 boll 的倍数必须为数字: {text}")
+                if not 0 < k <= 10:
+                    raise ValueError(f"指标 boll 的倍数超出范围 (0, 10]: {text}")
+                params[key] = int(k) if k.is_integer() else k
+            else:
+                params[key] = to_period(text)
+
+        if name == 'macd' and params['fast'] >= params['slow']:
+            raise ValueError("指标 macd 的快线周期必须小于慢线周期")
+        if name == 'boll' and params['n'] < 2:
+            raise ValueError("指标 boll 的周期至少为 2")
+        return params
+
+    @classmethod
+    def params_key(cls, name: str, params: dict = None) -> str:
+        """
+        指标参数的规范化字符串（用于缓存键）
+
+        Args:
+            name: 指标名称
+            params: 指标参数，None 表示默认参数
+
+        Returns:
+            str: 如 'fast=12,signal=9,slow=26'、'periods=5/10/20/60'
+        """
+        if params is None:
+            params = cls.DEFAULT_PARAMS[name]
+        return ','.join(
+            f"{k}={'/'.join(map(str, v)) if isinstance(v, (list, tuple)) else v}"
+            for k, v in sorted(params.items())
+        )
+
+    @staticmethod
+    def window_bars(name: str, params: dict) -> int:
+        """
+        计算一根K线的指标值所需的历史K线根数（窗口长度 - 1）
+
+        Args:
+            name: 指标名称
+            params: 指标参数
+
+        Returns:
+            int: 历史K线根数（EMA 类指标为 0）
+        """
+        if name in ('ma', 'rsi'):
+            # RSI 的 N 日涨跌需要 N+1 根收盘价，因此多一根
+            return max(params['periods']) - (1 if name == 'ma' else 0)
+        if name in ('boll', 'kdj'):
+            return params['n'] - 1
+        return 0
+
+    @classmethod
+    def warmup_bars(cls, name: str, params: dict) -> int:
+        """
+        指标在可见范围起点处稳定所需的预热K线根数
+
+        窗口类指标为窗口长度；EMA 类指标另加约 3 倍周期，使初始值的权重衰减到 0.3% 以下。
+
+        Args:
+            name: 指标名称
+            params: 指标参数
+
+        Returns:
+            int: 预热K线根数
+        """
+        bars = cls.window_bars(name, params)
+        if name == 'macd':
+            bars += 3 * (params['slow'] + params['signal'])
+        elif name == 'kdj':
+            # com = m - 1 对应 span = 2m - 1
+            bars += 3 * (2 * params['m1'] - 1) + 3 * (2 * params['m2'] - 1)
+        return bars
+
+    @classmethod
+    def window_columns(cls, name: str, params: dict) -> tuple:
+        """
+        生成在 ClickHouse 中计算指标的窗口函数表达式
+
+        不足一个窗口的K线返回 nan，与 pandas rolling 的结果一致。
+
+        Args:
+            name: 指标名称（需在 SERVER_SIDE_INDICATORS 中）
+            params: 指标参数
+
+        Returns:
+            tuple: ([(列别名, 表达式), ...], {窗口名: 窗口定义})
+        """
+        def window(n: int) -> tuple:
+            return f"w{n}", f"PARTITION BY code ORDER BY trade_date ROWS BETWEEN {n - 1} PRECEDING AND CURRENT ROW"
+
+        def full(n: int, expr: str) -> str:
+            return f"if(count() OVER w{n} >= {n}, {expr}, nan)"
+
+        columns = []
+        windows = {}
+        if name == 'ma':
+            for p in params['periods']:
+                w_name, w_def = window(p)
+                windows[w_name] = w_def
+                columns.append((f"ind_ma_ma{p}", full(p, f"avg(close) OVER {w_name}")))
+        elif name == 'boll':
+            n, k = params['n'], params['k']
+            w_name, w_def = window(n)
+            windows[w_name] = w_def
+            mid = f"avg(close) OVER {w_name}"
+            std = f"stddevSamp(close) OVER {w_name}"
+            columns.append(("ind_boll_mid", full(n, mid)))
+            columns.append(("ind_boll_upper", full(n, f"{mid} + {k} * {std}")))
+            columns.append(("ind_boll_lower", full(n, f"{mid} - {k} * {std}")))
+        else:
+            raise ValueError(f"指标 {name} 不支持在数据库中计算")
+        return columns, windows
+
+    @classmethod
+    def from_window_result(cls, name: str, params: dict, df: pd.DataFrame) -> dict:
+        """
+        从窗口函数查询结果中取出指标（格式与 calculate_one 一致）
+
+        Args:
+            name: 指标名称
+            params: 指标参数
+            df: 含 window_columns 生成列的查询结果
+
+        Returns:
+            dict: 指标结果
+        """
+        prefix = f"ind_{name}_"
+        columns, _ = cls.window_columns(name, params)
+        return {
+            alias[len(prefix):]: _rounded(df[alias], 2)
+            for alias, _ in columns
+        }
+
+    def calculate_one(self, df: pd.DataFrame, name: str, params: dict = None) -> dict:
+        """
+        计算单个指标
+
+        Args:
+            df: K线数据DataFrame
+            name: 指标名称 'ma'/'macd'/'kdj'/'rsi'/'boll'
+            params: 指标参数，None 表示默认参数
+
+        Returns:
+            dict: 指标结果，如 {dif: [...], dea: [...], macd: [...]}
+
+        Raises:
+            ValueError: 未知指标
+        """
+        if name not in self.DEFAULT_PARAMS:
+            raise ValueError(f"未知指标: {name}")
+        if params is None:
+            params = self.DEFAULT_PARAMS[name]
+        return compute_indicators(df['close'], df['high'], df['low'], {name: params})[name]
+
     def calculate(self, df: pd.DataFrame, indicators: list) -> dict:
         """
         计算指定的指标集合
@@ -158,28 +422,41 @@ class IndicatorService:
         Returns:
             dict: {ma: {...}, macd: {...}, ...}
         """
-        result = {}
+        specs = {}
+        for ind in indicators:
+            if ind in self.DEFAULT_PARAMS:
+                specs[ind] = self.DEFAULT_PARAMS[ind]
+            else:
+                logger.warning(f"未知指标: {ind}")
+
+        # 多个指标在同一次遍历中计算
+        try:
+            result = compute_indicators(df['close'], df['high'], df['low'], specs)
+            logger.info(f"计算指标完成: {','.join(specs)}")
+        except Exception as e:
+            logger.error(f"计算指标 {','.join(specs)} 失败: {e}", exc_info=True)
+            result = {}
+
+        return result
+
+    def calculate_panel(self, panel: dict, indicators: list) -> dict:
+        """
+        全市场批量计算指标（面板一次性计算，不逐只股票循环）
 
+        Args:
+            panel: KLineService.get_kline_panel 返回的面板（close/high/low 为 日期 × 股票 矩阵）
+            indicators: 指标名称列表 ['ma', 'macd', 'kdj', 'rsi', 'boll']
+
+        Returns:
+            dict: {ma: {ma5: ndarray(n_dates, n_codes), ...}, macd: {...}, ...}
+        """
+        specs = {}
         for ind in indicators:
-            try:
-                if ind == 'ma':
-                    result['ma'] = self.calculate_ma(df)
-                    logger.info(f"计算MA指标完成")
-                elif ind == 'macd':
-                    result['macd'] = self.calculate_macd(df)
-                    logger.info(f"计算MACD指标完成")
-                elif ind == 'kdj':
-                    result['kdj'] = self.calculate_kdj(df)
-                    logger.info(f"计算KDJ指标完成")
-                elif ind == 'rsi':
-                    result['rsi'] = self.calculate_rsi(df)
-                    logger.info(f"计算RSI指标完成")
-                elif ind == 'boll':
-                    result['boll'] = self.calculate_boll(df)
-                    logger.info(f"计算BOLL指标完成")
-                else:
-                    logger.warning(f"未知指标: {ind}")
-            except Exception as e:
-                logger.error(f"计算指标 {ind} 失败: {e}", exc_info=True)
+            if ind in self.DEFAULT_PARAMS:
+                specs[ind] = self.DEFAULT_PARAMS[ind]
+            else:
+                logger.warning(f"未知指标: {ind}")
 
+        result = compute_panel(panel['close'], panel['high'], panel['low'], specs)
+        logger.info(f"面板指标计算完成: {','.join(specs)}, {panel['close'].shape[0]} 日 × {panel['close'].shape[1]} 只股票")
         return result
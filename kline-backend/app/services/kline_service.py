@@ -1,17 +1,34 @@
 """K线服务"""
+import asyncio
+from datetime import date, timedelta
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
 from app.db.clickhouse import ClickHouseClient
+from app.core.config import settings
 from app.schemas.kline import KLineResponse, KLineData, StockBasicInfo
 from app.services.stock_service import StockService
+from app.services.cache_service import CacheService
+from app.services.indicator_service import IndicatorService
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# 列式响应中的数值列（顺序即逐行格式的字段顺序）
+KLINE_FIELDS = ('open', 'close', 'high', 'low', 'volume', 'amount')
+
 
 class KLineService:
     """K线服务"""
 
-    def __init__(self, db: ClickHouseClient):
+    def __init__(self, db: ClickHouseClient, cache: Optional[CacheService] = None):
+        """
+        Args:
+            db: ClickHouse客户端
+            cache: 缓存服务；提供时日K线按年分段缓存，任意日期范围由缓存分段拼接
+        """
         self.db = db
+        self.cache = cache
 
     def _get_price_columns(self, adj_type: str) -> str:
         """
@@ -45,6 +62,20 @@ class KLineService:
                 min(low) AS low
             """
 
+    def _get_rollup_columns(self, adj_type: str) -> tuple:
+        """
+        获取日线聚合表/分钟表中对应复权类型的价格列名
+
+        Args:
+            adj_type: 复权类型 'after'=后复权, 'before'=前复权, 'none'=不复权
+
+        Returns:
+            tuple: (open_col, close_col, high_col, low_col)
+        """
+        if adj_type in ('after', 'before'):
+            return tuple(f"adj_{c}_{adj_type}" for c in ('open', 'close', 'high', 'low'))
+        return 'open', 'close', 'high', 'low'
+
     def _get_period_group_by(self, period: str) -> tuple:
         """
         根据周期返回 GROUP BY 表达式和 SELECT 表达式
@@ -64,88 +95,808 @@ class KLineService:
         else:  # day
             return "trade_date", "trade_date"
 
-    def get_kline(
+    @staticmethod
+    def _code_list(codes: list) -> str:
+        """将（已清理的）股票代码列表拼接为 SQL IN 列表"""
+        return ", ".join(f"'{c}'" for c in codes)
+
+    def _build_minute_query(
         self,
-        code: str,
+        codes: list,
         start_date: str,
         end_date: str,
-        adj_type: str = 'none',
-        period: str = 'day'
-    ) -> KLineResponse:
+        adj_type: str,
+        period: str
+    ) -> str:
         """
-        获取K线数据（通用周期）
+        构建直接从分钟表聚合的K线查询
 
         Args:
-            code: 股票代码
-            start_date: 开始日期 YYYY-MM-DD
-            end_date: 结束日期 YYYY-MM-DD
+            codes: 股票代码列表（已清理）
+            start_date: 开始日期
+            end_date: 结束日期
             adj_type: 复权类型
-            period: K线周期 'day'/'week'/'month'/'year'
+            period: K线周期
 
         Returns:
-            KLineResponse: K线数据
+            str: 查询SQL，结果按 (code, trade_date) 排序
         """
-        logger.info(f"获取K线数据: code={code}, start={start_date}, end={end_date}, adj_type={adj_type}, period={period}")
-
-        # 清理参数（防止SQL注入）
-        code = code.replace("'", "").replace(";", "").replace("--", "")
-        start_date = start_date.replace("'", "").replace(";", "").replace("--", "")
-        end_date = end_date.replace("'", "").replace(";", "").replace("--", "")
-
-        # 获取价格列和周期分组表达式
         price_cols = self._get_price_columns(adj_type)
         group_by_expr, select_expr = self._get_period_group_by(period)
 
-        # 构建查询SQL
-        query = f"""
+        return f"""
             SELECT
+                code,
                 {select_expr},
                 {price_cols},
                 sum(volume) AS volume,
                 sum(amount) AS amount
             FROM minute_kline
-            WHERE code = '{code}'
+            WHERE code IN ({self._code_list(codes)})
               AND trade_date >= '{start_date}'
               AND trade_date <= '{end_date}'
-            GROUP BY {group_by_expr}
-            ORDER BY trade_date
+            GROUP BY code, {group_by_expr}
+            ORDER BY code, trade_date
         """
 
-        logger.debug(f"执行查询: {query[:200]}...")
-        df = self.db.query_df(query)
+    async def _rollup_coverage(self, codes: list, start_date: str, end_date: str) -> Dict[str, list]:
+        """
+        查询日线聚合表中各股票每年已聚合的日期范围
+
+        日线表按年分区回填（migrate.py --rollup --year），各股票、各年份的覆盖情况可能不同。
+
+        Args:
+            codes: 股票代码列表（已清理）
+            start_date: 开始日期
+            end_date: 结束日期
 
+        Returns:
+            dict: {code: [(首日, 末日), ...]}，按日期升序，日期为 YYYY-MM-DD；日线表中没有的股票为空列表
+        """
+        df = await self.db.query_df_async(f"""
+            SELECT code, min(trade_date) AS first_date, max(trade_date) AS last_date
+            FROM daily_kline
+            WHERE code IN ({self._code_list(codes)})
+              AND trade_date >= '{start_date}'
+              AND trade_date <= '{end_date}'
+            GROUP BY code, toYear(trade_date)
+            ORDER BY code, first_date
+        """)
+        coverage = {code: [] for code in codes}
         if df.empty:
+            return coverage
+        for code, first_date, last_date in df[['code', 'first_date', 'last_date']].itertuples(index=False):
+            coverage.setdefault(code, []).append((str(first_date)[:10], str(last_date)[:10]))
+        return coverage
+
+    @staticmethod
+    def _minute_fill_condition(codes: list, start_date: str, end_date: str, coverage: Dict[str, list]) -> str:
+        """
+        分钟表补齐分支的过滤条件：各股票在 [start_date, end_date] 内未被日线表覆盖的时间段
+
+        条件由常量组成（code = ... AND dt 范围），可命中分钟表的主键和分区。
+
+        Args:
+            codes: 股票代码列表（已清理）
+            start_date: 开始日期
+            end_date: 结束日期
+            coverage: _rollup_coverage 的结果
+
+        Returns:
+            str: SQL 条件，全部已覆盖时为 0
+        """
+        terms = []
+        for code in codes:
+            gaps = []
+            lo_date, lo = start_date[:10], f"toDateTime('{start_date}')"
+            for first_date, last_date in coverage.get(code, []):
+                if first_date > lo_date:
+                    gaps.append(f"(dt >= {lo} AND dt < toDateTime('{first_date}'))")
+                lo_date, lo = last_date, f"toDateTime('{last_date}') + INTERVAL 1 DAY"
+            if not coverage.get(code) or lo_date < end_date[:10]:
+                gaps.append(f"(dt >= {lo} AND dt < toDateTime('{end_date}') + INTERVAL 1 DAY)")
+            if gaps:
+                terms.append(f"(code = '{code}' AND ({' OR '.join(gaps)}))")
+        return ' OR '.join(terms) or '0'
+
+    def _build_rollup_query(
+        self,
+        codes: list,
+        start_date: str,
+        end_date: str,
+        adj_type: str,
+        period: str,
+        coverage: Dict[str, list]
+    ) -> str:
+        """
+        构建基于日线聚合表 daily_kline 的K线查询
+
+        日线表保存 argMin/argMax 中间状态，周/月/年K线在日线状态上再次合并。
+        各股票在日线表中尚未覆盖的时间段（未回填的股票、年份，或最新尚未聚合的日期）从分钟表现场聚合补齐，
+        两部分通过 UNION ALL 在同一条查询中合并。分钟分支按 code + dt 常量范围过滤以命中主键和分区。
+
+        Args:
+            codes: 股票代码列表（已清理）
+            start_date: 开始日期
+            end_date: 结束日期
+            adj_type: 复权类型
+            period: K线周期
+            coverage: 日线表覆盖范围（_rollup_coverage 的结果）
+
+        Returns:
+            str: 查询SQL，结果按 (code, trade_date) 排序
+        """
+        open_col, close_col, high_col, low_col = self._get_rollup_columns(adj_type)
+        group_by_expr, select_expr = self._get_period_group_by(period)
+        code_list = self._code_list(codes)
+        fill_condition = self._minute_fill_condition(codes, start_date, end_date, coverage)
+
+        return f"""
+            SELECT
+                code,
+                {select_expr},
+                argMinMerge(o) AS open,
+                argMaxMerge(c) AS close,
+                max(h) AS high,
+                min(l) AS low,
+                sum(v) AS volume,
+                sum(a) AS amount
+            FROM (
+                SELECT
+                    code,
+                    trade_date,
+                    argMinMergeState({open_col}) AS o,
+                    argMaxMergeState({close_col}) AS c,
+                    max({high_col}) AS h,
+                    min({low_col}) AS l,
+                    sum(volume) AS v,
+                    sum(amount) AS a
+                FROM daily_kline
+                WHERE code IN ({code_list})
+                  AND trade_date >= '{start_date}'
+                  AND trade_date <= '{end_date}'
+                GROUP BY code, trade_date
+
+                UNION ALL
+
+                SELECT
+                    code,
+                    trade_date,
+                    argMinState({open_col}, dt) AS o,
+                    argMaxState({close_col}, dt) AS c,
+                    max({high_col}) AS h,
+                    min({low_col}) AS l,
+                    sum(volume) AS v,
+                    sum(amount) AS a
+                FROM minute_kline
+                WHERE code IN ({code_list})
+                  AND dt >= toDateTime('{start_date}')
+                  AND dt < toDateTime('{end_date}') + INTERVAL 1 DAY
+                  AND ({fill_condition})
+                GROUP BY code, trade_date
+            )
+            GROUP BY code, {group_by_expr}
+            ORDER BY code, trade_date
+        """
+
+    @staticmethod
+    def warmup_start(start_date: str, period: str, bars: int) -> str:
+        """
+        估算向前预热 bars 根K线所需的起始日期（按日历天数放宽，包含节假日余量）
+
+        Args:
+            start_date: 开始日期 YYYY-MM-DD
+            period: K线周期
+            bars: 预热K线根数
+
+        Returns:
+            str: 预热起始日期 YYYY-MM-DD
+        """
+        start = date.fromisoformat(start_date[:10])
+        if bars <= 0:
+            return start.isoformat()
+        if period == 'week':
+            start -= timedelta(weeks=bars + 1)
+        elif period == 'month':
+            months = start.year * 12 + start.month - 1 - (bars + 1)
+            start = date(months // 12, months % 12 + 1, 1)
+        elif period == 'year':
+            start = date(start.year - bars - 1, 1, 1)
+        else:
+            # 每年约 245 个交易日，另加长假余量
+            start -= timedelta(days=int(bars * 1.5) + 15)
+        return start.isoformat()
+
+    @staticmethod
+    def period_bounds(day: str, period: str) -> tuple:
+        """
+        包含指定日期的K线周期的首尾日期（与SQL的 toMonday/toStartOfMonth/toStartOfYear 一致）
+
+        Args:
+            day: 日期 YYYY-MM-DD
+            period: K线周期
+
+        Returns:
+            tuple: (周期首日, 周期末日)，均为 YYYY-MM-DD；日K线首尾均为当日
+        """
+        d = date.fromisoformat(day[:10])
+        if period == 'week':
+            first = d - timedelta(days=d.weekday())
+            last = first + timedelta(days=6)
+        elif period == 'month':
+            first = d.replace(day=1)
+            last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        elif period == 'year':
+            first = date(d.year, 1, 1)
+            last = date(d.year, 12, 31)
+        else:
+            first = last = d
+        return first.isoformat(), last.isoformat()
+
+    def _build_window_query(self, bars_query: str, start_date: str, specs: dict) -> str:
+        """
+        在K线聚合查询外层加上指标窗口函数，并去掉预热部分
+
+        周/月/年K线按周期日期过滤：包含 start_date 的周期保留（其K线数值由调用方替换为
+        只含 start_date 及之后交易日的部分周期，与按范围查询的K线一致）。
+
+        Args:
+            bars_query: K线聚合查询（从预热起始日期开始）
+            start_date: 返回结果的开始日期（周/月/年K线为包含该日期的周期首日）
+            specs: {指标名称: 参数}，均为 IndicatorService.SERVER_SIDE_INDICATORS
+
+        Returns:
+            str: 查询SQL，结果按 (code, trade_date) 排序
+        """
+        columns = []
+        windows = {}
+        for name, params in specs.items():
+            cols, wins = IndicatorService.window_columns(name, params)
+            columns.extend(cols)
+            windows.update(wins)
+
+        select_cols = ",\n                    ".join(f"{expr} AS {alias}" for alias, expr in columns)
+        window_defs = ",\n                    ".join(f"{w_name} AS ({w_def})" for w_name, w_def in windows.items())
+
+        return f"""
+            SELECT *
+            FROM (
+                SELECT
+                    code, trade_date, open, close, high, low, volume, amount,
+                    {select_cols}
+                FROM ({bars_query})
+                WINDOW
+                    {window_defs}
+            )
+            WHERE trade_date >= '{start_date}'
+            ORDER BY code, trade_date
+        """
+
+    async def get_kline_with_indicators(
+        self,
+        code: str,
+        start_date: str,
+        end_date: str,
+        adj_type: str,
+        period: str,
+        specs: dict
+    ) -> dict:
+        """
+        获取K线并在同一条查询中由 ClickHouse 计算指标（窗口函数）
+
+        查询从预热起始日期开始聚合K线，使 start_date 处的指标已有完整窗口。
+
+        Args:
+            code: 股票代码
+            start_date: 开始日期 YYYY-MM-DD
+            end_date: 结束日期 YYYY-MM-DD
+            adj_type: 复权类型
+            period: K线周期
+            specs: {指标名称: 参数}，均为 IndicatorService.SERVER_SIDE_INDICATORS
+
+        Returns:
+            dict: {stock_info, columns, count, period, indicators}
+        """
+        logger.info(f"获取K线及数据库端指标: code={code}, start={start_date}, end={end_date}, indicators={list(specs)}")
+
+        # 清理参数（防止SQL注入）
+        code = code.replace("'", "").replace(";", "").replace("--", "")
+        start_date = start_date.replace("'", "").replace(";", "").replace("--", "")
+        end_date = end_date.replace("'", "").replace(";", "").replace("--", "")
+
+        warmup = max(IndicatorService.warmup_bars(name, params) for name, params in specs.items())
+        query_start = self.warmup_start(start_date, period, warmup)
+        # 包含 start_date 的周期（日K线即 start_date 当日）
+        first_period, first_period_end = self.period_bounds(start_date, period)
+
+        if settings.CH_USE_DAILY_TABLE:
+            try:
+                coverage = await self._rollup_coverage([code], query_start, end_date)
+                bars_query = self._build_rollup_query([code], query_start, end_date, adj_type, period, coverage)
+                df = await self.db.query_df_async(self._build_window_query(bars_query, first_period, specs))
+            except Exception as e:
+                logger.warning(f"日线聚合表查询失败，回退到分钟表: {e}")
+                bars_query = self._build_minute_query([code], query_start, end_date, adj_type, period)
+                df = await self.db.query_df_async(self._build_window_query(bars_query, first_period, specs))
+        else:
+            bars_query = self._build_minute_query([code], query_start, end_date, adj_type, period)
+            df = await self.db.query_df_async(self._build_window_query(bars_query, first_period, specs))
+
+        if first_period < start_date[:10] and not df.empty and str(df['trade_date'].iloc[0])[:10] == first_period:
+            # start_date 在周期中间：首根K线与按范围查询一致，只合并 start_date 及之后的交易日
+            # （指标仍按完整周期的K线计算，与客户端计算时预热K线的口径一致）
+            partial = await self._query_bars([code], start_date, min(first_period_end, end_date), adj_type, period)
+            if partial.empty:
+                df = df.iloc[1:].reset_index(drop=True)
+            else:
+                df = df.copy()
+                for field in KLINE_FIELDS:
+                    df.loc[0, field] = partial[field].iloc[0]
+
+        if df.empty:
+            logger.warning(f"未找到数据: code={code}, start={start_date}, end={end_date}, period={period}")
+            raise ValueError(f"未找到股票 {code} 在 {start_date} 至 {end_date} 的数据")
+
+        stock_service = StockService(self.db)
+        stock_name = await stock_service.get_stock_name(code)
+
+        return {
+            "stock_info": {"code": code, "name": stock_name},
+            "columns": self.to_columns(df, 'trade_date', 10),
+            "count": len(df),
+            "period": period,
+            "indicators": {
+                name: IndicatorService.from_window_result(name, params, df)
+                for name, params in specs.items()
+            }
+        }
+
+    async def _query_bars(
+        self,
+        codes: list,
+        start_date: str,
+        end_date: str,
+        adj_type: str,
+        period: str
+    ) -> pd.DataFrame:
+        """
+        查询一组股票的K线（优先日线聚合表，失败时回退分钟表）
+
+        Args:
+            codes: 股票代码列表（已清理）
+            start_date: 开始日期（已清理）
+            end_date: 结束日期（已清理）
+            adj_type: 复权类型
+            period: K线周期
+
+        Returns:
+            pd.DataFrame: code, trade_date, open, close, high, low, volume, amount
+        """
+        if settings.CH_USE_DAILY_TABLE:
+            try:
+                coverage = await self._rollup_coverage(codes, start_date, end_date)
+                query = self._build_rollup_query(codes, start_date, end_date, adj_type, period, coverage)
+                logger.debug(f"执行查询: {query[:200]}...")
+                return await self.db.query_df_async(query)
+            except Exception as e:
+                # 日线聚合表不存在或不可用时回退到分钟表
+                logger.warning(f"日线聚合表查询失败，回退到分钟表: {e}")
+                return await self.db.query_df_async(
+                    self._build_minute_query(codes, start_date, end_date, adj_type, period)
+                )
+
+        query = self._build_minute_query(codes, start_date, end_date, adj_type, period)
+        logger.debug(f"执行查询: {query[:200]}...")
+        return await self.db.query_df_async(query)
+
+    @staticmethod
+    def to_columns(df: pd.DataFrame, time_col: str, date_len: int = None) -> dict:
+        """
+        将查询结果DataFrame转换为列式数据（直接取NumPy列，不逐行构造对象）
+
+        Args:
+            df: 查询结果
+            time_col: 时间列名 'trade_date' 或 'dt'
+            date_len: 日期字符串截取长度，None 表示保留完整时间
+
+        Returns:
+            dict: {dates: [...], open: ndarray, close: ndarray, ...}
+        """
+        dates = df[time_col].astype(str)
+        if date_len:
+            dates = dates.str[:date_len]
+
+        columns = {'dates': dates.tolist()}
+        for field in KLINE_FIELDS:
+            columns[field] = df[field].to_numpy(dtype=np.float64)
+        return columns
+
+    @staticmethod
+    def to_rows(columns: dict) -> list:
+        """
+        将列式数据转换为逐行字典（兼容旧的 klines 行格式）
+
+        Args:
+            columns: to_columns 返回的列式数据
+
+        Returns:
+            list: [{date, open, close, high, low, volume, amount}, ...]
+        """
+        keys = ('date',) + KLINE_FIELDS
+        values = [columns['dates']] + [columns[f].tolist() for f in KLINE_FIELDS]
+        return [dict(zip(keys, row)) for row in zip(*values)]
+
+    @staticmethod
+    def resample_columns(columns: dict, period: str) -> dict:
+        """
+        将日K线列式数据合并为周/月/年K线（与SQL聚合口径一致：首开、末收、最高、最低、量额求和）
+
+        Args:
+            columns: 按日期升序的日K线列式数据
+            period: K线周期 'day'/'week'/'month'/'year'
+
+        Returns:
+            dict: 合并后的列式数据，日期为周一/月初/年初
+        """
+        if period not in ('week', 'month', 'year') or not columns['dates']:
+            return columns
+
+        days = np.array(columns['dates'], dtype='datetime64[D]')
+        if period == 'week':
+            # 1970-01-01 为周四，(天数 + 3) % 7 即周一为0的星期序号
+            keys = days - (days.astype(np.int64) + 3) % 7
+        elif period == 'month':
+            keys = days.astype('datetime64[M]').astype('datetime64[D]')
+        else:
+            keys = days.astype('datetime64[Y]').astype('datetime64[D]')
+
+        starts = np.r_[0, np.flatnonzero(keys[1:] != keys[:-1]) + 1]
+        ends = np.r_[starts[1:], len(keys)] - 1
+
+        return {
+            'dates': keys[starts].astype(str).tolist(),
+            'open': columns['open'][starts],
+            'close': columns['close'][ends],
+            'high': np.maximum.reduceat(columns['high'], starts),
+            'low': np.minimum.reduceat(columns['low'], starts),
+            'volume': np.add.reduceat(columns['volume'], starts),
+            'amount': np.add.reduceat(columns['amount'], starts)
+        }
+
+    def _segment_ttl(self, year: int, adj_type: str) -> int:
+        """
+        分段缓存有效期
+
+        往年分段不再变化，可长期缓存；前复权价格在每次除权后整体重算，往年分段也使用较短有效期。
+        """
+        if year >= date.today().year:
+            return settings.KLINE_SEGMENT_TTL_CURRENT
+        if adj_type == 'before':
+            return 24 * 3600
+        return settings.KLINE_SEGMENT_TTL_HISTORY
+
+    async def _load_daily_segments(self, codes: list, years: list, adj_type: str) -> Dict[str, dict]:
+        """
+        读取按年分段的日K线，缺失的分段用一次查询补齐并写入缓存
+
+        Args:
+            codes: 股票代码列表（已清理）
+            years: 年份列表（升序）
+            adj_type: 复权类型
+
+        Returns:
+            dict: {code: {year: 列式数据}}，无数据的年份为空分段
+        """
+        keys = [(code, year) for code in codes for year in years]
+        cached = await asyncio.gather(*(
+            self.cache.get(f"kline_seg:{code}:{adj_type}:{year}") for code, year in keys
+        ))
+
+        segments: Dict[str, dict] = {code: {} for code in codes}
+        missing = []
+        for (code, year), seg in zip(keys, cached):
+            if seg is None:
+                missing.append((code, year))
+            else:
+                segments[code][year] = seg
+
+        if not missing:
+            return segments
+
+        # 缺失分段合并为一次查询：缺失的股票 × 缺失年份的跨度
+        missing_codes = sorted({code for code, _ in missing})
+        first_year = min(year for _, year in missing)
+        last_year = max(year for _, year in missing)
+        logger.info(f"K线分段缓存未命中: {len(missing)} 段, codes={missing_codes}, years={first_year}-{last_year}")
+
+        df = await self._query_bars(
+            missing_codes, f"{first_year}-01-01", f"{last_year}-12-31", adj_type, 'day'
+        )
+
+        fetched = {}
+        if not df.empty:
+            years_col = df['trade_date'].astype(str).str[:4].astype(int)
+            for (code, year), group in df.groupby([df['code'], years_col], sort=False):
+                fetched[(code, year)] = self.to_columns(group, 'trade_date', 10)
+
+        empty = {'dates': []}
+        empty.update({field: np.empty(0, dtype=np.float64) for field in KLINE_FIELDS})
+
+        writes = []
+        for code, year in missing:
+            seg = fetched.get((code, year), empty)
+            segments[code][year] = seg
+            # 空分段可能是该年份尚未导入，只短期缓存，导入后不会长期被隐藏
+            ttl = self._segment_ttl(year, adj_type) if seg is not empty else settings.KLINE_SEGMENT_TTL_CURRENT
+            writes.append(self.cache.set(f"kline_seg:{code}:{adj_type}:{year}", seg, ttl))
+        await asyncio.gather(*writes)
+
+        return segments
+
+    async def _get_columns_segmented(
+        self,
+        codes: list,
+        start_date: str,
+        end_date: str,
+        adj_type: str,
+        period: str
+    ) -> Dict[str, dict]:
+        """
+        由年度分段缓存拼接任意日期范围的K线（周/月/年K线由日K线合并）
+
+        Args:
+            codes: 股票代码列表（已清理）
+            start_date: 开始日期 YYYY-MM-DD
+            end_date: 结束日期 YYYY-MM-DD
+            adj_type: 复权类型
+            period: K线周期
+
+        Returns:
+            dict: {code: 列式数据}，范围内无数据的股票不包含在内
+        """
+        start_date, end_date = start_date[:10], end_date[:10]
+        years = list(range(int(start_date[:4]), int(end_date[:4]) + 1))
+        segments = await self._load_daily_segments(codes, years, adj_type)
+
+        result = {}
+        for code in codes:
+            parts = [segments[code][year] for year in years]
+            dates = np.array([d for part in parts for d in part['dates']], dtype=object)
+            lo = int(np.searchsorted(dates, start_date, side='left'))
+            hi = int(np.searchsorted(dates, end_date, side='right'))
+            if lo >= hi:
+                continue
+
+            columns = {'dates': dates[lo:hi].tolist()}
+            for field in KLINE_FIELDS:
+                # 分段可能来自JSON编码（列表），统一转为float64数组
+                columns[field] = np.concatenate(
+                    [np.asarray(part[field], dtype=np.float64) for part in parts]
+                )[lo:hi]
+            result[code] = self.resample_columns(columns, period)
+
+        return result
+
+    async def get_kline_columns(
+        self,
+        code: str,
+        start_date: str,
+        end_date: str,
+        adj_type: str = 'none',
+        period: str = 'day'
+    ) -> dict:
+        """
+        获取K线数据（通用周期，列式格式）
+
+        Args:
+            code: 股票代码
+            start_date: 开始日期 YYYY-MM-DD
+            end_date: 结束日期 YYYY-MM-DD
+            adj_type: 复权类型
+            period: K线周期 'day'/'week'/'month'/'year'
+
+        Returns:
+            dict: {stock_info, columns, count, period}
+        """
+        logger.info(f"获取K线数据: code={code}, start={start_date}, end={end_date}, adj_type={adj_type}, period={period}")
+
+        # 清理参数（防止SQL注入）
+        code = code.replace("'", "").replace(";", "").replace("--", "")
+        start_date = start_date.replace("'", "").replace(";", "").replace("--", "")
+        end_date = end_date.replace("'", "").replace(";", "").replace("--", "")
+
+        if self.cache is not None and settings.KLINE_SEGMENT_CACHE:
+            columns = (await self._get_columns_segmented([code], start_date, end_date, adj_type, period)).get(code)
+        else:
+            df = await self._query_bars([code], start_date, end_date, adj_type, period)
+            columns = None if df.empty else self.to_columns(df, 'trade_date', 10)  # 只取日期部分 YYYY-MM-DD
+
+        if columns is None:
             logger.warning(f"未找到数据: code={code}, start={start_date}, end={end_date}, period={period}")
             raise ValueError(f"未找到股票 {code} 在 {start_date} 至 {end_date} 的数据")
 
         # 获取股票名称
         stock_service = StockService(self.db)
-        stock_name = stock_service.get_stock_name(code)
-
-        # 转换为Pydantic模型
-        klines = [
-            KLineData(
-                date=str(row['trade_date'])[:10],  # 只取日期部分 YYYY-MM-DD
-                open=float(row['open']),
-                close=float(row['close']),
-                high=float(row['high']),
-                low=float(row['low']),
-                volume=float(row['volume']),
-                amount=float(row['amount'])
-            )
-            for _, row in df.iterrows()
-        ]
+        stock_name = await stock_service.get_stock_name(code)
+
+        count = len(columns['dates'])
+        logger.info(f"成功获取 {count} 条K线数据")
+
+        return {
+            "stock_info": {"code": code, "name": stock_name},
+            "columns": columns,
+            "count": count,
+            "period": period
+        }
+
+    async def _get_columns_by_code(
+        self,
+        codes: list,
+        start_date: str,
+        end_date: str,
+        adj_type: str,
+        period: str
+    ) -> Dict[str, dict]:
+        """
+        获取多只股票的列式K线（有缓存时走分段缓存，否则单次 code IN (...) 查询）
+
+        Args:
+            codes: 股票代码列表
+            start_date: 开始日期 YYYY-MM-DD
+            end_date: 结束日期 YYYY-MM-DD
+            adj_type: 复权类型
+            period: K线周期
+
+        Returns:
+            dict: {code: 列式数据}，无数据的股票不包含在内
+        """
+        # 清理参数（防止SQL注入）
+        codes = [c.replace("'", "").replace(";", "").replace("--", "") for c in codes]
+        start_date = start_date.replace("'", "").replace(";", "").replace("--", "")
+        end_date = end_date.replace("'", "").replace(";", "").replace("--", "")
+
+        if self.cache is not None and settings.KLINE_SEGMENT_CACHE:
+            return await self._get_columns_segmented(codes, start_date, end_date, adj_type, period)
 
-        logger.info(f"成功获取 {len(klines)} 条K线数据")
+        df = await self._query_bars(codes, start_date, end_date, adj_type, period)
+        return {
+            code: self.to_columns(group, 'trade_date', 10)
+            for code, group in df.groupby('code', sort=False)
+        }
 
+    @staticmethod
+    def to_panel(columns_by_code: Dict[str, dict], codes: list = None) -> dict:
+        """
+        将多只股票的列式数据对齐为面板（日期 × 股票）
+
+        Args:
+            columns_by_code: {code: 列式数据}
+            codes: 面板的股票顺序，默认为 columns_by_code 的顺序；无数据的股票整列为 NaN
+
+        Returns:
+            dict: {dates: [...], codes: [...], open: ndarray(n_dates, n_codes), ...}
+        """
+        codes = list(columns_by_code) if codes is None else list(codes)
+        dates = sorted({d for columns in columns_by_code.values() for d in columns['dates']})
+        date_array = np.array(dates, dtype=object)
+
+        panel = {'dates': dates, 'codes': codes}
+        for field in KLINE_FIELDS:
+            panel[field] = np.full((len(dates), len(codes)), np.nan)
+
+        for j, code in enumerate(codes):
+            columns = columns_by_code.get(code)
+            if not columns:
+                continue
+            rows = np.searchsorted(date_array, np.array(columns['dates'], dtype=object))
+            for field in KLINE_FIELDS:
+                panel[field][rows, j] = columns[field]
+
+        return panel
+
+    async def get_kline_panel(
+        self,
+        codes: list,
+        start_date: str,
+        end_date: str,
+        adj_type: str = 'none',
+        period: str = 'day'
+    ) -> dict:
+        """
+        获取多只股票对齐到统一日期轴的K线面板（用于全市场批量计算指标）
+
+        Args:
+            codes: 股票代码列表
+            start_date: 开始日期 YYYY-MM-DD
+            end_date: 结束日期 YYYY-MM-DD
+            adj_type: 复权类型
+            period: K线周期
+
+        Returns:
+            dict: {dates, codes, open/close/high/low/volume/amount: ndarray(n_dates, n_codes)}，
+                  停牌或无数据的位置为 NaN
+        """
+        logger.info(f"获取K线面板: {len(codes)} 只股票, start={start_date}, end={end_date}, adj_type={adj_type}, period={period}")
+        columns_by_code = await self._get_columns_by_code(codes, start_date, end_date, adj_type, period)
+        panel = self.to_panel(columns_by_code, [c for c in codes if c in columns_by_code])
+        logger.info(f"K线面板: {len(panel['dates'])} 个交易日 × {len(panel['codes'])} 只股票")
+        return panel
+
+    async def get_kline_batch(
+        self,
+        codes: list,
+        start_date: str,
+        end_date: str,
+        adj_type: str = 'none',
+        period: str = 'day'
+    ) -> dict:
+        """
+        批量获取多只股票的K线数据（单次 code IN (...) 查询，列式格式）
+
+        Args:
+            codes: 股票代码列表
+            start_date: 开始日期 YYYY-MM-DD
+            end_date: 结束日期 YYYY-MM-DD
+            adj_type: 复权类型
+            period: K线周期 'day'/'week'/'month'/'year'
+
+        Returns:
+            dict: {code: {stock_info, columns, count, period}}，无数据的股票不包含在内
+        """
+        logger.info(f"批量获取K线数据: codes={codes}, start={start_date}, end={end_date}, adj_type={adj_type}, period={period}")
+
+        columns_by_code = await self._get_columns_by_code(codes, start_date, end_date, adj_type, period)
+        if not columns_by_code:
+            logger.warning(f"未找到数据: codes={codes}, start={start_date}, end={end_date}, period={period}")
+            return {}
+
+        # 获取股票名称（单次查询）
+        stock_service = StockService(self.db)
+        names = await stock_service.get_stock_names(list(columns_by_code))
+
+        result = {}
+        for code, columns in columns_by_code.items():
+            result[code] = {
+                "stock_info": {"code": code, "name": names.get(code, code)},
+                "columns": columns,
+                "count": len(columns['dates']),
+                "period": period
+            }
+
+        total = sum(item['count'] for item in result.values())
+        logger.info(f"成功批量获取 {len(result)} 只股票共 {total} 条K线数据")
+        return result
+
+    async def get_kline(
+        self,
+        code: str,
+        start_date: str,
+        end_date: str,
+        adj_type: str = 'none',
+        period: str = 'day'
+    ) -> KLineResponse:
+        """
+        获取K线数据（通用周期，逐行格式）
+
+        Args:
+            code: 股票代码
+            start_date: 开始日期 YYYY-MM-DD
+            end_date: 结束日期 YYYY-MM-DD
+            adj_type: 复权类型
+            period: K线周期 'day'/'week'/'month'/'year'
+
+        Returns:
+            KLineResponse: K线数据
+        """
+        data = await self.get_kline_columns(code, start_date, end_date, adj_type, period)
         return KLineResponse(
-            stock_info=StockBasicInfo(code=code, name=stock_name),
-            klines=klines,
-            count=len(klines),
-            period=period
+            stock_info=StockBasicInfo(**data['stock_info']),
+            klines=[KLineData(**row) for row in self.to_rows(data['columns'])],
+            count=data['count'],
+            period=data['period']
         )
 
-    def get_daily_kline(
+    async def get_daily_kline(
         self,
         code: str,
         start_date: str,
@@ -164,17 +915,17 @@ class KLineService:
         Returns:
             KLineResponse: K线数据
         """
-        return self.get_kline(code, start_date, end_date, adj_type, period='day')
+        return await self.get_kline(code, start_date, end_date, adj_type, period='day')
 
-    def get_minute_kline(
+    async def get_minute_kline_columns(
         self,
         code: str,
         trade_date: str,
         interval: int = 1,
         adj_type: str = 'none'
-    ) -> KLineResponse:
+    ) -> dict:
         """
-        获取分钟级K线数据
+        获取分钟级K线数据（列式格式）
 
         Args:
             code: 股票代码
@@ -183,7 +934,7 @@ class KLineService:
             adj_type: 复权类型
 
         Returns:
-            KLineResponse: K线数据
+            dict: {stock_info, columns, count, period}
         """
         logger.info(f"获取分钟K线: code={code}, date={trade_date}, interval={interval}, adj_type={adj_type}")
 
@@ -245,7 +996,7 @@ class KLineService:
             """
 
         logger.debug(f"执行查询: {query[:200]}...")
-        df = self.db.query_df(query)
+        df = await self.db.query_df_async(query)
 
         if df.empty:
             logger.warning(f"未找到数据: code={code}, date={trade_date}, interval={interval}")
@@ -253,27 +1004,42 @@ class KLineService:
 
         # 获取股票名称
         stock_service = StockService(self.db)
-        stock_name = stock_service.get_stock_name(code)
-
-        # 转换为Pydantic模型
-        klines = [
-            KLineData(
-                date=str(row['dt']),  # 分钟K线保留完整时间
-                open=float(row['open']),
-                close=float(row['close']),
-                high=float(row['high']),
-                low=float(row['low']),
-                volume=float(row['volume']),
-                amount=float(row['amount'])
-            )
-            for _, row in df.iterrows()
-        ]
+        stock_name = await stock_service.get_stock_name(code)
+
+        columns = self.to_columns(df, 'dt')  # 分钟K线保留完整时间
 
-        logger.info(f"成功获取 {len(klines)} 条分钟K线数据")
+        logger.info(f"成功获取 {len(df)} 条分钟K线数据")
 
+        return {
+            "stock_info": {"code": code, "name": stock_name},
+            "columns": columns,
+            "count": len(df),
+            "period": f"{interval}min"
+        }
+
+    async def get_minute_kline(
+        self,
+        code: str,
+        trade_date: str,
+        interval: int = 1,
+        adj_type: str = 'none'
+    ) -> KLineResponse:
+        """
+        获取分钟级K线数据（逐行格式）
+
+        Args:
+            code: 股票代码
+            trade_date: 交易日期 YYYY-MM-DD
+            interval: 分钟间隔 1/5/15/30/60
+            adj_type: 复权类型
+
+        Returns:
+            KLineResponse: K线数据
+        """
+        data = await self.get_minute_kline_columns(code, trade_date, interval, adj_type)
         return KLineResponse(
-            stock_info=StockBasicInfo(code=code, name=stock_name),
-            klines=klines,
-            count=len(klines),
-            period=f"{interval}min"
+            stock_info=StockBasicInfo(**data['stock_info']),
+            klines=[KLineData(**row) for row in self.to_rows(data['columns'])],
+            count=data['count'],
+            period=data['period']
         )
@@ -0,0 +1,192 @@
+"""股票目录（进程内缓存的股票基础信息）"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.services.stock_search import StockSearchIndex
+
+logger = get_logger(__name__)
+
+
+class StockDirectory:
+    """
+    股票目录（单例）
+
+    启动时从 stock.stock_info 一次性加载全部股票的代码、名称和记录数，
+    日线聚合表回填完整后从中补充每只股票的数据日期范围，之后在后台按固定间隔刷新。
+    股票名称、搜索（见 StockSearchIndex）和日期范围查询直接读内存，不再访问ClickHouse。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._stocks = {}
+            cls._instance._index = StockSearchIndex({})
+            cls._instance._loaded_at = None
+            cls._instance._refresh_task = None
+        return cls._instance
+
+    @property
+    def loaded(self) -> bool:
+        """目录是否已加载"""
+        return self._loaded_at is not None
+
+    async def load(self, db):
+        """
+        从数据库加载股票目录（整体替换，读操作无需加锁）
+
+        Args:
+            db: ClickHouse客户端
+        """
+        started = time.monotonic()
+        df = await db.query_df_async("""
+            SELECT code, name, records
+            FROM stock.stock_info
+            ORDER BY code
+        """)
+
+        stocks: Dict[str, dict] = {
+            code: {
+                "code": code,
+                "name": name,
+                "records": int(records),
+                "start_date": None,
+                "end_date": None
+            }
+            for code, name, records in zip(
+                df['code'].tolist(), df['name'].tolist(), df['records'].tolist()
+            )
+        }
+
+        # 日期范围从日线聚合表汇总（每只股票一行，开销很小）；
+        # 日线表尚未回填完整时不使用，由 StockService 按需查询分钟表
+        if settings.CH_USE_DAILY_TABLE and await self._daily_table_complete(db):
+            try:
+                result = await db.query_async("""
+                    SELECT code, min(trade_date), max(trade_date)
+                    FROM stock.daily_kline
+                    GROUP BY code
+                """)
+                for code, start_date, end_date in result.result_rows:
+                    if code in stocks:
+                        stocks[code]["start_date"] = str(start_date)
+                        stocks[code]["end_date"] = str(end_date)
+            except Exception as e:
+                logger.warning(f"加载股票日期范围失败，将按需查询: {e}")
+
+        # 拼音转换较慢，在线程中构建索引以免阻塞事件循环
+        index = await asyncio.to_thread(StockSearchIndex, stocks)
+
+        self._stocks = stocks
+        self._index = index
+        self._loaded_at = time.time()
+        logger.info(f"股票目录加载完成: {len(stocks)} 只股票, 耗时={time.monotonic() - started:.3f}s")
+
+    @staticmethod
+    async def _daily_table_complete(db) -> bool:
+        """
+        日线聚合表是否已覆盖分钟表的全部数据范围
+
+        物化视图只处理创建之后写入的分钟数据，历史部分由 --rollup 逐年回填。
+        按年比较两张表数据分片的日期范围（system.parts 元数据，不扫描数据）：
+        分钟表有数据的每一年，日线表都要有该年数据，且最早/最晚日期不晚于/不早于分钟表。
+
+        Args:
+            db: ClickHouse客户端
+
+        Returns:
+            bool: 已覆盖返回 True；未覆盖或查询失败返回 False
+        """
+        try:
+            minute = await db.query_async("""
+                SELECT toYear(toDate(min_time)) AS y, toDate(min(min_time)), toDate(max(max_time))
+                FROM system.parts
+                WHERE database = 'stock' AND table = 'minute_kline' AND active
+                GROUP BY y
+            """)
+            daily = await db.query_async("""
+                SELECT toYear(min_date) AS y, min(min_date), max(max_date)
+                FROM system.parts
+                WHERE database = 'stock' AND table = 'daily_kline' AND active
+                GROUP BY y
+            """)
+        except Exception as e:
+            logger.warning(f"检查日线聚合表覆盖范围失败: {e}")
+            return False
+
+        daily_years = {y: (start, end) for y, start, end in daily.result_rows}
+        for y, start, end in minute.result_rows:
+            covered = daily_years.get(y)
+            if covered is None or covered[0] > start or covered[1] < end:
+                logger.info(f"日线聚合表尚未覆盖 {y} 年的分钟数据，股票日期范围改为按需查询分钟表")
+                return False
+        return True
+
+    async def _refresh_loop(self, db):
+        """后台定期刷新"""
+        while True:
+            await asyncio.sleep(settings.STOCK_DIRECTORY_REFRESH_SECONDS)
+            try:
+                await self.load(db)
+            except Exception as e:
+                logger.error(f"股票目录刷新失败: {e}")
+
+    async def start(self, db):
+        """
+        加载目录并启动后台刷新任务（首次加载失败时仍启动刷新任务，稍后重试）
+
+        Args:
+            db: ClickHouse客户端
+        """
+        try:
+            await self.load(db)
+        finally:
+            if self._refresh_task is None:
+                self._refresh_task = asyncio.create_task(self._refresh_loop(db))
+
+    async def stop(self):
+        """停止后台刷新任务"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def get(self, code: str) -> Optional[dict]:
+        """获取单只股票信息"""
+        return self._stocks.get(code)
+
+    def get_name(self, code: str) -> Optional[str]:
+        """获取股票名称，未找到返回 None"""
+        stock = self._stocks.get(code)
+        return stock["name"] if stock else None
+
+    def search(self, keyword: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """
+        搜索股票（代码前缀、名称子串、拼音首字母，按相关度排序）
+
+        Args:
+            keyword: 搜索关键词
+            limit: 返回数量限制
+
+        Returns:
+            list: 股票信息列表
+        """
+        return self._index.search(keyword, limit)
+
+    def status(self) -> dict:
+        """目录状态"""
+        return {
+            "loaded": self.loaded,
+            "stocks": len(self._stocks),
+            "loaded_at": self._loaded_at
+        }
+
+
+# 全局单例
+stock_directory = StockDirectory()
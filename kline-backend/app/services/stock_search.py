@@ -0,0 +1,148 @@
+"""股票搜索索引（内存）"""
+import bisect
+import itertools
+from typing import Dict, List, Optional
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from pypinyin import pinyin, Style
+except ImportError:  # 未安装 pypinyin 时不支持拼音首字母搜索
+    pinyin = None
+    logger.warning("未安装 pypinyin，股票搜索不支持拼音首字母匹配")
+
+# 多音字展开的组合上限（如“长”= c/z），避免组合爆炸
+MAX_INITIALS_VARIANTS = 8
+
+# 匹配类型得分（越小越靠前）
+RANK_CODE_EXACT = 0
+RANK_CODE_PREFIX = 1
+RANK_NAME_PREFIX = 2
+RANK_INITIALS_PREFIX = 3
+RANK_NAME_SUBSTRING = 4
+RANK_CODE_SUBSTRING = 5
+
+
+def name_initials(name: str) -> List[str]:
+    """
+    计算股票名称的拼音首字母（多音字展开为多个候选）
+
+    Args:
+        name: 股票名称，如 '浦发银行'、'*ST长油'
+
+    Returns:
+        list: 小写首字母串，如 ['pfyh']；'*ST长油' → ['stzy', 'stcy']
+    """
+    if pinyin is None:
+        return []
+
+    parts = []
+    for candidates in pinyin(name, style=Style.FIRST_LETTER, heteronym=True):
+        # 非汉字片段（如 '*ST'、'A'）原样保留字母数字
+        cleaned = list(dict.fromkeys(
+            ''.join(ch for ch in c.lower() if ch.isalnum()) for c in candidates
+        ))
+        parts.append(cleaned or [''])
+
+    variants = itertools.islice(itertools.product(*parts), MAX_INITIALS_VARIANTS)
+    return list(dict.fromkeys(''.join(v) for v in variants))
+
+
+class StockSearchIndex:
+    """
+    股票搜索索引
+
+    - 代码：有序列表 + 二分查找做前缀匹配
+    - 名称：单字/双字 n-gram 倒排索引做子串匹配（中文名称通常只有2~4个字）
+    - 拼音首字母：有序列表 + 二分查找做前缀匹配
+    结果按匹配类型排序，同类型按代码排序。
+    """
+
+    def __init__(self, stocks: Dict[str, dict]):
+        """
+        Args:
+            stocks: {code: {code, name, records, ...}}
+        """
+        self._stocks = stocks
+        self._codes = sorted(stocks)
+        self._grams: Dict[str, set] = {}
+        initials = []
+
+        for code, stock in stocks.items():
+            name = stock["name"]
+            for n in (1, 2):
+                for i in range(len(name) - n + 1):
+                    self._grams.setdefault(name[i:i + n], set()).add(code)
+            for ini in name_initials(name):
+                initials.append((ini, code))
+
+        initials.sort()
+        self._initials = [ini for ini, _ in initials]
+        self._initials_codes = [code for _, code in initials]
+
+    @staticmethod
+    def _prefix_range(keys: list, prefix: str) -> tuple:
+        """有序列表中以 prefix 开头的元素下标区间 [lo, hi)"""
+        lo = bisect.bisect_left(keys, prefix)
+        hi = bisect.bisect_left(keys, prefix + '\uffff')
+        return lo, hi
+
+    def _name_candidates(self, keyword: str) -> set:
+        """名称包含 keyword 的候选代码（n-gram 取交集后再校验子串）"""
+        if len(keyword) == 1:
+            return set(self._grams.get(keyword, ()))
+
+        candidates = None
+        for i in range(len(keyword) - 1):
+            posting = self._grams.get(keyword[i:i + 2])
+            if not posting:
+                return set()
+            candidates = set(posting) if candidates is None else candidates & posting
+            if not candidates:
+                return set()
+        return {c for c in candidates if keyword in self._stocks[c]["name"]}
+
+    def search(self, keyword: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """
+        搜索股票
+
+        Args:
+            keyword: 关键词（代码、名称片段或拼音首字母）
+            limit: 返回数量限制
+
+        Returns:
+            list: 按相关度排序的股票信息列表
+        """
+        keyword = keyword.strip() if keyword else ''
+        if not keyword:
+            return [self._stocks[c] for c in self._codes[:limit]]
+
+        code_kw = keyword.upper()
+        ranks: Dict[str, int] = {}
+
+        def hit(code: str, rank: int):
+            if rank < ranks.get(code, RANK_CODE_SUBSTRING + 1):
+                ranks[code] = rank
+
+        lo, hi = self._prefix_range(self._codes, code_kw)
+        for code in self._codes[lo:hi]:
+            hit(code, RANK_CODE_EXACT if code == code_kw else RANK_CODE_PREFIX)
+
+        for code in self._name_candidates(keyword):
+            rank = RANK_NAME_PREFIX if self._stocks[code]["name"].startswith(keyword) else RANK_NAME_SUBSTRING
+            hit(code, rank)
+
+        if keyword.isascii() and keyword.isalpha():
+            lo, hi = self._prefix_range(self._initials, keyword.lower())
+            for code in self._initials_codes[lo:hi]:
+                hit(code, RANK_INITIALS_PREFIX)
+
+        # 结果不足时再补充代码子串匹配（兼容原 LIKE '%kw%' 语义，如 '0001'、'.SH'）
+        if len(ranks) < limit:
+            for code in self._codes:
+                if code_kw in code:
+                    hit(code, RANK_CODE_SUBSTRING)
+
+        ordered = sorted(ranks, key=lambda c: (ranks[c], c))
+        return [self._stocks[c] for c in ordered[:limit]]
@@ -2,6 +2,7 @@
 from typing import Optional
 from app.db.clickhouse import ClickHouseClient
 from app.schemas.stock import StockListResponse, StockInfo
+from app.services.stock_directory import stock_directory
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -13,9 +14,9 @@ class StockService:
     def __init__(self, db: ClickHouseClient):
         self.db = db
 
-    def search_stocks(self, keyword: Optional[str] = None, limit: int = 50) -> StockListResponse:
+    async def search_stocks(self, keyword: Optional[str] = None, limit: int = 50) -> StockListResponse:
         """
-        搜索股票列表（从 stock_info 表查询，性能优化）
+        搜索股票列表（优先读内存股票目录，未加载时查询 stock_info 表）
 
         Args:
             keyword: 搜索关键词（股票代码或名称）
@@ -26,6 +27,13 @@ class StockService:
         """
         logger.info(f"搜索股票: keyword={keyword}, limit={limit}")
 
+        if stock_directory.loaded:
+            items = [
+                StockInfo(code=s['code'], name=s['name'], records=s['records'])
+                for s in stock_directory.search(keyword, limit)
+            ]
+            return StockListResponse(items=items, total=len(items))
+
         # 清理和验证关键词（防止SQL注入）
         if keyword:
             # 移除潜在的危险字符
@@ -55,7 +63,7 @@ class StockService:
             """
 
         logger.debug(f"执行查询: {query}")
-        df = self.db.query_df(query)
+        df = await self.db.query_df_async(query)
         logger.info(f"查询到 {len(df)} 条股票记录")
 
         items = [
@@ -69,7 +77,7 @@ class StockService:
 
         return StockListResponse(items=items, total=len(items))
 
-    def get_stock_name(self, code: str) -> str:
+    async def get_stock_name(self, code: str) -> str:
         """
         获取股票名称
 
@@ -79,6 +87,10 @@ class StockService:
         Returns:
             str: 股票名称
         """
+        name = stock_directory.get_name(code)
+        if name is not None:
+            return name
+
         # 清理股票代码（防止SQL注入）
         code = code.replace("'", "").replace(";", "").replace("--", "")
 
@@ -89,7 +101,7 @@ class StockService:
             LIMIT 1
         """
         logger.debug(f"查询股票名称: code={code}")
-        result = self.db.query(query)
+        result = await self.db.query_async(query)
         if result.result_rows:
             name = result.result_rows[0][0]
             logger.debug(f"找到股票名称: {name}")
@@ -97,7 +109,36 @@ class StockService:
         logger.warning(f"未找到股票名称: code={code}")
         return code
 
-    def get_stock_date_range(self, code: str) -> dict:
+    async def get_stock_names(self, codes: list) -> dict:
+        """
+        批量获取股票名称
+
+        Args:
+            codes: 股票代码列表
+
+        Returns:
+            dict: {code: name}，未找到的代码不包含在内
+        """
+        if not codes:
+            return {}
+
+        if stock_directory.loaded:
+            return {c: stock_directory.get_name(c) for c in codes if stock_directory.get(c)}
+
+        # 清理股票代码（防止SQL注入）
+        codes = [c.replace("'", "").replace(";", "").replace("--", "") for c in codes]
+        code_list = ", ".join(f"'{c}'" for c in codes)
+
+        query = f"""
+            SELECT code, name
+            FROM stock.stock_info
+            WHERE code IN ({code_list})
+        """
+        logger.debug(f"批量查询股票名称: codes={codes}")
+        result = await self.db.query_async(query)
+        return {row[0]: row[1] for row in result.result_rows}
+
+    async def get_stock_date_range(self, code: str) -> dict:
         """
         获取股票的数据时间范围
 
@@ -107,6 +148,13 @@ class StockService:
         Returns:
             dict: {'start_date': '2020-01-01', 'end_date': '2024-12-31'}
         """
+        stock = stock_directory.get(code)
+        if stock and stock['start_date']:
+            return {
+                "start_date": stock['start_date'],
+                "end_date": stock['end_date']
+            }
+
         # 清理股票代码（防止SQL注入）
         code = code.replace("'", "").replace(";", "").replace("--", "")
 
@@ -118,7 +166,7 @@ class StockService:
             WHERE code = '{code}'
         """
         logger.debug(f"查询股票日期范围: code={code}")
-        result = self.db.query(query)
+        result = await self.db.query_async(query)
         if result.result_rows and result.result_rows[0][0]:
             start_date = str(result.result_rows[0][0])
             end_date = str(result.result_rows[0][1])
@@ -0,0 +1,149 @@
+"""技术指标内核与 pandas 参考实现（IndicatorService.calculate_*）的一致性测试"""
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import indicator_kernels
+from app.services.indicator_kernels import compute_indicators, compute_panel
+from app.services.indicator_service import IndicatorService
+
+SPECS = {
+    'ma': {'periods': [5, 10, 20, 60]},
+    'macd': {'fast': 12, 'slow': 26, 'signal': 9},
+    'kdj': {'n': 9, 'm1': 3, 'm2': 3},
+    'rsi': {'periods': [6, 12, 24]},
+    'boll': {'n': 20, 'k': 2}
+}
+
+CUSTOM_SPECS = {
+    'ma': {'periods': [3, 7]},
+    'macd': {'fast': 5, 'slow': 35, 'signal': 5},
+    'kdj': {'n': 14, 'm1': 5, 'm2': 2},
+    'rsi': {'periods': [9]},
+    'boll': {'n': 26, 'k': 2.5}
+}
+
+
+def _bars(n: int, seed: int = 0) -> pd.DataFrame:
+    """随机游走K线（high >= close >= low）"""
+    rng = np.random.default_rng(seed)
+    close = 10 + np.cumsum(rng.normal(0, 0.05, n))
+    high = close + np.abs(rng.normal(0, 0.1, n))
+    low = close - np.abs(rng.normal(0, 0.1, n))
+    return pd.DataFrame({'close': close, 'high': high, 'low': low})
+
+
+def _with_flat_run(df: pd.DataFrame, start: int, length: int) -> pd.DataFrame:
+    """一段价格完全不变的K线（一字板/停牌复牌），RSV 分母与 RSI 损失均为 0"""
+    df = df.copy()
+    price = df['close'].iloc[start]
+    df.iloc[start:start + length] = price
+    return df
+
+
+def _with_nan_gap(df: pd.DataFrame, start: int, length: int) -> pd.DataFrame:
+    """一段缺失数据（NaN）"""
+    df = df.copy()
+    df.iloc[start:start + length] = np.nan
+    return df
+
+
+def _reference(df: pd.DataFrame, specs: dict) -> dict:
+    """pandas 参考结果"""
+    ref = {}
+    if 'ma' in specs:
+        ref['ma'] = IndicatorService.calculate_ma(df, **specs['ma'])
+    if 'macd' in specs:
+        ref['macd'] = IndicatorService.calculate_macd(df, **specs['macd'])
+    if 'kdj' in specs:
+        ref['kdj'] = IndicatorService.calculate_kdj(df, **specs['kdj'])
+    if 'rsi' in specs:
+        ref['rsi'] = IndicatorService.calculate_rsi(df, **specs['rsi'])
+    if 'boll' in specs:
+        ref['boll'] = IndicatorService.calculate_boll(df, **specs['boll'])
+    return ref
+
+
+def _assert_same(result: dict, reference: dict, column: int = None):
+    """逐指标逐输出列比较（NaN 位置一致，数值四舍五入后相等）"""
+    assert set(result) == set(reference)
+    for name, outputs in reference.items():
+        assert set(result[name]) == set(outputs), name
+        for key, expected in outputs.items():
+            got = result[name][key]
+            if column is not None:
+                got = got[:, column]
+            np.testing.assert_array_equal(got, expected, err_msg=f"{name}.{key}")
+
+
+CASES = {
+    'long': _bars(3000, seed=1),
+    'flat_run': _with_flat_run(_bars(500, seed=2), 100, 40),
+    'nan_gap': _with_nan_gap(_bars(500, seed=3), 200, 15),
+    'leading_nan': _with_nan_gap(_bars(300, seed=4), 0, 30),
+    'shorter_than_window': _bars(15, seed=5),
+    'single_bar': _bars(1, seed=6),
+    'empty': _bars(0)
+}
+
+
+@pytest.fixture(params=['numba', 'numpy'])
+def backend(request, monkeypatch):
+    """分别测试 numba 内核与 NumPy 回退实现"""
+    if request.param == 'numba':
+        if indicator_kernels.njit is None:
+            pytest.skip("未安装 numba")
+    else:
+        monkeypatch.setattr(indicator_kernels, 'njit', None)
+    return request.param
+
+
+@pytest.mark.parametrize('specs', [SPECS, CUSTOM_SPECS], ids=['default', 'custom'])
+@pytest.mark.parametrize('case', list(CASES))
+def test_compute_indicators_matches_pandas(backend, case, specs):
+    df = CASES[case]
+    result = compute_indicators(df['close'], df['high'], df['low'], specs)
+    _assert_same(result, _reference(df, specs))
+
+
+@pytest.mark.parametrize('name', list(SPECS))
+def test_compute_indicators_single_indicator(backend, name):
+    df = CASES['nan_gap']
+    specs = {name: SPECS[name]}
+    result = compute_indicators(df['close'], df['high'], df['low'], specs)
+    _assert_same(result, _reference(df, specs))
+
+
+@pytest.mark.parametrize('specs', [SPECS, CUSTOM_SPECS], ids=['default', 'custom'])
+def test_compute_panel_matches_pandas(backend, specs):
+    # 各列长度相同，分别包含：完整序列、中途停牌、上市较晚、价格不变、全部缺失
+    n = 400
+    columns = [
+        _bars(n, seed=10),
+        _with_nan_gap(_bars(n, seed=11), 150, 20),
+        _with_nan_gap(_bars(n, seed=12), 0, 330),
+        _with_flat_run(_bars(n, seed=13), 50, 60),
+        _with_nan_gap(_bars(n, seed=14), 0, n)
+    ]
+    panel = {
+        field: np.column_stack([df[field].to_numpy() for df in columns])
+        for field in ('close', 'high', 'low')
+    }
+
+    result = compute_panel(panel['close'], panel['high'], panel['low'], specs)
+
+    for j, df in enumerate(columns):
+        _assert_same(result, _reference(df, specs), column=j)
+        for outputs in result.values():
+            for values in outputs.values():
+                assert values.shape == (n, len(columns))
+
+
+def test_compute_panel_matches_single_series(backend):
+    df = CASES['nan_gap']
+    single = compute_indicators(df['close'], df['high'], df['low'], SPECS)
+    panel = compute_panel(
+        df[['close']].to_numpy(), df[['high']].to_numpy(), df[['low']].to_numpy(), SPECS
+    )
+    for name, outputs in single.items():
+        for key, values in outputs.items():
+            np.testing.assert_array_equal(panel[name][key][:, 0], values, err_msg=f"{name}.{key}")
@@ -3,8 +3,11 @@
  */
 import apiClient from './client';
 import type {
+  BacktestJob,
+  BacktestJobResponse,
   BacktestRequest,
   BacktestResponse,
+  DailyPositionPageResponse,
   StrategyListResponse
 } from '../types/backtest';
 
@@ -18,10 +21,71 @@ export const backtestApi = {
   },
 
   /**
-   * 执行回测
+   * 提交回测任务（立即返回任务ID）
    */
-  async runBacktest(request: BacktestRequest): Promise<BacktestResponse> {
-    const response = await apiClient.post<BacktestResponse>('/backtest/run', request);
+  async submitBacktest(request: BacktestRequest): Promise<BacktestJob> {
+    const response = await apiClient.post<BacktestJobResponse>('/backtest/run', request);
+    return response.data.data;
+  },
+
+  /**
+   * 订阅回测任务进度（SSE），任务结束时返回最终状态
+   */
+  watchJob(jobId: string, onProgress?: (job: BacktestJob) => void): Promise<BacktestJob> {
+    return new Promise((resolve, reject) => {
+      const source = new EventSource(`${apiClient.defaults.baseURL}/backtest/jobs/${jobId}/events`);
+      source.addEventListener('progress', (event) => {
+        const job: BacktestJob = JSON.parse((event as MessageEvent).data);
+        onProgress?.(job);
+        if (job.status === 'succeeded' || job.status === 'failed') {
+          source.close();
+          resolve(job);
+        }
+      });
+      source.onerror = () => {
+        source.close();
+        reject(new Error('回测进度连接中断'));
+      };
+    });
+  },
+
+  /**
+   * 获取回测结果
+   */
+  async getBacktestResult(jobId: string): Promise<BacktestResponse> {
+    const response = await apiClient.get<BacktestResponse>(`/backtest/jobs/${jobId}/result`);
+    return response.data;
+  },
+
+  /**
+   * 按结果ID打开已保存的回测结果（分享链接）
+   */
+  async getStoredResult(resultId: string): Promise<BacktestResponse> {
+    const response = await apiClient.get<BacktestResponse>(`/backtest/results/${resultId}`);
     return response.data;
+  },
+
+  /**
+   * 分页获取每日持仓明细
+   */
+  async getDailyPositions(resultId: string, offset = 0, limit = 250): Promise<DailyPositionPageResponse> {
+    const response = await apiClient.get<DailyPositionPageResponse>(
+      `/backtest/results/${resultId}/positions`,
+      { params: { offset, limit } }
+    );
+    return response.data;
+  },
+
+  /**
+   * 执行回测：提交任务、等待完成并获取结果
+   */
+  async runBacktest(
+    request: BacktestRequest,
+    onProgress?: (job: BacktestJob) => void
+  ): Promise<BacktestResponse> {
+    const job = await this.submitBacktest(request);
+    await this.watchJob(job.job_id, onProgress);
+    // 任务失败时结果接口返回对应的错误信息
+    return this.getBacktestResult(job.job_id);
   }
 };
@@ -5,12 +5,12 @@ export interface CompareData {
     code: string;
     name: string;
     dates: string[];
-    values: number[];
+    values: (number | null)[];  // 对齐到统一日期轴，无数据的日期为 null
   }>;
   dates: string[];
   series: Array<{
     name: string;
-    data: number[];
+    data: (number | null)[];
   }>;
 }
 
@@ -20,7 +20,23 @@ export interface CompareResponse {
   data: CompareData;
 }
 
+export interface CompareConfigResponse {
+  code: number;
+  message: string;
+  data: {
+    max_codes: number;  // 一次最多对比的股票数量（后端 COMPARE_MAX_CODES）
+  };
+}
+
 export const compareApi = {
+  /**
+   * 获取对比配置
+   */
+  async getCompareConfig(): Promise<CompareConfigResponse> {
+    const response = await apiClient.get<CompareConfigResponse>('/compare/config');
+    return response.data;
+  },
+
   /**
    * 获取多股票对比数据
    */
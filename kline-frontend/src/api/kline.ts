@@ -1,10 +1,32 @@
 import axios, { type CancelTokenSource } from 'axios';
 import apiClient from './client';
-import type { KLineResponse } from '../types/kline';
+import type { KLine, KLineColumns, KLineColumnsResponse, KLineResponse } from '../types/kline';
 
 // 存储当前的取消令牌
 let cancelTokenSource: CancelTokenSource | null = null;
 
+/**
+ * 将列式K线数据还原为逐行格式
+ */
+const columnsToKLines = (columns: KLineColumns): KLine[] =>
+  columns.dates.map((date, i) => ({
+    date,
+    open: columns.open[i],
+    close: columns.close[i],
+    high: columns.high[i],
+    low: columns.low[i],
+    volume: columns.volume[i],
+    amount: columns.amount[i],
+  }));
+
+/**
+ * 将列式响应转换为组件使用的逐行响应
+ */
+const toKLineResponse = ({ code, message, data }: KLineColumnsResponse): KLineResponse => {
+  const { columns, ...rest } = data;
+  return { code, message, data: { ...rest, klines: columnsToKLines(columns) } };
+};
+
 export const klineApi = {
   /**
    * 获取K线数据
@@ -34,15 +56,16 @@ export const klineApi = {
     };
 
     if (indicators.length > 0) {
-      params.indicators = indicators.join(',');
+      // 每项为指标名或带参数的指标，如 'ma:5,30,120'、'boll:26,2.5'
+      params.indicators = indicators.join(';');
     }
 
-    const response = await apiClient.get<KLineResponse>('/kline/data', {
+    const response = await apiClient.get<KLineColumnsResponse>('/kline/data', {
       params,
       cancelToken: cancelTokenSource.token,
     });
 
-    return response.data;
+    return toKLineResponse(response.data);
   },
 
   /**
@@ -62,7 +85,7 @@ export const klineApi = {
     // 创建新的取消令牌
     cancelTokenSource = axios.CancelToken.source();
 
-    const response = await apiClient.get<KLineResponse>('/kline/minute', {
+    const response = await apiClient.get<KLineColumnsResponse>('/kline/minute', {
       params: {
         code,
         trade_date: tradeDate,
@@ -72,6 +95,6 @@ export const klineApi = {
       cancelToken: cancelTokenSource.token,
     });
 
-    return response.data;
+    return toKLineResponse(response.data);
   },
 };
@@ -25,7 +25,7 @@ export const BacktestResult: React.FC<BacktestResultProps> = ({ result }) => {
     );
   }
 
-  const { metrics, equity_curve, trades, stock_name, strategy_name, buy_hold_curve } = result;
+  const { metrics, series, trades, stock_name, strategy_name } = result;
 
   // 资金曲线图表配置
   const equityChartOption = {
@@ -57,7 +57,7 @@ export const BacktestResult: React.FC<BacktestResultProps> = ({ result }) => {
     },
     xAxis: {
       type: 'category',
-      data: equity_curve.map(p => p.date),
+      data: series.dates,
       boundaryGap: false
     },
     yAxis: {
@@ -70,7 +70,7 @@ export const BacktestResult: React.FC<BacktestResultProps> = ({ result }) => {
       {
         name: '策略收益',
         type: 'line',
-        data: equity_curve.map(p => p.value),
+        data: series.equity,
         smooth: true,
         symbol: 'none',
         lineStyle: {
@@ -103,10 +103,10 @@ export const BacktestResult: React.FC<BacktestResultProps> = ({ result }) => {
               }
         }
       },
-      ...(buy_hold_curve ? [{
+      ...(series.benchmark.length ? [{
         name: '买入持有',
         type: 'line',
-        data: buy_hold_curve.map(p => p.value),
+        data: series.benchmark,
         smooth: true,
         symbol: 'none',
         lineStyle: {
@@ -6,7 +6,7 @@ import { logger } from '../../store/useLogStore';
 
 export interface CompareDataItem {
   date: string;
-  value: number;
+  value: number | null;  // 该日无数据（未上市、停牌）时为 null
 }
 
 export interface CompareSeriesData {
@@ -49,7 +49,7 @@ export const CompareChart: React.FC<CompareChartProps> = memo(({
     if (series.length > 0 && series.some(s => s.data.length > 0)) {
       logger.info(`对比图表: 渲染图表 - ${series.length} 条曲线`);
 
-      // 提取所有日期（使用第一个序列的日期作为基准）
+      // 提取所有日期（各序列已对齐到同一日期轴，使用第一个序列的日期）
       const dates = series[0]?.data.map(item => item.date) || [];
 
       // 构建ECharts series配置
@@ -84,6 +84,7 @@ export const CompareChart: React.FC<CompareChartProps> = memo(({
             let result = `<div style="font-weight: bold; margin-bottom: 8px;">${date}</div>`;
             params.forEach((param: any) => {
               const value = param.value;
+              if (value === null || value === undefined) return;
               const formattedValue = mode === 'change'
                 ? `${value >= 0 ? '+' : ''}${value.toFixed(2)}%`
                 : value.toFixed(2);
@@ -207,7 +208,7 @@ export const CompareChart: React.FC<CompareChartProps> = memo(({
     prevProps.series.length === nextProps.series.length &&
     prevProps.series.every((s, i) =>
       s.code === nextProps.series[i]?.code &&
-      s.data.length === nextProps.series[i]?.data.length
+      s.data === nextProps.series[i]?.data
     )
   );
 });
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { message, DatePicker, Radio, Space } from 'antd';
 import dayjs, { Dayjs } from 'dayjs';
 import { MultiStockSelector } from '../../components/MultiStockSelector';
@@ -6,7 +6,7 @@ import { PeriodSelector } from '../../components/PeriodSelector';
 import { CompareChart } from '../../components/CompareChart';
 import type { CompareSeriesData, CompareDataItem } from '../../components/CompareChart';
 import { LogPanel } from '../../components/LogPanel';
-import { klineApi } from '../../api/kline';
+import { compareApi } from '../../api/compare';
 import type { Stock } from '../../types/stock';
 import { logger } from '../../store/useLogStore';
 import './index.css';
@@ -15,6 +15,9 @@ const { RangePicker } = DatePicker;
 
 type CompareMode = 'change' | 'price';
 
+// 后端 COMPARE_MAX_CODES 的默认值，配置接口不可用时使用
+const DEFAULT_MAX_CODES = 50;
+
 export const ComparePage: React.FC = () => {
   const [selectedCodes, setSelectedCodes] = useState<string[]>([]);
   const [selectedStocks, setSelectedStocks] = useState<Stock[]>([]);
@@ -26,6 +29,21 @@ export const ComparePage: React.FC = () => {
   const [compareMode, setCompareMode] = useState<CompareMode>('change');
   const [loading, setLoading] = useState(false);
   const [chartSeries, setChartSeries] = useState<CompareSeriesData[]>([]);
+  const [maxCodes, setMaxCodes] = useState<number>(DEFAULT_MAX_CODES);
+
+  useEffect(() => {
+    const loadConfig = async () => {
+      try {
+        const response = await compareApi.getCompareConfig();
+        setMaxCodes(response.data.max_codes);
+        logger.info(`对比页面: 最多可选择 ${response.data.max_codes} 只股票`);
+      } catch (error) {
+        logger.warning('对比页面: 加载对比配置失败，使用默认股票数量上限', error);
+      }
+    };
+
+    loadConfig();
+  }, []);
 
   const handleStockChange = (codes: string[], stocks: Stock[]) => {
     logger.info(`对比页面: 股票已选择 - ${codes.length} 只`, codes);
@@ -69,54 +87,34 @@ export const ComparePage: React.FC = () => {
 
     setLoading(true);
     try {
-      // 并行查询所有股票的数据
-      const promises = codesToUse.map((code) =>
-        klineApi.getKLineData(code, startDate, endDate, 'none', periodToUse)
+      // 一次请求获取所有股票的数据（后端对齐到交易日期并集，无数据的日期为 null）
+      logger.info('对比页面: 调用对比API获取多股数据...');
+      const response = await compareApi.getCompareData(
+        codesToUse,
+        startDate,
+        endDate,
+        periodToUse,
+        modeToUse === 'change' ? 'change_pct' : 'price'
       );
 
-      logger.info('对比页面: 并行调用API获取多股数据...');
-      const responses = await Promise.all(promises);
-
-      logger.info('对比页面: 所有API响应已接收');
+      logger.info('对比页面: API响应已接收');
 
       // 处理返回的数据
-      const series: CompareSeriesData[] = [];
-
-      for (let i = 0; i < responses.length; i++) {
-        const response = responses[i];
-        const stock = stocksToUse[i];
-
-        if (response.code === 0 && response.data.klines.length > 0) {
-          const klines = response.data.klines;
-
-          // 计算数据
-          let data: CompareDataItem[];
-          if (modeToUse === 'change') {
-            // 涨跌幅模式：基准价为第一天的收盘价
-            const basePrice = klines[0].close;
-            data = klines.map((k) => ({
-              date: k.date,
-              value: ((k.close - basePrice) / basePrice) * 100,
-            }));
-          } else {
-            // 价格模式：直接使用收盘价
-            data = klines.map((k) => ({
-              date: k.date,
-              value: k.close,
-            }));
-          }
-
-          series.push({
-            code: stock.code,
-            name: stock.name,
-            data,
-          });
-
-          logger.info(`对比页面: ${stock.name} (${stock.code}) 数据已处理 - ${klines.length} 条`);
-        } else {
-          logger.warning(`对比页面: ${stock.name} (${stock.code}) 数据获取失败或为空`);
-        }
-      }
+      const series: CompareSeriesData[] = response.data.stocks.map((stock) => {
+        const data: CompareDataItem[] = stock.dates.map((date, i) => ({
+          date,
+          value: stock.values[i],
+        }));
+        logger.info(`对比页面: ${stock.name} (${stock.code}) 数据已处理 - ${data.length} 条`);
+        return { code: stock.code, name: stock.name, data };
+      });
+
+      const loadedCodes = new Set(series.map((s) => s.code));
+      stocksToUse
+        .filter((stock) => !loadedCodes.has(stock.code))
+        .forEach((stock) => {
+          logger.warning(`对比页面: ${stock.name} (${stock.code}) 数据为空`);
+        });
 
       setChartSeries(series);
       logger.success(`对比页面: 成功加载 ${series.length} 只股票的对比数据`);
@@ -173,14 +171,14 @@ export const ComparePage: React.FC = () => {
           <MultiStockSelector
             value={selectedCodes}
             onChange={handleStockChange}
-            maxCount={5}
+            maxCount={maxCodes}
           />
           <span className="selector-hint">
             {loading
               ? '加载中...'
               : selectedCodes.length > 0
               ? `已选择 ${selectedCodes.length} 只股票`
-              : '请选择股票进行对比（最多5只）'}
+              : `请选择股票进行对比（最多${maxCodes}只）`}
           </span>
         </div>
 
@@ -105,7 +105,19 @@ export interface EquityCurvePoint {
 }
 
 /**
- * 回测结果数据
+ * 回测每日序列（列式，各数组与 dates 一一对应）
+ */
+export interface BacktestSeries {
+  dates: string[];
+  equity: number[];  // 总资产（资金曲线）
+  cash: number[];
+  market_value: number[];
+  benchmark: number[];  // 买入持有基准
+  price: number[];  // 收盘价
+}
+
+/**
+ * 回测结果数据（紧凑格式）
  */
 export interface BacktestData {
   stock_code: string;
@@ -117,10 +129,10 @@ export interface BacktestData {
   initial_capital: number;
   final_capital: number;
   metrics: BacktestMetrics;
-  daily_records: DailyPosition[];
   trades: TradeRecord[];
-  equity_curve: EquityCurvePoint[];
-  buy_hold_curve?: EquityCurvePoint[];
+  series: BacktestSeries;
+  position_changes: DailyPosition[];  // 持仓变化日的账户快照
+  result_id?: string | null;  // 结果ID，可通过 getStoredResult 重新打开
 }
 
 /**
@@ -132,6 +144,50 @@ export interface BacktestResponse {
   data: BacktestData;
 }
 
+/**
+ * 每日持仓明细（分页）
+ */
+export interface DailyPositionPage {
+  total: number;
+  offset: number;
+  limit: number;
+  items: DailyPosition[];
+}
+
+/**
+ * 每日持仓明细响应
+ */
+export interface DailyPositionPageResponse {
+  code: number;
+  message: string;
+  data: DailyPositionPage;
+}
+
+/**
+ * 回测任务状态
+ */
+export interface BacktestJob {
+  job_id: string;
+  kind: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  progress: number;  // 0-1
+  stage: string;
+  error: string | null;
+  error_code: number | null;
+  created_at: number;
+  started_at: number | null;
+  finished_at: number | null;
+}
+
+/**
+ * 回测任务响应
+ */
+export interface BacktestJobResponse {
+  code: number;
+  message: string;
+  data: BacktestJob;
+}
+
 /**
  * 策略列表响应
  */
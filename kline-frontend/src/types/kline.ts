@@ -21,6 +21,29 @@ export interface IndicatorData {
   boll?: { mid: (number | null)[]; upper: (number | null)[]; lower: (number | null)[] };
 }
 
+/** 列式K线数据（后端默认返回格式） */
+export interface KLineColumns {
+  dates: string[];
+  open: number[];
+  close: number[];
+  high: number[];
+  low: number[];
+  volume: number[];
+  amount: number[];
+}
+
+export interface KLineColumnsResponse {
+  code: number;
+  message: string;
+  data: {
+    stock_info: StockInfo;
+    columns: KLineColumns;
+    count: number;
+    period?: string;
+    indicators?: IndicatorData;
+  };
+}
+
 export interface KLineResponse {
   code: number;
   message: string;